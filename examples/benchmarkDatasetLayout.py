@@ -0,0 +1,115 @@
+# This file is part of daf_butler.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (http://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Compare the single and partitioned Dataset layouts of SqlRegistry.
+
+For each layout a SQLite registry is filled with ``--count`` Datasets spread
+evenly over DatasetTypes with different DataUnits, then timed on random
+`SqlRegistry.find` and `SqlRegistry.getDataset` calls.
+"""
+
+import os
+import random
+import tempfile
+import time
+
+from lsst.daf.butler.core.config import Config
+from lsst.daf.butler.core.datasets import DatasetType
+from lsst.daf.butler.core.registry import Registry
+from lsst.daf.butler.core.storageClass import StorageClass, StorageClassFactory
+
+SCHEMA = os.path.join(os.path.dirname(__file__), os.path.pardir, "config", "registry", "default_schema.yaml")
+
+SENSORS = 189
+PATCHES = 100
+
+
+def makeDataId(dataUnits, index):
+    """Return a unique dataId for the ``index``-th Dataset of a type."""
+    if "Sensor" in dataUnits:
+        return {"camera": "HSC", "visit": index // SENSORS, "sensor": index % SENSORS}
+    return {"skymap": "rings", "tract": index // PATCHES, "patch": index % PATCHES, "abstract_filter": "r"}
+
+
+def makeRegistry(path, datasetLayout):
+    config = Config()
+    config["registry.cls"] = "lsst.daf.butler.registries.sqliteRegistry.SqliteRegistry"
+    config["registry.db"] = "sqlite:///{}".format(path)
+    config["registry.schema"] = SCHEMA
+    config["registry.datasetLayout"] = datasetLayout
+    return Registry.fromConfig(config)
+
+
+def benchmark(directory, datasetLayout, count, lookups):
+    path = os.path.join(directory, "{}.sqlite3".format(datasetLayout))
+    registry = makeRegistry(path, datasetLayout)
+    storageClass = StorageClass("BenchmarkData")
+    StorageClassFactory().registerStorageClass(storageClass)
+    datasetTypes = [DatasetType(name=name, dataUnits=dataUnits, storageClass=storageClass)
+                    for name, dataUnits in (("calexp", ("Camera", "Visit", "Sensor")),
+                                            ("src", ("Camera", "Visit", "Sensor")),
+                                            ("deepCoadd", ("SkyMap", "Tract", "Patch", "AbstractFilter")))]
+    for datasetType in datasetTypes:
+        registry.registerDatasetType(datasetType)
+    run = registry.makeRun(collection="benchmark")
+
+    start = time.time()
+    with registry.bufferedWrites(maxSize=100000):
+        for index in range(count):
+            datasetType = datasetTypes[index % len(datasetTypes)]
+            registry.addDataset(datasetType, makeDataId(datasetType.dataUnits, index // len(datasetTypes)),
+                                run=run)
+    insertTime = time.time() - start
+
+    samples = [random.randrange(count) for _ in range(lookups)]
+    start = time.time()
+    ids = []
+    for index in samples:
+        datasetType = datasetTypes[index % len(datasetTypes)]
+        ref = registry.find(run.collection, datasetType,
+                            makeDataId(datasetType.dataUnits, index // len(datasetTypes)))
+        ids.append(ref.id)
+    findTime = time.time() - start
+
+    start = time.time()
+    for datasetId in ids:
+        registry.getDataset(datasetId)
+    getTime = time.time() - start
+
+    print("{:>12}: insert {:8.1f} s, find {:8.3f} ms, getDataset {:8.3f} ms, database {:8.1f} MB".format(
+          datasetLayout, insertTime, 1000*findTime/lookups, 1000*getTime/lookups,
+          os.path.getsize(path)/2**20))
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Compare SqlRegistry Dataset layouts.')
+    parser.add_argument('--count', type=int, default=10000000, help='Number of Datasets to insert')
+    parser.add_argument('--lookups', type=int, default=10000, help='Number of random lookups to time')
+    parser.add_argument('--dir', default=None, help='Directory for the databases (default: temporary)')
+    parser.add_argument('--layouts', nargs='+', default=["single", "partitioned"],
+                        help='Dataset layouts to compare')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as directory:
+        for layout in args.layouts:
+            benchmark(directory, layout, args.count, args.lookups)
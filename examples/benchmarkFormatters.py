@@ -0,0 +1,98 @@
+# This file is part of daf_butler.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (http://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Compare file size and encode/decode throughput of the file formatters.
+
+Each formatter writes and reads back ``--count`` copies of a representative
+structured Dataset (nested metadata with numeric arrays, similar to the
+task metadata and metric values stored as YAML, JSON or pickle).  The
+output helps choose the formatter of each `StorageClass` in the
+``formatters`` section of the `PosixDatastore` configuration.
+"""
+
+import os
+import random
+import tempfile
+import time
+
+from lsst.daf.butler.core.fileDescriptor import FileDescriptor
+from lsst.daf.butler.core.formatter import FormatterFactory
+from lsst.daf.butler.core.location import LocationFactory
+from lsst.daf.butler.core.storageClass import StorageClass
+
+FORMATTERS = ["lsst.daf.butler.formatters.{0}Formatter.{1}{2}Formatter".format(module, cls, codec)
+              for module, cls in (("json", "Json"), ("yaml", "Yaml"), ("pickle", "Pickle"))
+              for codec in ("", "Gzip", "Bz2", "Lzma")]
+
+
+def makeDataset(size):
+    """Return nested metadata with ``size`` entries per section."""
+    rng = random.Random(42)
+    return {
+        "metadata": {"KEY{:05d}".format(i): rng.choice(["r", "i", "HSC-R", "calexp", True, 1.5, i])
+                     for i in range(size)},
+        "metrics": {"task{}.timing".format(i): {"cpu": rng.random(), "rss": rng.randrange(2**30)}
+                    for i in range(size)},
+        "values": [round(rng.gauss(0, 1), 6) for _ in range(size)],
+    }
+
+
+def benchmark(directory, formatterName, dataset, count):
+    formatter = FormatterFactory.getSharedInstance(formatterName)
+    storageClass = StorageClass("BenchmarkData", pytype=dict)
+    locationFactory = LocationFactory(os.path.join(directory, formatter.name()))
+    os.makedirs(locationFactory.fromPath("").path, exist_ok=True)
+
+    start = time.time()
+    paths = [formatter.write(dataset, FileDescriptor(locationFactory.fromPath("dataset{}".format(i)),
+                                                     storageClass=storageClass))
+             for i in range(count)]
+    writeTime = time.time() - start
+
+    start = time.time()
+    for path in paths:
+        formatter.read(FileDescriptor(locationFactory.fromPath(path), storageClass=storageClass))
+    readTime = time.time() - start
+
+    size = os.path.getsize(locationFactory.fromPath(paths[0]).path)
+    print("{:>22}: {:10.1f} kB, write {:8.1f} ms, read {:8.1f} ms".format(
+          type(formatter).__name__, size/1024, 1000*writeTime/count, 1000*readTime/count))
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Compare file formatters.')
+    parser.add_argument('--count', type=int, default=20, help='Number of files written by each formatter')
+    parser.add_argument('--size', type=int, default=10000, help='Number of entries per Dataset section')
+    parser.add_argument('--dir', default=None, help='Directory for the files (default: temporary)')
+    parser.add_argument('--formatters', nargs='+', default=FORMATTERS, help='Formatters to compare')
+    args = parser.parse_args()
+
+    dataset = makeDataset(args.size)
+    with tempfile.TemporaryDirectory(dir=args.dir) as directory:
+        for formatterName in args.formatters:
+            benchmark(directory, formatterName, dataset, args.count)
+
+
+if __name__ == '__main__':
+    main()
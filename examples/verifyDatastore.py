@@ -0,0 +1,56 @@
+# This file is part of daf_butler.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (http://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Verify the files of the PosixDatastore of a Butler repository.
+
+Problems are printed and appended to ``--report``; with ``--checkpoint``
+an interrupted run continues where it stopped when run again.
+"""
+
+from lsst.daf.butler import Butler
+from lsst.daf.butler.datastores.posixDatastoreVerifier import verifyDatastore
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Verify the files of a PosixDatastore.')
+    parser.add_argument('config', help='Butler configuration file')
+    parser.add_argument('--checkpoint', default=None, help='File recording the progress of the scan')
+    parser.add_argument('--report', default=None, help='File to which problems are appended')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Number of records read at a time')
+    parser.add_argument('--processes', type=int, default=None, help='Number of hashing processes')
+    parser.add_argument('--max-rate', type=float, default=None, help='Maximum total read rate in MB/s')
+    args = parser.parse_args()
+
+    butler = Butler(args.config)
+    maxBytesPerSecond = args.max_rate*2**20 if args.max_rate else None
+    problems = verifyDatastore(butler.datastore, checkpoint=args.checkpoint, report=args.report,
+                               batchSize=args.batch_size, processes=args.processes,
+                               maxBytesPerSecond=maxBytesPerSecond)
+    for problem in problems:
+        print("{}: {} ({}) {}".format(problem.datasetId, problem.kind, problem.path, problem.detail or ""))
+    print("{} problems found".format(len(problems)))
+
+
+if __name__ == '__main__':
+    main()
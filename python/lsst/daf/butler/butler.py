@@ -23,12 +23,15 @@
 Butler top level classes.
 """
 
+import threading
+import weakref
+
 from .core.config import Config
 from .core.datastore import Datastore
 from .core.registry import Registry
 from .core.storageClass import StorageClassFactory
 
-__all__ = ("ButlerConfig", "Butler")
+__all__ = ("ButlerConfig", "Butler", "DeferredDatasetHandle")
 
 
 class ButlerConfig(Config):
@@ -117,7 +120,7 @@ class Butler:
 
         return ref
 
-    def getDirect(self, ref):
+    def getDirect(self, ref, parameters=None):
         """Retrieve a stored dataset.
 
         Unlike `Butler.get`, this method allows datasets outside the Butler's collection to be read as
@@ -127,28 +130,33 @@ class Butler:
         ----------
         ref : `DatasetRef`
             Reference to an already stored dataset.
+        parameters : `dict`, optional
+            `StorageClass`-specific parameters that specify a slice of the
+            Dataset to be loaded.
 
         Returns
         -------
         obj : `object`
             The dataset.
         """
-        # if the ref exists in the store we return it directly
-        if self.datastore.exists(ref):
-            return self.datastore.get(ref)
-        elif ref.components:
-            # Reconstruct the composite
-            components = {}
-            for compName, compRef in ref.components.items():
-                components[compName] = self.datastore.get(compRef)
-
-            # Assemble the components
-            return ref.datasetType.storageClass.assembler().assemble(components)
-        else:
-            # single entity in datastore
-            raise ValueError("Unable to locate ref {} in datastore {}".format(ref.id, self.datastore.name))
+        # if the ref exists in the store we return it directly; asking the
+        # datastore first would repeat the lookups get does anyway
+        try:
+            return self.datastore.get(ref, parameters)
+        except FileNotFoundError:
+            if not ref.components:
+                # single entity in datastore
+                raise ValueError("Unable to locate ref {} in datastore {}".format(
+                                 ref.id, self.datastore.name))
+        # Reconstruct the composite
+        components = {}
+        for compName, compRef in ref.components.items():
+            components[compName] = self.datastore.get(compRef)
+
+        # Assemble the components
+        return ref.datasetType.storageClass.assembler().assemble(components)
 
-    def get(self, datasetType, dataId):
+    def get(self, datasetType, dataId, parameters=None):
         """Retrieve a stored dataset.
 
         Parameters
@@ -158,6 +166,9 @@ class Butler:
         dataId : `dict`
             A `dict` of `DataUnit` name, value pairs that label the `DatasetRef`
             within a Collection.
+        parameters : `dict`, optional
+            `StorageClass`-specific parameters that specify a slice of the
+            Dataset to be loaded.
 
         Returns
         -------
@@ -166,4 +177,126 @@ class Butler:
         """
         datasetType = self.registry.getDatasetType(datasetType)
         ref = self.registry.find(self.run.collection, datasetType, dataId)
-        return self.getDirect(ref)
+        return self.getDirect(ref, parameters)
+
+    def getDeferred(self, datasetType, dataId, cache=False):
+        """Resolve a stored dataset now, to be read later.
+
+        Parameters
+        ----------
+        datasetType : `DatasetType` instance or `str`
+            The `DatasetType`.
+        dataId : `dict`
+            A `dict` of `DataUnit` name, value pairs that label the `DatasetRef`
+            within a Collection.
+        cache : `bool`, optional
+            Whether the handle keeps the dataset once read.
+
+        Returns
+        -------
+        handle : `DeferredDatasetHandle`
+            A handle reading the dataset on its first `~DeferredDatasetHandle.get`.
+
+        Raises
+        ------
+        ValueError
+            The dataset does not exist in the collection of this Butler.
+        """
+        datasetType = self.registry.getDatasetType(datasetType)
+        ref = self.registry.find(self.run.collection, datasetType, dataId)
+        if ref is None:
+            raise ValueError("Unable to find {} with dataId {} in collection {}".format(
+                             datasetType.name, dataId, self.run.collection))
+        return DeferredDatasetHandle(self, ref, cache=cache)
+
+
+class DeferredDatasetHandle:
+    """Handle to a resolved dataset, read from the `Butler` on demand.
+
+    Handles can be pickled to send them to other processes: they carry the
+    `DatasetRef` and the configuration of the `Butler`, but neither the
+    `Butler` itself nor any data read.  On unpickling, a `Butler` with the
+    same configuration in the process is reused, or one is created on the
+    first `get`.
+
+    Parameters
+    ----------
+    butler : `Butler`
+        The `Butler` to read with.
+    ref : `DatasetRef`
+        The resolved dataset.
+    cache : `bool`, optional
+        Whether `get` without parameters keeps the dataset once read.
+
+    Attributes
+    ----------
+    ref : `DatasetRef`
+        The resolved dataset.
+    cache : `bool`
+        Whether the dataset is kept once read.
+    """
+
+    __slots__ = ("ref", "cache", "_butler", "_config", "_dataset")
+
+    _butlers = weakref.WeakValueDictionary()
+    """Butlers of this process, keyed by their configuration, for handles
+    that are unpickled."""
+
+    _lock = threading.Lock()
+
+    _NOT_READ = object()
+
+    def __init__(self, butler, ref, cache=False):
+        self.ref = ref
+        self.cache = cache
+        self._butler = butler
+        self._config = butler.config
+        self._dataset = self._NOT_READ
+        with self._lock:
+            self._butlers.setdefault(repr(butler.config), butler)
+
+    def __getstate__(self):
+        return {"ref": self.ref, "cache": self.cache, "config": self._config}
+
+    def __setstate__(self, state):
+        self.ref = state["ref"]
+        self.cache = state["cache"]
+        self._config = state["config"]
+        self._butler = None
+        self._dataset = self._NOT_READ
+
+    @property
+    def butler(self):
+        """The `Butler` the dataset is read with (`Butler`)."""
+        if self._butler is None:
+            key = repr(self._config)
+            with self._lock:
+                butler = self._butlers.get(key)
+                if butler is None:
+                    butler = Butler(self._config)
+                    self._butlers[key] = butler
+            self._butler = butler
+        return self._butler
+
+    def get(self, parameters=None):
+        """Read the dataset.
+
+        Parameters
+        ----------
+        parameters : `dict`, optional
+            `StorageClass`-specific parameters that specify a slice of the
+            Dataset to be loaded; reads with parameters are not cached.
+
+        Returns
+        -------
+        obj : `object`
+            The dataset.
+        """
+        if parameters:
+            return self.butler.getDirect(self.ref, parameters)
+        if self._dataset is not self._NOT_READ:
+            return self._dataset
+        dataset = self.butler.getDirect(self.ref)
+        if self.cache:
+            self._dataset = dataset
+        return dataset
@@ -0,0 +1,148 @@
+# This file is part of daf_butler.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (http://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Checksums of files, computed while writing them or read back from disk.
+"""
+
+import hashlib
+import io
+import mmap
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+__all__ = ("HashingWriter", "computeChecksum", "checkChecksumAlgorithm")
+
+DEFAULT_BLOCK_SIZE = 2**20
+"""Number of bytes read at a time by `computeChecksum`."""
+
+
+def checkChecksumAlgorithm(algorithm):
+    """Check that a checksum algorithm is supported.
+
+    Parameters
+    ----------
+    algorithm : `str`
+        Name of the algorithm.
+
+    Raises
+    ------
+    NameError
+        The algorithm is not supported by :py:mod:`hashlib`.
+    """
+    if algorithm not in hashlib.algorithms_guaranteed:
+        raise NameError('The specified algorithm "{}" is not supported by hashlib'.format(algorithm))
+
+
+class HashingWriter(io.RawIOBase):
+    """Binary stream that writes to a file and hashes the bytes written.
+
+    Wrapped in `io.BufferedWriter` (and `io.TextIOWrapper` for text), it can
+    be handed to any serializer expecting a file object, so that the
+    checksum of the file is known as soon as it is closed without reading
+    it back.
+
+    Parameters
+    ----------
+    fd : file object
+        Unbuffered binary file open for writing; closed with this stream.
+    algorithm : `str`, optional
+        Name of the :py:mod:`hashlib` algorithm to use.
+    """
+
+    def __init__(self, fd, algorithm="blake2b"):
+        super().__init__()
+        checkChecksumAlgorithm(algorithm)
+        self._fd = fd
+        self._hasher = hashlib.new(algorithm)
+        self.size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        n = self._fd.write(b)
+        if n is None:
+            n = len(b)
+        with memoryview(b) as view:
+            self._hasher.update(view[:n])
+        self.size += n
+        return n
+
+    def close(self):
+        if not self.closed:
+            self._fd.close()
+        super().close()
+
+    def hexdigest(self):
+        """Hex digest of the bytes written so far (`str`)."""
+        return self._hasher.hexdigest()
+
+
+def computeChecksum(filename, algorithm="blake2b", block_size=DEFAULT_BLOCK_SIZE, parallel=False):
+    """Compute the checksum of the supplied file.
+
+    By default the file is memory-mapped and hashed in a single call, which
+    avoids copying it through Python buffers.  With ``parallel`` the file is
+    instead read in blocks while the previous block is hashed in another
+    thread, overlapping I/O with hashing on slow file systems.
+
+    Parameters
+    ----------
+    filename : `str`
+        Name of file to calculate checksum from.
+    algorithm : `str`, optional
+        Name of algorithm to use. Must be one of the algorithms supported
+        by :py:mod:`hashlib`.
+    block_size : `int`, optional
+        Number of bytes to read from file at one time, when not
+        memory-mapping.
+    parallel : `bool`, optional
+        Hash in a separate thread while reading.
+
+    Returns
+    -------
+    hexdigest : `str`
+        Hex digest of the file.
+    """
+    checkChecksumAlgorithm(algorithm)
+    hasher = hashlib.new(algorithm)
+
+    with open(filename, "rb", buffering=0) as f:
+        if parallel:
+            buffers = (bytearray(block_size), bytearray(block_size))
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                pending = None
+                index = 0
+                while True:
+                    buffer = buffers[index % 2]
+                    n = f.readinto(buffer)
+                    if pending is not None:
+                        pending.result()
+                    if not n:
+                        break
+                    pending = executor.submit(hasher.update, memoryview(buffer)[:n])
+                    index += 1
+        elif os.fstat(f.fileno()).st_size > 0:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                hasher.update(mapped)
+
+    return hasher.hexdigest()
@@ -105,3 +105,79 @@ class DatabaseDict(MutableMapping):
         # This constructor is currently defined just to clearly document the
         # interface subclasses should conform to.
         pass
+
+    def getMany(self, keys):
+        """Retrieve the values of several keys at once.
+
+        Subclasses should override this to use a single query; the default
+        implementation looks keys up one at a time.
+
+        Parameters
+        ----------
+        keys : iterable
+            Keys to look up.
+
+        Returns
+        -------
+        values : `dict`
+            The values found, keyed by key.  Missing keys are left out.
+        """
+        values = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                values[key] = value
+        return values
+
+    def delMany(self, keys):
+        """Delete several keys at once.
+
+        Subclasses should override this to use a single transaction; the
+        default implementation deletes keys one at a time.  Missing keys are
+        ignored.
+
+        Parameters
+        ----------
+        keys : iterable
+            Keys to delete.
+        """
+        for key in keys:
+            self.pop(key, None)
+
+    def getBatch(self, after=None, limit=1000):
+        """Retrieve items in key order, a batch at a time.
+
+        Subclasses should override this to use a single query; the default
+        implementation sorts all keys.
+
+        Parameters
+        ----------
+        after : key, optional
+            Only return items with keys greater than this one, typically the
+            last key of the previous batch.
+        limit : `int`, optional
+            Maximum number of items to return.
+
+        Returns
+        -------
+        items : `list` of `tuple`
+            ``(key, value)`` pairs, sorted by key; fewer than ``limit`` only
+            at the end.
+        """
+        keys = sorted(key for key in self if after is None or key > after)[:limit]
+        values = self.getMany(keys)
+        return [(key, values[key]) for key in keys if key in values]
+
+    def setMany(self, items):
+        """Set the values of several keys at once.
+
+        Subclasses should override this to use a single transaction; the
+        default implementation sets keys one at a time.
+
+        Parameters
+        ----------
+        items : iterable of `tuple`
+            ``(key, value)`` pairs.
+        """
+        for key, value in items:
+            self[key] = value
@@ -167,7 +167,7 @@ class DatasetRef:
 
     __slots__ = ("_id", "_datasetType", "_dataId", "_producer",
                  "_predictedConsumers", "_actualConsumers", "_components",
-                 "_assembler")
+                 "_assembler", "_dataUnitEntries")
     __eq__ = slotValuesAreEqual
 
     def __init__(self, datasetType, dataId, id=None):
@@ -180,6 +180,7 @@ class DatasetRef:
         self._actualConsumers = dict()
         self._components = dict()
         self._assembler = None
+        self._dataUnitEntries = None
 
     @property
     def id(self):
@@ -252,6 +253,15 @@ class DatasetRef:
         """
         return self._assembler
 
+    @property
+    def dataUnitEntries(self):
+        """Full `DataUnit` entries for the ``dataId``, keyed by `DataUnit` name.
+
+        `None` unless this `DatasetRef` was returned by `Registry.expand()`.
+        Read-only.
+        """
+        return self._dataUnitEntries
+
     def __str__(self):
         components = ""
         if self.components:
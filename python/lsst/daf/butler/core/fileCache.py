@@ -0,0 +1,231 @@
+# This file is part of daf_butler.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (http://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Node-local cache of copies of datastore files.
+"""
+
+import os
+import threading
+import time
+
+from .checksum import computeChecksum
+from .fileTransfer import copyFile
+from .safeFileIo import safeMakeDir
+
+__all__ = ("FileCache", )
+
+
+class FileCache:
+    """Directory of local copies of files, bounded in size and age.
+
+    Copies are named after a key (the dataset_id) and the checksum of the
+    file, so a changed file is never served from a stale copy.  They are
+    written under a temporary name and renamed into place, so several
+    processes on a node can share the directory: a reader sees either no
+    copy or a complete one.  The modification time of a copy is updated on
+    every use and drives eviction, least recently used first.
+
+    Parameters
+    ----------
+    root : `str`
+        Directory of the cache; created if needed.
+    maxSize : `int`, optional
+        Maximum total size of the copies, in bytes.
+    maxAge : `float`, optional
+        Maximum time since the last use of a copy, in seconds.
+    checksumAlgorithm : `str`, optional
+        Algorithm with which copies are checked against the checksums
+        given to `getPath`.
+
+    Attributes
+    ----------
+    hits : `int`
+        Number of `getPath` calls served by an existing copy.
+    misses : `int`
+        Number of `getPath` calls that copied the file.
+    evictions : `int`
+        Number of copies removed by this instance.
+    """
+
+    TMP_MARKER = ".tmp."
+    """Marker in the names of copies being written."""
+
+    def __init__(self, root, maxSize=None, maxAge=None, checksumAlgorithm=None):
+        self.root = root
+        safeMakeDir(root)
+        self.maxSize = maxSize
+        self.maxAge = maxAge
+        self.checksumAlgorithm = checksumAlgorithm
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def getStats(self):
+        """Return the hit and miss statistics.
+
+        Returns
+        -------
+        stats : `dict`
+            Counts of ``hits``, ``misses`` and ``evictions``.
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+    def _makeName(self, key, checksum, source):
+        name = str(key) if checksum is None else "{}_{}".format(key, checksum)
+        return name + os.path.splitext(source)[1]
+
+    def getPath(self, key, source, size=None, checksum=None):
+        """Return the path of a local copy of a file, copying it if needed.
+
+        Parameters
+        ----------
+        key : `object`
+            Identifier of the file in the cache, typically a dataset_id.
+        source : `str`
+            Path of the original file.
+        size : `int`, optional
+            Expected size of the file.
+        checksum : `str`, optional
+            Expected checksum of the file; only checked if the cache has a
+            ``checksumAlgorithm``.
+
+        Returns
+        -------
+        path : `str`
+            Path of the local copy, or ``source`` itself if the file is
+            larger than ``maxSize`` (in which case it is not cached) or the
+            copy was evicted by another process before it could be returned.
+
+        Raises
+        ------
+        RuntimeError
+            The copy does not match the expected size or checksum.
+        """
+        if size is not None and self.maxSize is not None and size > self.maxSize:
+            return self._getSource(source, size)
+        path = os.path.join(self.root, self._makeName(key, checksum, source))
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            pass
+        else:
+            if size is None or stat.st_size == size:
+                try:
+                    os.utime(path)
+                except FileNotFoundError:
+                    # Evicted by another process in the meantime
+                    pass
+                else:
+                    with self._lock:
+                        self.hits += 1
+                    return path
+
+        tmpPath = "{}{}{}.{}".format(path, self.TMP_MARKER, os.getpid(), threading.get_ident())
+        try:
+            copyFile(source, tmpPath)
+            copySize = os.stat(tmpPath).st_size
+            if size is not None and copySize != size:
+                raise RuntimeError("Integrity failure in file cache. Size of copy of {} ({}) does not"
+                                   " match recorded size of {}".format(source, copySize, size))
+            if checksum is not None and self.checksumAlgorithm is not None:
+                copyChecksum = computeChecksum(tmpPath, algorithm=self.checksumAlgorithm)
+                if copyChecksum != checksum:
+                    raise RuntimeError("Integrity failure in file cache. Checksum of copy of {} does not"
+                                       " match recorded checksum".format(source))
+            if self.maxSize is not None and copySize > self.maxSize:
+                os.remove(tmpPath)
+                return source
+            os.replace(tmpPath, path)
+        except BaseException:
+            if os.path.exists(tmpPath):
+                os.remove(tmpPath)
+            raise
+        with self._lock:
+            self.misses += 1
+        self.evict(keep=path)
+        try:
+            # Make the copy the most recently used again, in case another
+            # process evicted copies in the meantime
+            os.utime(path)
+        except FileNotFoundError:
+            return self._getSource(source, size)
+        return path
+
+    def _getSource(self, source, size):
+        """Return the path of a file that is not cached, after checking its
+        size."""
+        sourceSize = os.stat(source).st_size
+        if size is not None and sourceSize != size:
+            raise RuntimeError("Integrity failure in file cache. Size of {} ({}) does not"
+                               " match recorded size of {}".format(source, sourceSize, size))
+        return source
+
+    def evict(self, keep=None):
+        """Remove copies beyond the size and age limits.
+
+        Copies not used for ``maxAge`` are removed, then the least recently
+        used ones until the total size is within ``maxSize``.  Abandoned
+        temporary files are removed once older than ``maxAge``.
+
+        Parameters
+        ----------
+        keep : `str`, optional
+            Path of a copy that must not be removed.
+        """
+        if self.maxSize is None and self.maxAge is None:
+            return
+        now = time.time()
+        entries = []
+        total = 0
+        with os.scandir(self.root) as it:
+            for entry in it:
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                if entry.path == keep:
+                    total = stat.st_size
+                    continue
+                if self.maxAge is not None and now - stat.st_mtime > self.maxAge:
+                    self._remove(entry.path)
+                elif self.TMP_MARKER not in entry.name:
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        if self.maxSize is None:
+            return
+        total += sum(size for _, size, _ in entries)
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.maxSize:
+                break
+            self._remove(path)
+            total -= size
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            # Removed by another process
+            return
+        with self._lock:
+            self.evictions += 1
@@ -35,15 +35,28 @@ class FileDescriptor:
         to the ``storageClass`` if not specified.
     parameters : `dict`, optional
         Additional parameters that can be used for reading and writing.
+    checksumAlgorithm : `str`, optional
+        Name of the :py:mod:`hashlib` algorithm with which a formatter able
+        to hash the file while writing it should do so.
+
+    Attributes
+    ----------
+    checksum : `str` or `None`
+        Hex digest of the file, set by formatters that computed it while
+        writing.
     """
 
-    __slots__ = ('location', 'storageClass', '_readStorageClass', 'parameters')
+    __slots__ = ('location', 'storageClass', '_readStorageClass', 'parameters', 'checksumAlgorithm',
+                 'checksum')
 
-    def __init__(self, location, storageClass, readStorageClass=None, parameters=None):
+    def __init__(self, location, storageClass, readStorageClass=None, parameters=None,
+                 checksumAlgorithm=None):
         self.location = location
         self._readStorageClass = readStorageClass
         self.storageClass = storageClass
         self.parameters = parameters
+        self.checksumAlgorithm = checksumAlgorithm
+        self.checksum = None
 
     @property
     def readStorageClass(self):
@@ -21,12 +21,45 @@
 
 """Support for file template string expansion."""
 
+import hashlib
 import os.path
 import string
 
 from .config import Config
 
 
+SHARD_FIELDS = ("shard", "idshard")
+"""Template fields expanding to hash-derived subdirectories."""
+
+
+def makeShard(key, levels=1):
+    """Derive subdirectories from a hash of a key.
+
+    Parameters
+    ----------
+    key : `str`
+        String identifying the file.
+    levels : `int`, optional
+        Number of directory levels.
+
+    Returns
+    -------
+    shard : `str`
+        ``levels`` directories of two hexadecimal digits each (256 entries
+        per level), e.g. ``"3f/a1"``; the same for the same key in every
+        process.
+
+    Raises
+    ------
+    ValueError
+        ``levels`` is not between 1 and 64.
+    """
+    if not 1 <= levels <= 64:
+        raise ValueError("Number of shard levels must be between 1 and 64, not {}".format(levels))
+    digest = hashlib.blake2b(key.encode(), digest_size=levels).hexdigest()
+    return "/".join(digest[i:i + 2] for i in range(0, 2*levels, 2))
+
+
 class FileTemplatesConfig(Config):
     pass
 
@@ -101,6 +134,15 @@ class FileTemplate:
     specification. This indicates that a field is optional. If that
     DataUnit is missing the field, along with the text before the field,
     unless it is a path separator, will be removed from the output path.
+
+    Two further fields spread files over subdirectories, to keep the number
+    of entries of each directory small: "shard" is replaced with
+    directories derived from a hash of the dataId, and "idshard" with
+    directories derived from a hash of the dataset_id. Their format
+    specification is the number of directory levels (1 if not given), each
+    with 256 entries; e.g. ``{datasetType}/{shard:2}/{visit}_{sensor}``.
+    "idshard" can only be used for Datasets that have an id, unless marked
+    optional.
     """
 
     def __init__(self, template):
@@ -153,7 +195,15 @@ class FileTemplate:
             else:
                 optional = False
 
-            if field_name in fields:
+            if field_name in SHARD_FIELDS and (field_name == "shard" or ref.id is not None):
+                if field_name == "shard":
+                    key = ",".join("{}={}".format(k, v) for k, v in sorted(ref.dataId.items())
+                                   if v is not None)
+                else:
+                    key = str(ref.id)
+                value = makeShard(key, int(format_spec) if format_spec else 1)
+                format_spec = ""
+            elif field_name in fields:
                 value = fields[field_name]
             elif optional:
                 # If this is optional ignore the format spec
@@ -0,0 +1,161 @@
+# This file is part of daf_butler.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (http://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Transfer of files into a POSIX datastore.
+"""
+
+import errno
+import os
+import shutil
+
+from .safeFileIo import safeMakeDir
+
+__all__ = ("TRANSFER_MODES", "transferFile", "copyFile")
+
+TRANSFER_MODES = (None, "move", "copy", "hardlink", "symlink", "relsymlink")
+"""Supported values of the ``transfer`` argument of `transferFile`."""
+
+COPY_CHUNK_SIZE = 2**30
+"""Maximum number of bytes copied by a single kernel call in `copyFile`."""
+
+# Errors telling that a kernel copy path is not available for a pair of
+# files, rather than that the copy failed
+_UNSUPPORTED = (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP)
+
+
+def _copyKernel(function, src, dst, size):
+    """Copy with a kernel call taking ``(src, dst, offset, count)`` file
+    descriptors; return `False` if it is not usable for these files.
+
+    Some file systems make the call copy nothing rather than fail, which is
+    also treated as not usable if it happens before anything was copied.
+    """
+    offset = 0
+    while offset < size:
+        try:
+            n = function(src, dst, offset, min(COPY_CHUNK_SIZE, size - offset))
+        except OSError as e:
+            if offset == 0 and e.errno in _UNSUPPORTED:
+                return False
+            raise
+        if n == 0:
+            if offset == 0:
+                return False
+            break
+        offset += n
+    if offset != size:
+        raise OSError(errno.EIO, "Copied {} of {} bytes".format(offset, size))
+    return True
+
+
+def copyFile(src, dst):
+    """Copy a file, without its data passing through Python if possible.
+
+    `os.copy_file_range` is tried first (which lets the file system share
+    or clone the blocks), then `os.sendfile`, then a plain buffered copy.
+    The permission bits are copied as with `shutil.copy`.
+
+    Parameters
+    ----------
+    src : `str`
+        Path of the file to copy.
+    dst : `str`
+        Path of the copy; must not exist.  It is removed if the copy fails.
+    """
+    with open(src, "rb") as fsrc:
+        fdst = open(dst, "xb")
+        try:
+            with fdst:
+                size = os.fstat(fsrc.fileno()).st_size
+                srcFd, dstFd = fsrc.fileno(), fdst.fileno()
+                done = False
+                if hasattr(os, "copy_file_range"):
+                    done = _copyKernel(lambda s, d, offset, count: os.copy_file_range(s, d, count,
+                                                                                      offset, offset),
+                                       srcFd, dstFd, size)
+                if not done and hasattr(os, "sendfile"):
+                    done = _copyKernel(lambda s, d, offset, count: os.sendfile(d, s, offset, count),
+                                       srcFd, dstFd, size)
+                if not done:
+                    shutil.copyfileobj(fsrc, fdst, length=2**20)
+            shutil.copymode(src, dst)
+        except BaseException:
+            os.remove(dst)
+            raise
+
+
+def transferFile(src, dst, transfer):
+    """Bring a file to a new location.
+
+    Parameters
+    ----------
+    src : `str`
+        Path of the file.
+    dst : `str`
+        New path of the file; its directory is created if needed.
+    transfer : `str`
+        One of `TRANSFER_MODES` other than `None`:
+
+        ``"move"``
+            Rename the file, or copy and delete it across file systems.
+        ``"copy"``
+            Copy the file (see `copyFile`).
+        ``"hardlink"``
+            Make a hard link, or a copy across file systems.
+        ``"symlink"``
+            Make a symbolic link to the absolute path of the file.
+        ``"relsymlink"``
+            Make a symbolic link relative to the directory of ``dst``.
+
+    Raises
+    ------
+    ValueError
+        The transfer mode is not supported.
+    FileExistsError
+        The destination already exists.
+    """
+    if transfer not in TRANSFER_MODES or transfer is None:
+        raise ValueError("Transfer mode {!r} not supported".format(transfer))
+    if os.path.lexists(dst):
+        raise FileExistsError("Cannot transfer {} to existing file {}".format(src, dst))
+    safeMakeDir(os.path.dirname(dst))
+    if transfer == "move":
+        try:
+            os.rename(src, dst)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            copyFile(src, dst)
+            os.remove(src)
+    elif transfer == "copy":
+        copyFile(src, dst)
+    elif transfer == "hardlink":
+        try:
+            os.link(src, dst)
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                raise
+            copyFile(src, dst)
+    elif transfer == "symlink":
+        os.symlink(os.path.abspath(src), dst)
+    else:
+        os.symlink(os.path.relpath(os.path.abspath(src), os.path.dirname(os.path.abspath(dst))), dst)
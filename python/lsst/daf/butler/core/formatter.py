@@ -22,7 +22,7 @@
 from abc import ABCMeta, abstractmethod
 
 from .mappingFactory import MappingFactory
-from .utils import getFullTypeName
+from .utils import getFullTypeName, getInstanceOf
 
 __all__ = ("Formatter", "FormatterFactory")
 
@@ -77,13 +77,48 @@ class Formatter(metaclass=ABCMeta):
 
 class FormatterFactory:
     """Factory for `Formatter` instances.
+
+    Formatters are stateless, so instances are shared: one per formatter
+    class and set of constructor parameters in the process (see `getSharedInstance`), and the formatter of
+    each (`DatasetType`, `StorageClass`) pair is only looked up once.
     """
 
+    _instances = {}
+    """Formatter instances, keyed by the full name of their class and their
+    constructor parameters."""
+
     def __init__(self):
         self._mappingFactory = MappingFactory(Formatter)
+        self._parameters = {}
+        self._lookupCache = {}
+
+    @classmethod
+    def getSharedInstance(cls, typeOrName, **parameters):
+        """Get the instance of a formatter class shared in the process.
+
+        Parameters
+        ----------
+        typeOrName : `str` or `type`
+            The formatter class, or its fully qualified name.
+        **parameters
+            Keyword arguments of the formatter constructor; formatters
+            constructed with different parameters are different instances.
+
+        Returns
+        -------
+        formatter : `Formatter`
+            Instance of the class.
+        """
+        name = typeOrName if isinstance(typeOrName, str) else getFullTypeName(typeOrName)
+        key = (name, tuple(sorted(parameters.items())))
+        try:
+            return cls._instances[key]
+        except KeyError:
+            formatter = getInstanceOf(typeOrName, **parameters)
+            return cls._instances.setdefault(key, formatter)
 
     def getFormatter(self, storageClass, datasetType=None):
-        """Get a new formatter instance.
+        """Get a formatter instance.
 
         Parameters
         ----------
@@ -93,9 +128,20 @@ class FormatterFactory:
             If given, look if an override has been specified for this `DatasetType` and,
             if so return that instead.
         """
-        return self._mappingFactory.getFromRegistry(datasetType, storageClass)
-
-    def registerFormatter(self, type_, formatter):
+        key = (None if datasetType is None else self._mappingFactory._getName(datasetType),
+               self._mappingFactory._getName(storageClass))
+        try:
+            return self._lookupCache[key]
+        except KeyError:
+            pass
+        typeName = self._mappingFactory.getClassFromRegistry(datasetType, storageClass)
+        # The parameters are those registered with the key that matched
+        parameters = self._parameters[key[0] if key[0] in self._parameters else key[1]]
+        formatter = self.getSharedInstance(typeName, **parameters)
+        self._lookupCache[key] = formatter
+        return formatter
+
+    def registerFormatter(self, type_, formatter, parameters=None):
         """Register a `Formatter`.
 
         Parameters
@@ -105,10 +151,23 @@ class FormatterFactory:
         formatter : `str`
             Identifies a `Formatter` subclass to use for reading and writing
             Datasets of this type.
+        parameters : `dict`, optional
+            Keyword arguments with which the formatter is constructed, e.g.
+            ``compresslevel`` for a `FileFormatter`.
 
         Raises
         ------
         ValueError
             If formatter does not name a valid formatter type.
+        KeyError
+            If a different formatter, or the same formatter with different
+            parameters, is already registered for this type.
         """
+        parameters = dict(parameters) if parameters else {}
+        name = self._mappingFactory._getName(type_)
+        if name in self._parameters and self._parameters[name] != parameters:
+            raise KeyError("Formatter for {} already registered with different parameters"
+                           " ({} != {})".format(name, self._parameters[name], parameters))
         self._mappingFactory.placeInRegistry(type_, formatter)
+        self._parameters[name] = parameters
+        self._lookupCache.clear()
@@ -61,6 +61,28 @@ class MappingFactory:
             Instance of class stored in registry associated with the first
             matching target class.
 
+        Raises
+        ------
+        KeyError
+            None of the supplied target classes match an item in the registry.
+        """
+        return getInstanceOf(self.getClassFromRegistry(*targetClasses))
+
+    def getClassFromRegistry(self, *targetClasses):
+        """Get the class stored in the registry, without instantiating it.
+
+        Parameters
+        ----------
+        *targetClasses : `str` or objects supporting ``name`` attribute
+            Each item is tested in turn until a match is found in the registry.
+            Items with `None` value are skipped.
+
+        Returns
+        -------
+        typeName : `str` or `type`
+            Class, or name of the class, stored in registry associated with
+            the first matching target class.
+
         Raises
         ------
         KeyError
@@ -74,11 +96,9 @@ class MappingFactory:
                 key = self._getName(t)
                 attempts.append(key)
                 try:
-                    typeName = self._registry[key]
+                    return self._registry[key]
                 except KeyError:
                     pass
-                else:
-                    return getInstanceOf(typeName)
         raise KeyError("Unable to find item in registry with keys: {}".format(attempts))
 
     def placeInRegistry(self, registryKey, typeName):
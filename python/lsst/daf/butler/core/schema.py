@@ -22,7 +22,7 @@
 from .utils import iterable
 from .config import Config
 from sqlalchemy import Column, String, Integer, Boolean, LargeBinary, DateTime,\
-    Float, ForeignKey, ForeignKeyConstraint, Table, MetaData
+    Float, ForeignKey, ForeignKeyConstraint, Table, MetaData, Index
 from .dataUnit import DataUnitRegistry
 
 metadata = None  # Needed to make disabled test_hsc not fail on import
@@ -41,16 +41,29 @@ class Schema:
     ----------
     config : `SchemaConfig` or `str`
         Load configuration
+    datasetLayout : `str`, optional
+        How the DataUnit link values of Datasets are stored; one of
+        `DATASET_LAYOUTS`.  With ``"single"`` (default) every link column is
+        appended to the ``Dataset`` table.  With ``"partitioned"`` the
+        ``Dataset`` table holds no link columns, and the link values of each
+        Dataset are stored in a narrow table dedicated to its DatasetType's
+        combination of links (see `getDatasetTable`).
 
     Attributes
     ----------
     metadata : `sqlalchemy.MetaData`
         The sqlalchemy schema description.
     """
-    def __init__(self, config):
+
+    DATASET_LAYOUTS = ("single", "partitioned")
+
+    def __init__(self, config, datasetLayout="single"):
         if isinstance(config, str):
             config = SchemaConfig(config)
+        if datasetLayout not in self.DATASET_LAYOUTS:
+            raise ValueError("Unknown Dataset layout: {}".format(datasetLayout))
         self.config = config
+        self.datasetLayout = datasetLayout
         self.builder = SchemaBuilder()
         self.dataUnits = DataUnitRegistry.fromConfig(config['dataUnits'], self.builder)
         self.buildFromConfig(config)
@@ -58,11 +71,56 @@ class Schema:
     def buildFromConfig(self, config):
         for tableName, tableDescription in self.config['tables'].items():
             self.builder.addTable(tableName, tableDescription)
-        datasetTable = self.builder.metadata.tables['Dataset']
-        for linkColumn in self.dataUnits.links.values():
-            datasetTable.append_column(linkColumn)
+        if self.datasetLayout == "single":
+            datasetTable = self.builder.metadata.tables['Dataset']
+            for linkColumn in self.dataUnits.links.values():
+                datasetTable.append_column(linkColumn)
+        if 'CollectionSummary' in self.builder.metadata.tables:
+            summaryTable = self.builder.metadata.tables['CollectionSummary']
+            for linkName, linkColumn in self.dataUnits.links.items():
+                summaryTable.append_column(Column("min_{}".format(linkName), linkColumn.type))
+                summaryTable.append_column(Column("max_{}".format(linkName), linkColumn.type))
         self.metadata = self.builder.metadata
 
+    def getDatasetTable(self, linkNames):
+        """Return the table holding the DataUnit link values of Datasets
+        that are identified by the given links.
+
+        The returned table always has ``dataset_id`` and
+        ``dataset_type_name`` columns as well as one column per link.  In
+        the ``"single"`` layout (or if there are no links) this is the
+        ``Dataset`` table itself.  In the ``"partitioned"`` layout it is a
+        table named after the links, which is added to `metadata` (but not
+        created in the database) the first time it is requested.  Its rows
+        reference ``Dataset`` rows and are indexed on
+        ``(dataset_type_name, <links>)``.
+
+        Parameters
+        ----------
+        linkNames : iterable of `str`
+            Names of the link columns (as returned by
+            `DataUnitRegistry.getPrimaryKeyNames`).
+
+        Returns
+        -------
+        table : `sqlalchemy.Table`
+            The table holding the link columns.
+        """
+        linkNames = sorted(linkNames)
+        if self.datasetLayout == "single" or not linkNames:
+            return self.metadata.tables['Dataset']
+        tableName = "Dataset_{}".format("_".join(linkNames))
+        if tableName not in self.metadata.tables:
+            table = self.builder.addTable(tableName, {
+                "columns": [{"name": "dataset_id", "type": "int", "primary_key": True, "nullable": False},
+                            {"name": "dataset_type_name", "type": "string", "nullable": False}],
+                "foreignKeys": [{"src": "dataset_id", "tgt": "Dataset.dataset_id"}],
+            })
+            for linkName in linkNames:
+                table.append_column(self.dataUnits.links[linkName].copy())
+            self.builder.addIndex(tableName, ["dataset_type_name"] + linkNames)
+        return self.metadata.tables[tableName]
+
 
 class SchemaBuilder:
     """Builds a Schema step-by-step.
@@ -91,6 +149,9 @@ class SchemaBuilder:
             Requires:
             - columns, a list of column descriptions
             - foreignKeys, a list of foreign-key constraint descriptions
+            May contain:
+            - indexes, a list of index descriptions (each a list of
+              column names)
 
         Raises
         ------
@@ -108,6 +169,9 @@ class SchemaBuilder:
         if "foreignKeys" in tableDescription:
             for constraintDescription in tableDescription["foreignKeys"]:
                 self.addForeignKeyConstraint(tableName, constraintDescription)
+        if "indexes" in tableDescription:
+            for indexDescription in tableDescription["indexes"]:
+                self.addIndex(tableName, indexDescription)
         return table
 
     def addColumn(self, tableName, columnDescription):
@@ -147,6 +211,26 @@ class SchemaBuilder:
         table = self.metadata.tables[tableName]
         table.append_constraint(self.makeForeignKeyConstraint(constraintDescription))
 
+    def addIndex(self, tableName, indexDescription):
+        """Add an Index to a table.
+
+        Parameters
+        ----------
+        tableName : `str`
+            Key of the table.
+        indexDescription : `list` of `str`
+            Names of the (already added) columns to index, in order.
+
+        Returns
+        -------
+        index : `sqlalchemy.Index`
+            The created `Index` entry.
+        """
+        table = self.metadata.tables[tableName]
+        columnNames = tuple(iterable(indexDescription))
+        name = "{}_{}_idx".format(tableName, "_".join(columnNames))
+        return Index(name, *(table.columns[columnName] for columnName in columnNames))
+
     def makeColumn(self, columnDescription):
         """Make a Column entry for addition to a Table.
 
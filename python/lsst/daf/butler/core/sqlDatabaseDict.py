@@ -21,12 +21,13 @@
 
 from datetime import datetime
 
-from sqlalchemy import create_engine, Table, MetaData, Column, \
+from sqlalchemy import create_engine, inspect, Table, MetaData, Column, \
     String, Integer, Boolean, LargeBinary, DateTime, Float
 from sqlalchemy.sql import select, bindparam, func
 from sqlalchemy.exc import IntegrityError, StatementError
 
 from .databaseDict import DatabaseDict
+from .utils import chunked
 
 
 class SqlDatabaseDict(DatabaseDict):
@@ -64,11 +65,26 @@ class SqlDatabaseDict(DatabaseDict):
     engine : `sqlalchemy.engine.Engine`
         A SQLAlchemy connection object.  If not None, ``config["db"]`` is
         ignored.
+
+    Notes
+    -----
+    Instances hold no state besides the engine and may be shared between
+    threads, provided the engine can be: every operation runs in its own
+    transaction on a connection checked out for that operation.  Engines
+    shared with a `SqlRegistry` (see `SqlRegistry.makeDatabaseDict`) meet
+    this requirement.
+
+    Columns in ``types`` that are missing from an existing table (fields
+    added to ``value`` since the table was created) are added to it; they
+    are NULL in the existing rows.
     """
 
     COLUMN_TYPES = {str: String, int: Integer, float: Float,
                     bool: Boolean, bytes: LargeBinary, datetime: DateTime}
 
+    MAX_IN_CLAUSE_SIZE = 500
+    """Maximum number of keys bound in a single ``IN`` clause."""
+
     def __init__(self, config, types, key, value, engine=None):
         allColumns = []
         for name, type_ in types.items():
@@ -88,14 +104,32 @@ class SqlDatabaseDict(DatabaseDict):
         metadata = MetaData()
         self._table = Table(config["table"], metadata, *allColumns)
         metadata.create_all(self._engine)
+        self._addMissingColumns()
         valueColumns = [getattr(self._table.columns, name) for name in self._value._fields]
         keyColumn = getattr(self._table.columns, key)
         self._getSql = select(valueColumns).where(keyColumn == bindparam("key"))
         self._updateSql = self._table.update().where(keyColumn == bindparam("key"))
         self._delSql = self._table.delete().where(keyColumn == bindparam("key"))
+        self._delManySql = self._table.delete().where(keyColumn.in_(bindparam("keys", expanding=True)))
+        self._getManySql = select([keyColumn] + valueColumns).where(
+            keyColumn.in_(bindparam("keys", expanding=True)))
         self._keysSql = select([keyColumn])
+        self._batchSql = select([keyColumn] + valueColumns).order_by(keyColumn).limit(bindparam("limit"))
+        self._batchAfterSql = self._batchSql.where(keyColumn > bindparam("after"))
         self._lenSql = select([func.count(keyColumn)])
 
+    def _addMissingColumns(self):
+        """Add the columns of the table that do not exist in the database.
+        """
+        existing = {column["name"] for column in inspect(self._engine).get_columns(self._table.name)}
+        quote = self._engine.dialect.identifier_preparer.quote
+        with self._engine.begin() as connection:
+            for column in self._table.columns:
+                if column.name not in existing:
+                    connection.execute("ALTER TABLE {} ADD COLUMN {} {}".format(
+                        quote(self._table.name), quote(column.name),
+                        column.type.compile(dialect=self._engine.dialect)))
+
     def __getitem__(self, key):
         with self._engine.begin() as connection:
             row = connection.execute(self._getSql, key=key).fetchone()
@@ -146,5 +180,54 @@ class SqlDatabaseDict(DatabaseDict):
         with self._engine.begin() as connection:
             return connection.execute(self._lenSql).scalar()
 
+    def getMany(self, keys):
+        # Docstring inherited from DatabaseDict.getMany
+        values = {}
+        with self._engine.begin() as connection:
+            for chunk in chunked(list(keys), self.MAX_IN_CLAUSE_SIZE):
+                for row in connection.execute(self._getManySql, keys=chunk).fetchall():
+                    values[row[0]] = self._value._make(row[1:])
+        return values
+
+    def delMany(self, keys):
+        # Docstring inherited from DatabaseDict.delMany
+        with self._engine.begin() as connection:
+            for chunk in chunked(list(keys), self.MAX_IN_CLAUSE_SIZE):
+                connection.execute(self._delManySql, keys=chunk)
+
+    def getBatch(self, after=None, limit=1000):
+        # Docstring inherited from DatabaseDict.getBatch
+        with self._engine.begin() as connection:
+            if after is None:
+                rows = connection.execute(self._batchSql, limit=limit).fetchall()
+            else:
+                rows = connection.execute(self._batchAfterSql, after=after, limit=limit).fetchall()
+            return [(row[0], self._value._make(row[1:])) for row in rows]
+
+    def setMany(self, items):
+        # Docstring inherited from DatabaseDict.setMany
+        rows = {}
+        for key, value in items:
+            assert isinstance(value, self._value)
+            rows[key] = value._asdict()
+        with self._engine.begin() as connection:
+            existing = set()
+            for chunk in chunked(list(rows), self.MAX_IN_CLAUSE_SIZE):
+                existing.update(key for key, in connection.execute(
+                    select([self._table.columns[self._key]]).where(
+                        self._table.columns[self._key].in_(chunk))).fetchall())
+            inserts = [dict(kwds, **{self._key: key}) for key, kwds in rows.items() if key not in existing]
+            try:
+                if inserts:
+                    connection.execute(self._table.insert(), inserts)
+                for key in existing:
+                    connection.execute(self._updateSql, key=key, **rows[key])
+            except StatementError as err:
+                # An IntegrityError (e.g. a key inserted concurrently) is a
+                # StatementError too, but not a data type problem.
+                if isinstance(err, IntegrityError):
+                    raise
+                raise TypeError("Bad data types in value: {}".format(err))
+
     # TODO: add custom view objects for at views() and items(), so we don't
     # invoke a __getitem__ call for every key.
@@ -22,6 +22,7 @@
 """Support for Storage Classes."""
 
 import builtins
+import threading
 
 from .utils import doImport, Singleton
 from .composites import CompositeAssembler
@@ -141,6 +142,9 @@ class StorageClassFactory(metaclass=Singleton):
     To populate the factory with storage classes, a call to
     `~StorageClassFactory.addFromConfig()` should be made.
 
+    The factory is thread-safe: registration of new storage classes is
+    serialized, and lookups may run concurrently with it.
+
     Parameters
     ----------
     config : `StorageClassConfig` or `str`, optional
@@ -150,6 +154,7 @@ class StorageClassFactory(metaclass=Singleton):
     def __init__(self, config=None):
         self._storageClasses = {}
         self._configs = []
+        self._lock = threading.RLock()
 
         if config is not None:
             self.addFromConfig(config)
@@ -193,6 +198,11 @@ class StorageClassFactory(metaclass=Singleton):
             ``storageClasses`` key.
         """
         sconfig = StorageClassConfig(config)['storageClasses']
+        with self._lock:
+            self._addFromConfig(sconfig)
+
+    def _addFromConfig(self, sconfig):
+        """Implementation of `addFromConfig`; caller must hold the lock."""
         self._configs.append(sconfig)
 
         for name, info in sconfig.items():
@@ -250,4 +260,5 @@ class StorageClassFactory(metaclass=Singleton):
             If a storage class has already been registered with
             storageClassName and the previous definition differs.
         """
-        self._storageClasses[storageClass.name] = storageClass
+        with self._lock:
+            self._storageClasses[storageClass.name] = storageClass
@@ -40,6 +40,10 @@ class StoredFileInfo:
         `StorageClass` used when writing the file. This can differ from that
         used to read the file if a component is being requested from
         a concrete composite.
+    checksum : `str`, optional
+        Checksum of the file.
+    size : `int`, optional
+        Size of the file in bytes.
 
     See Also
     --------
@@ -47,9 +51,9 @@ class StoredFileInfo:
     """
 
     __eq__ = slotValuesAreEqual
-    __slots__ = ("_formatter", "_path", "_storageClass")
+    __slots__ = ("_formatter", "_path", "_storageClass", "_checksum", "_size")
 
-    def __init__(self, formatter, path, storageClass):
+    def __init__(self, formatter, path, storageClass, checksum=None, size=None):
         assert isinstance(formatter, str) or isinstance(formatter, Formatter)
         if isinstance(formatter, Formatter):
             formatter = formatter.name()
@@ -58,6 +62,8 @@ class StoredFileInfo:
         self._path = path
         assert isinstance(storageClass, StorageClass)
         self._storageClass = storageClass
+        self._checksum = checksum
+        self._size = size
 
     @property
     def formatter(self):
@@ -76,3 +82,15 @@ class StoredFileInfo:
         """StorageClass used (`StorageClass`).
         """
         return self._storageClass
+
+    @property
+    def checksum(self):
+        """Checksum of the file (`str`), or `None` if not recorded.
+        """
+        return self._checksum
+
+    @property
+    def size(self):
+        """Size of the file in bytes (`int`), or `None` if not recorded.
+        """
+        return self._size
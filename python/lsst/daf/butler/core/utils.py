@@ -19,6 +19,7 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import threading
 from collections import namedtuple
 
 
@@ -51,6 +52,25 @@ def iterable(a):
         yield a
 
 
+def chunked(sequence, size):
+    """Split a sequence into consecutive chunks.
+
+    Parameters
+    ----------
+    sequence : sequence
+        Sequence (supporting ``len`` and slicing) to split.
+    size : `int`
+        Maximum number of elements in each chunk.
+
+    Yields
+    ------
+    chunk : sequence
+        Slice of ``sequence`` holding at most ``size`` elements.
+    """
+    for start in range(0, len(sequence), size):
+        yield sequence[start:start + size]
+
+
 def allSlots(self):
     """
     Return combined ``__slots__`` for all classes in objects mro.
@@ -126,6 +146,10 @@ def getFullTypeName(cls):
     return cls.__module__ + "." + cls.__qualname__
 
 
+_imported = {}
+"""Objects imported by `doImport`, keyed by their full name."""
+
+
 def doImport(pythonType):
     """Import a python object given an importable string and return the
     type object
@@ -152,6 +176,12 @@ def doImport(pythonType):
     """
     if not isinstance(pythonType, str):
         raise TypeError("Unhandled type of pythonType, val:%s" % pythonType)
+    # Imports are cached for the process
+    try:
+        return _imported[pythonType]
+    except KeyError:
+        pass
+    name = pythonType
     try:
         # import this pythonType dynamically
         pythonTypeTokenList = pythonType.split('.')
@@ -160,18 +190,17 @@ def doImport(pythonType):
         importPackage = ".".join(pythonTypeTokenList)
         importType = __import__(importPackage, globals(), locals(), [importClassString], 0)
         pythonType = getattr(importType, importClassString)
-        return pythonType
     except ImportError:
-        pass
-    # maybe python type is a member function, in the form: path.to.object.Class.funcname
-    pythonTypeTokenList = pythonType.split('.')
-    importClassString = '.'.join(pythonTypeTokenList[0:-1])
-    importedClass = doImport(importClassString)
-    pythonType = getattr(importedClass, pythonTypeTokenList[-1])
+        # maybe python type is a member function, in the form: path.to.object.Class.funcname
+        pythonTypeTokenList = pythonType.split('.')
+        importClassString = '.'.join(pythonTypeTokenList[0:-1])
+        importedClass = doImport(importClassString)
+        pythonType = getattr(importedClass, pythonTypeTokenList[-1])
+    _imported[name] = pythonType
     return pythonType
 
 
-def getInstanceOf(typeOrName):
+def getInstanceOf(typeOrName, **kwargs):
     """Given the type name or a type, instantiate an object of that type.
 
     If a type name is given, an attempt will be made to import the type.
@@ -180,12 +209,14 @@ def getInstanceOf(typeOrName):
     ----------
     typeOrName : `str` or Python class
         A string describing the Python class to load or a Python type.
+    **kwargs
+        Keyword arguments passed to the constructor.
     """
     if isinstance(typeOrName, str):
         cls = doImport(typeOrName)
     else:
         cls = typeOrName
-    return cls()
+    return cls(**kwargs)
 
 
 class Singleton(type):
@@ -197,13 +228,19 @@ class Singleton(type):
     Therefore since you do not know if the constructor has been called yet it
     is safer to always call it with no arguments and then call a method to
     adjust state of the singleton.
+
+    Instantiation is thread-safe: concurrent first calls construct a
+    single instance.
     """
 
     _instances = {}
+    _lock = threading.Lock()
 
     def __call__(cls):  # noqa N805
         if cls not in cls._instances:
-            cls._instances[cls] = super(Singleton, cls).__call__()
+            with Singleton._lock:
+                if cls not in cls._instances:
+                    cls._instances[cls] = super(Singleton, cls).__call__()
         return cls._instances[cls]
 
 
@@ -0,0 +1,321 @@
+# This file is part of daf_butler.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (http://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Chained datastore."""
+
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from lsst.log import Log
+
+from lsst.daf.butler.core.config import Config
+from lsst.daf.butler.core.datastore import Datastore
+
+__all__ = ("ChainedDatastore", )
+
+
+class ChainedDatastore(Datastore):
+    """Chain of Datastores, typically a fast tier in front of a durable one.
+
+    Each child `Datastore` is configured by an entry of ``datastores`` in
+    the configuration; keys not given there (other than those of the chain
+    itself) are inherited from the chain's configuration.  Children record
+    their storage of Datasets in the registry under their own names.
+
+    Writes go to the first child and then to the others, either before
+    `put` returns (``putPolicy: writeThrough``, the default) or in a
+    background thread (``putPolicy: writeBack``; see `flush`).  Failed
+    write-back writes are logged as errors to the ``daf.butler.datastore``
+    logger as soon as they fail, and raised by the next `flush`.  Reads are
+    served by the first child holding the Dataset (and able to apply the
+    read parameters) and, with ``promoteOnRead``, copy it into the children
+    before that one.
+
+    Attributes
+    ----------
+    config : `DatastoreConfig`
+        Configuration used to create Datastore.
+    registry : `Registry`
+        `Registry` to use when recording the writing of Datasets.
+    name : `str`
+        Label associated with this Datastore.
+    datastores : `list` of `Datastore`
+        The children, fastest first.
+    putPolicy : `str`
+        ``"writeThrough"`` or ``"writeBack"``.
+    promoteOnRead : `bool`
+        Whether `get` copies Datasets into the children before the one that
+        held them.
+
+    Parameters
+    ----------
+    config : `DatastoreConfig` or `str`
+        Configuration.
+
+    Raises
+    ------
+    ValueError
+        The configuration has no children or an unknown put policy.
+    """
+
+    PUT_POLICIES = ("writeThrough", "writeBack")
+
+    _CHAIN_KEYS = ("cls", "datastores", "putPolicy", "promoteOnRead")
+
+    def __init__(self, config, registry):
+        super().__init__(config, registry)
+        childConfigs = self.config["datastores"]
+        if not childConfigs:
+            raise ValueError("ChainedDatastore needs at least one datastore in 'datastores'")
+        self.datastores = []
+        for childConfig in childConfigs:
+            config = Config({key: value for key, value in self.config.items() if key not in self._CHAIN_KEYS})
+            config.update(childConfig)
+            self.datastores.append(Datastore.fromConfig(Config({"datastore": config.data}), registry))
+        self.name = "ChainedDatastore[{}]".format(", ".join(d.name for d in self.datastores))
+
+        self.putPolicy = self.config["putPolicy"] if "putPolicy" in self.config else "writeThrough"
+        if self.putPolicy not in self.PUT_POLICIES:
+            raise ValueError("Unknown putPolicy {!r}; expected one of {}".format(
+                             self.putPolicy, self.PUT_POLICIES))
+        self.promoteOnRead = bool(self.config["promoteOnRead"]) if "promoteOnRead" in self.config else False
+
+        # Pending write-back writes and the errors of failed ones not yet
+        # raised by flush, as dataset_ids keyed by future
+        self._pending = {}
+        self._errors = {}
+        self._pendingLock = threading.Lock()
+        self._executor = None
+        self._log = Log.getLogger("daf.butler.datastore")
+
+    def exists(self, ref):
+        """Check if the dataset exists in the datastore.
+
+        Parameters
+        ----------
+        ref : `DatasetRef`
+            Reference to the required dataset.
+
+        Returns
+        -------
+        exists : `bool`
+            `True` if the entity exists in any child `Datastore`.
+        """
+        return any(datastore.exists(ref) for datastore in self.datastores)
+
+    def get(self, ref, parameters=None):
+        """Load an InMemoryDataset from the first child holding it.
+
+        Parameters
+        ----------
+        ref : `DatasetRef`
+            Reference to the required Dataset.
+        parameters : `dict`
+            `StorageClass`-specific parameters that specify a slice of the
+            Dataset to be loaded.
+
+        Returns
+        -------
+        inMemoryDataset : `object`
+            Requested Dataset or slice thereof as an InMemoryDataset.
+
+        Raises
+        ------
+        FileNotFoundError
+            No child holds the Dataset.
+        ValueError
+            No child holding the Dataset could apply the parameters.
+        """
+        error = None
+        for index, datastore in enumerate(self.datastores):
+            try:
+                inMemoryDataset = datastore.get(ref, parameters)
+            except FileNotFoundError:
+                continue
+            except ValueError as e:
+                # The child may not support the parameters; try the next
+                if not parameters:
+                    raise
+                error = e
+                continue
+            if self.promoteOnRead and index > 0 and not parameters:
+                self._promote(inMemoryDataset, ref, self.datastores[:index])
+            return inMemoryDataset
+        if error is not None:
+            raise error
+        raise FileNotFoundError("Dataset {} not in any datastore of {}".format(ref, self.name))
+
+    def _promote(self, inMemoryDataset, ref, datastores):
+        """Copy a Dataset read from a later child into earlier ones.
+
+        Component reads are not promoted: the children store whole
+        Datasets.
+        """
+        if ref.datasetType.component() is not None:
+            return
+        for datastore in datastores:
+            datastore.put(inMemoryDataset, ref)
+
+    def put(self, inMemoryDataset, ref):
+        """Write a InMemoryDataset with a given `DatasetRef` to the store.
+
+        Parameters
+        ----------
+        inMemoryDataset : `object`
+            The Dataset to store.
+        ref : `DatasetRef`
+            Reference to the associated Dataset.
+        """
+        first, others = self.datastores[0], self.datastores[1:]
+        first.put(inMemoryDataset, ref)
+        if not others:
+            return
+        if self.putPolicy == "writeThrough":
+            for datastore in others:
+                datastore.put(inMemoryDataset, ref)
+            return
+        with self._pendingLock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1)
+                # Queued writes hold a reference to the chain, so none is
+                # pending when it goes away; the last reference may be
+                # dropped in the worker thread, which cannot wait for itself
+                weakref.finalize(self, self._executor.shutdown, wait=False)
+            future = self._executor.submit(self._flushOne, inMemoryDataset, ref, others)
+            self._pending[future] = ref.id
+        future.add_done_callback(self._onWriteBackDone)
+
+    def _onWriteBackDone(self, future):
+        """Forget a completed write-back write, logging and keeping its
+        error for `flush` unless `flush` already collected it.
+        """
+        with self._pendingLock:
+            datasetId = self._pending.pop(future, None)
+            if datasetId is None or future.exception() is None:
+                return
+            self._errors[future] = datasetId
+        self._log.error("Write-back of Dataset {} in {} failed: {}".format(datasetId, self.name,
+                                                                          future.exception()))
+
+    def _flushOne(self, inMemoryDataset, ref, datastores):
+        """Write a Dataset to the durable children (in the write-back
+        thread).
+        """
+        for datastore in datastores:
+            datastore.put(inMemoryDataset, ref)
+
+    def flush(self, ref=None):
+        """Wait for write-back writes to complete.
+
+        Parameters
+        ----------
+        ref : `DatasetRef`, optional
+            Only wait for this Dataset.
+
+        Raises
+        ------
+        Exception
+            The first error raised by a write-back write (including those
+            that failed since the last `flush`); all pending writes are
+            waited for before it is raised.
+        """
+        with self._pendingLock:
+            futures = [future for future, datasetId in self._pending.items()
+                       if ref is None or datasetId == ref.id]
+        wait(futures)
+        with self._pendingLock:
+            for future in futures:
+                self._pending.pop(future, None)
+                self._errors.pop(future, None)
+            failed = [future for future, datasetId in self._errors.items()
+                      if ref is None or datasetId == ref.id]
+            for future in failed:
+                del self._errors[future]
+        for future in futures + failed:
+            future.result()
+
+    def getUri(self, ref, predict=False):
+        """URI to the Dataset in the first child holding it.
+
+        Parameters
+        ----------
+        ref : `DatasetRef`
+            Reference to the required Dataset.
+        predict : `bool`
+            If `True`, allow URIs to be returned of datasets that have not
+            been written, as predicted by the first child.
+
+        Returns
+        -------
+        uri : `str`
+            URI string pointing to the Dataset within the datastore.
+
+        Raises
+        ------
+        FileNotFoundError
+            A URI has been requested for a dataset that does not exist and
+            guessing is not allowed.
+        """
+        for datastore in self.datastores:
+            if datastore.exists(ref):
+                return datastore.getUri(ref)
+        if not predict:
+            raise FileNotFoundError("Dataset {} not in this datastore".format(ref))
+        return self.datastores[0].getUri(ref, predict=True)
+
+    def remove(self, ref):
+        """Remove a Dataset from all children holding it.
+
+        Parameters
+        ----------
+        ref : `DatasetRef`
+            Reference to the required Dataset.
+
+        Raises
+        ------
+        FileNotFoundError
+            No child holds the Dataset.
+        """
+        self.flush(ref)
+        found = False
+        for datastore in self.datastores:
+            if datastore.exists(ref):
+                datastore.remove(ref)
+                found = True
+        if not found:
+            raise FileNotFoundError("Requested dataset ({}) does not exist".format(ref))
+
+    def transfer(self, inputDatastore, ref):
+        """Retrieve a Dataset from an input `Datastore`,
+        and store the result in this `Datastore`.
+
+        Parameters
+        ----------
+        inputDatastore : `Datastore`
+            The external `Datastore` from which to retreive the Dataset.
+        ref : `DatasetRef`
+            Reference to the required Dataset in the input data store.
+        """
+        assert inputDatastore is not self  # unless we want it for renames?
+        inMemoryDataset = inputDatastore.get(ref)
+        return self.put(inMemoryDataset, ref)
@@ -0,0 +1,330 @@
+# This file is part of daf_butler.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (http://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""In-memory datastore."""
+
+import sys
+import threading
+import weakref
+from collections import namedtuple, OrderedDict
+
+from lsst.daf.butler.core.datastore import Datastore
+from lsst.daf.butler.core.storageInfo import StorageInfo
+
+__all__ = ("InMemoryDatastore", )
+
+
+def estimateSize(obj):
+    """Estimate the memory used by an object and what it refers to.
+
+    Objects with an ``nbytes`` attribute (e.g. `numpy.ndarray`) report
+    their own size; containers and instance attributes are followed.
+
+    Parameters
+    ----------
+    obj : `object`
+        Object to size.
+
+    Returns
+    -------
+    size : `int`
+        Approximate size in bytes.
+    """
+    seen = set()
+    size = 0
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        nbytes = getattr(item, "nbytes", None)
+        if isinstance(nbytes, int):
+            size += nbytes
+            continue
+        size += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+        elif hasattr(item, "__dict__") and not isinstance(item, type):
+            stack.append(item.__dict__)
+    return size
+
+
+def _removeStorageInfos(registry, name, refsByParent):
+    """Remove the storage information of all Datasets still held by an
+    `InMemoryDatastore` that is going away."""
+    refs = [ref for refs in list(refsByParent.values()) for ref in refs]
+    if refs:
+        registry.removeStorageInfoMany(name, refs)
+
+
+class InMemoryDatastore(Datastore):
+    """Basic Datastore for keeping Datasets in memory.
+
+    Datasets are held by reference (they are neither copied nor
+    serialized), so this `Datastore` suits intermediates produced and
+    consumed in the same process.  With ``maxSize`` in the configuration
+    the least recently used Datasets are evicted to keep the estimated
+    total size of the stored objects within that many bytes.
+
+    The storage information recorded in the `Registry` for the stored
+    Datasets is removed when the `Datastore` is garbage collected or the
+    process exits, so that it does not outlive the Datasets themselves.
+
+    Attributes
+    ----------
+    config : `DatastoreConfig`
+        Configuration used to create Datastore.
+    registry : `Registry`
+        `Registry` to use when recording the writing of Datasets.
+    name : `str`
+        Label associated with this Datastore (from ``name`` in the
+        configuration, default ``InMemoryDatastore``).
+    maxSize : `int` or `None`
+        Memory budget in bytes, or `None` for no limit.
+
+    Parameters
+    ----------
+    config : `DatastoreConfig` or `str`
+        Configuration.
+    """
+
+    StoredItem = namedtuple("InMemoryDatastoreItem", ["parentId", "storageClass"])
+
+    def __init__(self, config, registry):
+        super().__init__(config, registry)
+        self.name = self.config["name"] if "name" in self.config else "InMemoryDatastore"
+        self.maxSize = self.config["maxSize"] if "maxSize" in self.config else None
+
+        # Stored objects and their estimated sizes, keyed by dataset_id, in
+        # least-recently-used order
+        self._datasets = OrderedDict()
+        self._sizes = {}
+        self.size = 0
+
+        # The Dataset and StorageClass of each dataset_id, and the refs
+        # (itself and its components) recorded with each stored Dataset
+        self._records = {}
+        self._refs = {}
+        self._lock = threading.RLock()
+        self._finalizer = weakref.finalize(self, _removeStorageInfos, self.registry, self.name, self._refs)
+
+    def exists(self, ref):
+        """Check if the dataset exists in the datastore.
+
+        Parameters
+        ----------
+        ref : `DatasetRef`
+            Reference to the required dataset.
+
+        Returns
+        -------
+        exists : `bool`
+            `True` if the entity exists in the `Datastore`.
+        """
+        return ref.id in self._records
+
+    def get(self, ref, parameters=None):
+        """Load an InMemoryDataset from the store.
+
+        Parameters
+        ----------
+        ref : `DatasetRef`
+            Reference to the required Dataset.
+        parameters : `dict`
+            `StorageClass`-specific parameters that specify a slice of the
+            Dataset to be loaded; not supported by this `Datastore` for the
+            Datasets it holds.
+
+        Returns
+        -------
+        inMemoryDataset : `object`
+            Requested Dataset or slice thereof as an InMemoryDataset.
+
+        Raises
+        ------
+        FileNotFoundError
+            Requested dataset can not be retrieved.
+        TypeError
+            Return value from formatter has unexpected type.
+        ValueError
+            Parameters were given for a Dataset held by this `Datastore`, or
+            the component could not be extracted.
+        """
+        with self._lock:
+            record = self._records.get(ref.id)
+            if record is None:
+                raise FileNotFoundError("Could not retrieve Dataset {}".format(ref))
+            if parameters:
+                raise ValueError("{} does not support parameters".format(self.name))
+            inMemoryDataset = self._datasets[record.parentId]
+            self._datasets.move_to_end(record.parentId)
+
+        # Components are extracted from the stored composite
+        readStorageClass = ref.datasetType.storageClass
+        comp = ref.datasetType.component()
+        if comp is not None and readStorageClass != record.storageClass:
+            try:
+                inMemoryDataset = record.storageClass.assembler().getComponent(inMemoryDataset, comp)
+            except AttributeError:
+                inMemoryDataset = None
+            if inMemoryDataset is None:
+                raise ValueError("Unable to read component {} of Dataset {}".format(comp, ref.id))
+
+        # Validate the returned data type matches the expected data type
+        pytype = readStorageClass.pytype
+        if pytype and not isinstance(inMemoryDataset, pytype):
+            raise TypeError("Got type {} from datastore but expected {}".format(
+                            type(inMemoryDataset), pytype))
+        return inMemoryDataset
+
+    def put(self, inMemoryDataset, ref):
+        """Write a InMemoryDataset with a given `DatasetRef` to the store.
+
+        Parameters
+        ----------
+        inMemoryDataset : `object`
+            The Dataset to store.
+        ref : `DatasetRef`
+            Reference to the associated Dataset.
+
+        Raises
+        ------
+        ValueError
+            The object is not of the type of the `StorageClass` of ``ref``.
+        """
+        storageClass = ref.datasetType.storageClass
+        if not isinstance(inMemoryDataset, storageClass.pytype):
+            raise ValueError("Inconsistency between supplied object ({}) "
+                             "and storage class type ({})".format(type(inMemoryDataset), storageClass.pytype))
+
+        size = estimateSize(inMemoryDataset)
+        storageInfo = StorageInfo(self.name, None, size)
+        refs = [ref] + list(ref.components.values())
+        # Replace a Dataset stored before under the same id
+        with self._lock:
+            previous = self._forget(ref.id) if ref.id in self._datasets else []
+        if previous:
+            self.registry.removeStorageInfoMany(self.name, previous)
+        self.registry.addStorageInfoMany([(r, storageInfo) for r in refs])
+
+        with self._lock:
+            self._datasets[ref.id] = inMemoryDataset
+            self._sizes[ref.id] = size
+            self.size += size
+            record = self.StoredItem(parentId=ref.id, storageClass=storageClass)
+            for r in refs:
+                self._records[r.id] = record
+            self._refs[ref.id] = refs
+
+            # Evict the least recently used Datasets, but never the new one
+            evicted = []
+            while self.maxSize is not None and self.size > self.maxSize and len(self._datasets) > 1:
+                datasetId = next(iter(self._datasets))
+                evicted.extend(self._forget(datasetId))
+        for r in evicted:
+            self.registry.removeStorageInfo(self.name, r)
+
+    def _forget(self, datasetId):
+        """Drop a stored Dataset; return the refs of it and its components.
+        """
+        del self._datasets[datasetId]
+        self.size -= self._sizes.pop(datasetId)
+        refs = self._refs.pop(datasetId)
+        for r in refs:
+            del self._records[r.id]
+        return refs
+
+    def getUri(self, ref, predict=False):
+        """URI to the Dataset.
+
+        Always uses "mem://" URI prefix.
+
+        Parameters
+        ----------
+        ref : `DatasetRef`
+            Reference to the required Dataset.
+        predict : `bool`
+            If `True`, allow URIs to be returned of datasets that have not
+            been written.
+
+        Returns
+        -------
+        uri : `str`
+            URI string pointing to the Dataset within the datastore. If the
+            Dataset does not exist in the datastore, and if ``predict`` is
+            `True`, the URI will be a prediction and will include a URI
+            fragment "#predicted".
+
+        Raises
+        ------
+        FileNotFoundError
+            A URI has been requested for a dataset that does not exist and
+            guessing is not allowed.
+        """
+        uri = "mem://{}".format(ref.id)
+        if not self.exists(ref):
+            if not predict:
+                raise FileNotFoundError("Dataset {} not in this datastore".format(ref))
+            uri += "#predicted"
+        return uri
+
+    def remove(self, ref):
+        """Indicate to the Datastore that a Dataset can be removed.
+
+        The Dataset is removed with all components stored with it.
+
+        Parameters
+        ----------
+        ref : `DatasetRef`
+            Reference to the required Dataset.
+
+        Raises
+        ------
+        FileNotFoundError
+            Attempt to remove a dataset that does not exist.
+        """
+        with self._lock:
+            record = self._records.get(ref.id)
+            if record is None:
+                raise FileNotFoundError("Requested dataset ({}) does not exist".format(ref))
+            removed = self._forget(record.parentId)
+        for r in removed:
+            self.registry.removeStorageInfo(self.name, r)
+
+    def transfer(self, inputDatastore, ref):
+        """Retrieve a Dataset from an input `Datastore`,
+        and store the result in this `Datastore`.
+
+        Parameters
+        ----------
+        inputDatastore : `Datastore`
+            The external `Datastore` from which to retreive the Dataset.
+        ref : `DatasetRef`
+            Reference to the required Dataset in the input data store.
+        """
+        assert inputDatastore is not self  # unless we want it for renames?
+        inMemoryDataset = inputDatastore.get(ref)
+        return self.put(inMemoryDataset, ref)
@@ -22,10 +22,16 @@
 """POSIX datastore."""
 
 import os
-import hashlib
-from collections import namedtuple
+import threading
+import weakref
+from collections import namedtuple, OrderedDict
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
 
 from lsst.daf.butler.core.safeFileIo import safeMakeDir
+from lsst.daf.butler.core.checksum import checkChecksumAlgorithm, computeChecksum
+from lsst.daf.butler.core.fileTransfer import TRANSFER_MODES, transferFile
+from lsst.daf.butler.core.fileCache import FileCache
 from lsst.daf.butler.core.datastore import Datastore
 from lsst.daf.butler.core.datastore import DatastoreConfig  # noqa F401
 from lsst.daf.butler.core.location import LocationFactory
@@ -34,7 +40,6 @@ from lsst.daf.butler.core.formatter import FormatterFactory
 from lsst.daf.butler.core.fileTemplates import FileTemplates
 from lsst.daf.butler.core.storageInfo import StorageInfo
 from lsst.daf.butler.core.storedFileInfo import StoredFileInfo
-from lsst.daf.butler.core.utils import getInstanceOf
 from lsst.daf.butler.core.storageClass import StorageClassFactory
 from ..core.databaseDict import DatabaseDict
 
@@ -55,13 +60,45 @@ class PosixDatastore(Datastore):
     locationFactory : `LocationFactory`
         Factory for creating locations relative to this root.
     formatterFactory : `FormatterFactory`
-        Factory for creating instances of formatters.
+        Factory for creating instances of formatters (from ``formatters``
+        in the configuration: for each type, the formatter class or a
+        mapping with the class in ``formatter`` and its constructor
+        parameters, such as ``compresslevel``).
     storageClassFactory : `StorageClassFactory`
         Factory for creating storage class instances from name.
     templates : `FileTemplates`
         File templates that can be used by this `Datastore`.
     name : `str`
         Label associated with this Datastore.
+    checksumAlgorithm : `str` or `None`
+        Name of the :py:mod:`hashlib` algorithm used for the checksums of
+        stored files (from ``checksum`` in the configuration, default
+        ``blake2b``); `None` if checksums are not computed.
+    deduplicate : `bool`
+        Whether files with the same content are stored once (from
+        ``deduplicate`` in the configuration, default `False`): each stored
+        file is a hard link to a content object named after its checksum,
+        in the ``.objects`` directory of the root, and an object is deleted
+        with the last file linked to it.
+    ignoreMissingOnRemove : `bool`
+        Whether `remove` and `removeMany` remove the records of Datasets
+        whose file is already missing (from ``ignoreMissingOnRemove`` in the
+        configuration, default `False`).
+    cache : `FileCache` or `None`
+        Local cache of copies of the files read (from ``cache.root``,
+        ``cache.maxSize`` and ``cache.maxAge`` in the configuration), or
+        `None` if files are read in place.
+    recordCacheSize : `int`
+        Maximum number of decoded file records kept in memory (from
+        ``recordCacheSize`` in the configuration, default 10000).
+    directoryCacheSize : `int`
+        Maximum number of directories remembered as existing, so that `put`
+        does not create them again (from ``directoryCacheSize`` in the
+        configuration, default 100000).
+    threads : `int` or `None`
+        Maximum number of threads used by `getMany` and `putMany` (from
+        ``threads`` in the configuration); `None` uses the default of
+        `concurrent.futures.ThreadPoolExecutor`.
 
     Parameters
     ----------
@@ -72,10 +109,11 @@ class PosixDatastore(Datastore):
     ------
     ValueError
         If root location does not exist and ``create`` is `False` in the
-        configuration.
+        configuration, or if ``deduplicate`` is set without checksums.
     """
 
-    RecordTuple = namedtuple("PosixDatastoreRecord", ["formatter", "path", "storage_class"])
+    RecordTuple = namedtuple("PosixDatastoreRecord",
+                             ["formatter", "path", "storage_class", "checksum", "size"])
 
     def __init__(self, config, registry):
         super().__init__(config, registry)
@@ -89,9 +127,15 @@ class PosixDatastore(Datastore):
         self.formatterFactory = FormatterFactory()
         self.storageClassFactory = StorageClassFactory()
 
-        # Now associate formatters with storage classes
+        # Now associate formatters with storage classes; an entry is either
+        # the formatter class or a mapping of it ("formatter") and the
+        # parameters of its constructor (e.g. "compresslevel")
         for name, f in self.config["formatters"].items():
-            self.formatterFactory.registerFormatter(name, f)
+            parameters = None
+            if isinstance(f, Mapping):
+                parameters = {k: v for k, v in f.items() if k != "formatter"}
+                f = f["formatter"]
+            self.formatterFactory.registerFormatter(name, f, parameters)
 
         # Read the file naming templates
         self.templates = FileTemplates(self.config["templates"])
@@ -99,12 +143,81 @@ class PosixDatastore(Datastore):
         # Name ourselves
         self.name = "POSIXDatastore@{}".format(self.root)
 
-        # Storage of paths and formatters, keyed by dataset_id
-        types = {"path": str, "formatter": str, "storage_class": str, "dataset_id": int}
+        # Storage of paths, formatters, checksums and sizes, keyed by
+        # dataset_id; everything get needs is in a single record.
+        types = {"path": str, "formatter": str, "storage_class": str, "checksum": str, "size": int,
+                 "dataset_id": int}
         self.records = DatabaseDict.fromConfig(self.config["records"], types=types,
                                                value=self.RecordTuple, key="dataset_id",
                                                registry=registry)
 
+        # Checksum policy; formatters that can hash while writing do so
+        self.checksumAlgorithm = self.config["checksum"] if "checksum" in self.config else "blake2b"
+        if self.checksumAlgorithm in (None, False, "none"):
+            self.checksumAlgorithm = None
+        else:
+            checkChecksumAlgorithm(self.checksumAlgorithm)
+
+        self.ignoreMissingOnRemove = bool(self.config["ignoreMissingOnRemove"])
+
+        # Content-addressed storage of identical files
+        self.deduplicate = bool(self.config["deduplicate"])
+        if self.deduplicate and self.checksumAlgorithm is None:
+            raise ValueError("Deduplication requires checksums")
+        self._objectsRoot = os.path.join(self.root, ".objects", str(self.checksumAlgorithm))
+
+        # Local copies of the files read
+        self.cache = None
+        if "cache.root" in self.config:
+            self.cache = FileCache(self.config["cache.root"], maxSize=self.config["cache.maxSize"],
+                                   maxAge=self.config["cache.maxAge"],
+                                   checksumAlgorithm=self.checksumAlgorithm)
+            self._cacheLocationFactory = LocationFactory(self.cache.root)
+
+        # Decoded records, keyed by dataset_id, in least-recently-used order
+        self.recordCacheSize = self.config["recordCacheSize"] if "recordCacheSize" in self.config else 10000
+        self._recordCache = OrderedDict()
+        self._recordCacheLock = threading.Lock()
+
+        # Directories known to exist, so that put need not look for (or
+        # create) them; sharded templates spread files over many of them
+        self.directoryCacheSize = (self.config["directoryCacheSize"]
+                                   if "directoryCacheSize" in self.config else 100000)
+        self._directories = set()
+
+        # Thread pool for getMany and putMany, created on first use
+        self.threads = self.config["threads"] if "threads" in self.config else None
+        self._executor = None
+        self._executorLock = threading.Lock()
+
+    def _getExecutor(self):
+        """Return the thread pool used by `getMany` and `putMany`."""
+        with self._executorLock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.threads)
+                # The last reference may be dropped in a worker thread,
+                # which cannot wait for itself
+                weakref.finalize(self, self._executor.shutdown, wait=False)
+            return self._executor
+
+    def _mapItems(self, function, items):
+        """Apply a function to items in the thread pool.
+
+        Returns
+        -------
+        results : `list` of `tuple`
+            ``(result, exception)`` for each item, in order; one of the two
+            is `None`.
+        """
+        futures = [self._getExecutor().submit(function, item) for item in items]
+        results = []
+        for future in futures:
+            try:
+                results.append((future.result(), None))
+            except Exception as err:
+                results.append((None, err))
+        return results
+
     def addStoredFileInfo(self, ref, info):
         """Record formatter information associated with this `DatasetRef`
 
@@ -116,7 +229,9 @@ class PosixDatastore(Datastore):
             Metadata associated with the stored Dataset.
         """
         self.records[ref.id] = self.RecordTuple(formatter=info.formatter, path=info.path,
-                                                storage_class=info.storageClass.name)
+                                                storage_class=info.storageClass.name,
+                                                checksum=info.checksum, size=info.size)
+        self._cacheStoredFileInfo({ref.id: info})
 
     def removeStoredFileInfo(self, ref):
         """Remove information about the file associated with this dataset.
@@ -126,6 +241,8 @@ class PosixDatastore(Datastore):
         ref : `DatasetRef`
             The Dataset that has been removed.
         """
+        with self._recordCacheLock:
+            self._recordCache.pop(ref.id, None)
         del self.records[ref.id]
 
     def getStoredFileInfo(self, ref):
@@ -148,12 +265,93 @@ class PosixDatastore(Datastore):
         KeyError
             Dataset with that id can not be found.
         """
+        with self._recordCacheLock:
+            info = self._recordCache.get(ref.id)
+            if info is not None:
+                self._recordCache.move_to_end(ref.id)
+                return info
         record = self.records.get(ref.id, None)
         if record is None:
             raise KeyError("Unable to retrieve formatter associated with Dataset {}".format(ref.id))
+        infos = self._completeStoredFileInfos([ref], {ref.id: self._makeStoredFileInfo(record)})
+        self._cacheStoredFileInfo(infos)
+        return infos[ref.id]
+
+    def getStoredFileInfoMany(self, refs):
+        """Retrieve information associated with several files stored in this
+        `Datastore`, with a single lookup.
+
+        Parameters
+        ----------
+        refs : iterable of `DatasetRef`
+            The Datasets that are to be queried.
+
+        Returns
+        -------
+        infos : `dict`
+            `StoredFileInfo` keyed by Dataset id.  Datasets that can not be
+            found are left out.
+        """
+        refs = list(refs)
+        infos = {}
+        missing = set()
+        with self._recordCacheLock:
+            for ref in refs:
+                info = self._recordCache.get(ref.id)
+                if info is None:
+                    missing.add(ref.id)
+                else:
+                    infos[ref.id] = info
+        if missing:
+            found = {datasetId: self._makeStoredFileInfo(record)
+                     for datasetId, record in self.records.getMany(missing).items()}
+            found = self._completeStoredFileInfos([ref for ref in refs if ref.id in found], found)
+            self._cacheStoredFileInfo(found)
+            infos.update(found)
+        return infos
+
+    def _makeStoredFileInfo(self, record):
+        """Decode a record into a `StoredFileInfo`."""
         # Convert name of StorageClass to instance
         storageClass = self.storageClassFactory.getStorageClass(record.storage_class)
-        return StoredFileInfo(record.formatter, record.path, storageClass)
+        return StoredFileInfo(record.formatter, record.path, storageClass,
+                              checksum=record.checksum, size=record.size)
+
+    def _completeStoredFileInfos(self, refs, infos):
+        """Fill in the checksums and sizes of records written before they
+        were stored in the records table, from the registry.
+
+        Parameters
+        ----------
+        refs : `list` of `DatasetRef`
+            The Datasets of ``infos``.
+        infos : `dict`
+            `StoredFileInfo` keyed by Dataset id.
+
+        Returns
+        -------
+        infos : `dict`
+            ``infos``, updated in place.
+        """
+        legacy = [ref for ref in refs if infos[ref.id].checksum is None and infos[ref.id].size is None]
+        if not legacy:
+            return infos
+        for datasetId, storageInfo in self.registry.getStorageInfoMany(legacy, self.name).items():
+            info = infos[datasetId]
+            infos[datasetId] = StoredFileInfo(info.formatter, info.path, info.storageClass,
+                                              checksum=storageInfo.checksum, size=storageInfo.size)
+        return infos
+
+    def _cacheStoredFileInfo(self, infos):
+        """Add decoded records to the cache, evicting the least recently
+        used ones beyond ``recordCacheSize``.
+        """
+        with self._recordCacheLock:
+            self._recordCache.update(infos)
+            for datasetId in infos:
+                self._recordCache.move_to_end(datasetId)
+            while len(self._recordCache) > self.recordCacheSize:
+                self._recordCache.popitem(last=False)
 
     def exists(self, ref):
         """Check if the dataset exists in the datastore.
@@ -204,26 +402,74 @@ class PosixDatastore(Datastore):
             Formatter failed to process the dataset.
         """
 
-        # Get file metadata and internal metadata
+        # Get file metadata and internal metadata; the record holds
+        # everything needed, and is usually cached
         try:
-            storageInfo = self.registry.getStorageInfo(ref, self.name)
             storedFileInfo = self.getStoredFileInfo(ref)
         except KeyError:
             raise FileNotFoundError("Could not retrieve Dataset {}".format(ref))
+        return self._read(ref, storedFileInfo, parameters)
+
+    def getMany(self, refs, parameters=None):
+        """Load several InMemoryDatasets from the store.
+
+        The file records of all refs that are not cached are retrieved with
+        a few batched queries; the files are then checked and read concurrently
+        in a thread pool (see ``threads``).
+
+        Parameters
+        ----------
+        refs : iterable of `DatasetRef`
+            References to the required Datasets.
+        parameters : `dict`, optional
+            `StorageClass`-specific parameters applied to every Dataset.
+
+        Returns
+        -------
+        results : `list`
+            For each ref, in order, the InMemoryDataset or the exception
+            `get` would have raised for it.
+        """
+        refs = list(refs)
+        storedFileInfos = self.getStoredFileInfoMany(refs)
+
+        def read(ref):
+            if ref.id not in storedFileInfos:
+                raise FileNotFoundError("Could not retrieve Dataset {}".format(ref))
+            return self._read(ref, storedFileInfos[ref.id], parameters)
 
+        return [result if err is None else err for result, err in self._mapItems(read, refs)]
+
+    def _read(self, ref, storedFileInfo, parameters):
+        """Read a Dataset given its file record; see `get`.
+        """
         # Use the path to determine the location
         location = self.locationFactory.fromPath(storedFileInfo.path)
 
-        # Too expensive to recalculate the checksum on fetch
-        # but we can check size and existence
-        if not os.path.exists(location.path):
-            raise FileNotFoundError("Dataset with Id {} does not seem to exist at"
-                                    " expected location of {}".format(ref.id, location.path))
-        stat = os.stat(location.path)
-        size = stat.st_size
-        if size != storageInfo.size:
-            raise RuntimeError("Integrity failure in Datastore. Size of file {} ({}) does not"
-                               " match recorded size of {}".format(location.path, size, storageInfo.size))
+        if self.cache is not None:
+            # Read a local copy, checked against the recorded size and
+            # checksum when it was made
+            try:
+                path = self.cache.getPath(ref.id, location.path, size=storedFileInfo.size,
+                                          checksum=storedFileInfo.checksum)
+            except FileNotFoundError:
+                raise FileNotFoundError("Dataset with Id {} does not seem to exist at"
+                                        " expected location of {}".format(ref.id, location.path))
+            if path != location.path:
+                location = self._cacheLocationFactory.fromPath(os.path.relpath(path, self.cache.root))
+        else:
+            # Too expensive to recalculate the checksum on fetch
+            # but we can check size and existence, with a single stat
+            try:
+                stat = os.stat(location.path)
+            except FileNotFoundError:
+                raise FileNotFoundError("Dataset with Id {} does not seem to exist at"
+                                        " expected location of {}".format(ref.id, location.path))
+            size = stat.st_size
+            if storedFileInfo.size is not None and size != storedFileInfo.size:
+                raise RuntimeError("Integrity failure in Datastore. Size of file {} ({}) does not"
+                                   " match recorded size of {}".format(location.path, size,
+                                                                       storedFileInfo.size))
 
         # We have a write storage class and a read storage class and they
         # can be different for concrete composites.
@@ -233,7 +479,7 @@ class PosixDatastore(Datastore):
         # Is this a component request?
         comp = ref.datasetType.component()
 
-        formatter = getInstanceOf(storedFileInfo.formatter)
+        formatter = FormatterFactory.getSharedInstance(storedFileInfo.formatter)
         try:
             result = formatter.read(FileDescriptor(location, readStorageClass=readStorageClass,
                                                    storageClass=writeStorageClass, parameters=parameters),
@@ -258,7 +504,80 @@ class PosixDatastore(Datastore):
         ref : `DatasetRef`
             Reference to the associated Dataset.
         """
+        path, formatter, checksum = self._write(inMemoryDataset, ref)
+        self._record([(ref, path, formatter, self._makeStorageInfo(path, checksum))])
+
+    def putMany(self, items):
+        """Write several InMemoryDatasets to the store.
+
+        Files are written, and their checksums computed, concurrently in a
+        thread pool (see ``threads``); the Datasets that were written are
+        then recorded in the registry and the file records in batches.  If
+        recording fails, the files written are removed and the error is
+        reported for each of their items.
+
+        Parameters
+        ----------
+        items : iterable of `tuple`
+            ``(inMemoryDataset, ref)`` pairs, as passed to `put`.
+
+        Returns
+        -------
+        errors : `list`
+            For each item, in order, `None` if it was stored or the exception
+            `put` would have raised for it.
+        """
+        def write(item):
+            inMemoryDataset, ref = item
+            path, formatter, checksum = self._write(inMemoryDataset, ref)
+            return ref, path, formatter, self._makeStorageInfo(path, checksum)
+
+        results = self._mapItems(write, list(items))
+        written = [result for result, err in results if err is None]
+        try:
+            self._record(written)
+        except Exception as err:
+            self._discard(written)
+            return [err if itemErr is None else itemErr for result, itemErr in results]
+        return [err for result, err in results]
+
+    def _discard(self, entries):
+        """Remove the files of Datasets that could not be recorded, and any
+        storage information recorded for them.
+
+        Parameters
+        ----------
+        entries : `list` of `tuple`
+            ``(ref, path, formatter, storageInfo)`` for each Dataset, as
+            passed to `_record`.
+        """
+        refs = []
+        for ref, path, formatter, info in entries:
+            refs.append(ref)
+            refs.extend(ref.components.values())
+            try:
+                self._removeFile(os.path.join(self.root, path), info.checksum)
+            except FileNotFoundError:
+                pass
+        try:
+            self.registry.removeStorageInfoMany(self.name, refs)
+        except Exception:
+            # Recording failed in the registry in the first place
+            pass
+
+    def _write(self, inMemoryDataset, ref):
+        """Write a Dataset to its file; see `put`.
 
+        Returns
+        -------
+        path : `str`
+            Path of the file, relative to the repository root.
+        formatter : `Formatter`
+            The formatter that wrote it.
+        checksum : `str` or `None`
+            Checksum of the file, if the formatter computed it while
+            writing.
+        """
         datasetType = ref.datasetType
         typeName = datasetType.name
         storageClass = datasetType.storageClass
@@ -276,46 +595,342 @@ class PosixDatastore(Datastore):
         formatter = self.formatterFactory.getFormatter(datasetType.storageClass, typeName)
 
         storageDir = os.path.dirname(location.path)
-        if not os.path.isdir(storageDir):
-            safeMakeDir(storageDir)
+        self._makeDirectory(storageDir)
+
+        if not self.deduplicate:
+            fileDescriptor = FileDescriptor(location, storageClass=storageClass,
+                                            checksumAlgorithm=self.checksumAlgorithm)
+            path = self._writeFile(formatter, inMemoryDataset, fileDescriptor)
+            return path, formatter, fileDescriptor.checksum
+
+        # Writing again over a file linked to others would change them too,
+        # so the file is written under a temporary name and renamed over the
+        # old one, which only replaces this link (and keeps the old file if
+        # the write fails)
+        try:
+            oldInfo = self.getStoredFileInfo(ref)
+        except KeyError:
+            oldInfo = None
+        # The final name gets the formatter's extension now; the temporary
+        # name extends it and ends with the extension too (or with a suffix
+        # the formatter may strip), so the formatter, which replaces the
+        # last suffix, keeps it unique
+        extension = getattr(formatter, "extension", None)
+        location.updateExtension(extension)
+        if extension and not extension.startswith("."):
+            extension = "." + extension
+        suffix = ".tmp.{}.{}{}".format(os.getpid(), threading.get_ident(), extension or ".tmp")
+        tmpLocation = self.locationFactory.fromPath(location.pathInStore + suffix)
+        fileDescriptor = FileDescriptor(tmpLocation, storageClass=storageClass,
+                                        checksumAlgorithm=self.checksumAlgorithm)
+        try:
+            self._writeFile(formatter, inMemoryDataset, fileDescriptor)
+            os.replace(fileDescriptor.location.path, location.path)
+        except BaseException:
+            # The formatter updates the location with the extension it uses
+            if os.path.exists(fileDescriptor.location.path):
+                os.remove(fileDescriptor.location.path)
+            raise
+        path = location.pathInStore
+        if oldInfo is not None and oldInfo.path != path:
+            try:
+                self._removeFile(self.locationFactory.fromPath(oldInfo.path).path, oldInfo.checksum)
+            except FileNotFoundError:
+                pass
+        elif oldInfo is not None and oldInfo.checksum is not None:
+            self._releaseObject(oldInfo.checksum)
+        return path, formatter, fileDescriptor.checksum
+
+    def _writeFile(self, formatter, inMemoryDataset, fileDescriptor):
+        """Write a Dataset with a formatter, creating its directory again if
+        it was removed since it was cached as existing.
 
-        # Write the file
-        path = formatter.write(inMemoryDataset, FileDescriptor(location,
-                                                               storageClass=storageClass))
+        Returns
+        -------
+        path : `str`
+            Path of the file, relative to the repository root.
+        """
+        try:
+            return formatter.write(inMemoryDataset, fileDescriptor)
+        except FileNotFoundError:
+            storageDir = os.path.dirname(fileDescriptor.location.path)
+            self._directories.discard(storageDir)
+            self._makeDirectory(storageDir)
+            return formatter.write(inMemoryDataset, fileDescriptor)
 
-        self.ingest(path, ref, formatter=formatter)
+    def _makeDirectory(self, directory):
+        """Create a directory of the store unless it is known to exist.
 
-    def ingest(self, path, ref, formatter=None):
+        Parameters
+        ----------
+        directory : `str`
+            Absolute path of the directory.
+        """
+        if directory in self._directories:
+            return
+        safeMakeDir(directory)
+        if len(self._directories) >= self.directoryCacheSize:
+            self._directories.clear()
+        self._directories.add(directory)
+
+    def ingest(self, path, ref, formatter=None, transfer=None):
         """Record that a Dataset with the given `DatasetRef` exists in the store.
 
         Parameters
         ----------
         path : `str`
-            File path, relative to the repository root.
+            File path.  Without ``transfer`` the file must already be where
+            the Datastore can find it, and a relative path is treated as
+            relative to the repository root; otherwise a relative path is
+            treated as relative to the current directory.
         ref : `DatasetRef`
             Reference to the associated Dataset.
         formatter : `Formatter` (optional)
             Formatter that should be used to retreive the Dataset.
+        transfer : `str`, optional
+            If not `None`, how to bring the file to the location given by
+            the file template of the Dataset (keeping its extension): one
+            of ``"move"``, ``"copy"``, ``"hardlink"``, ``"symlink"`` or
+            ``"relsymlink"`` (see `~lsst.daf.butler.core.fileTransfer.transferFile`).
+
+        Raises
+        ------
+        ValueError
+            The transfer mode is not supported.
+        FileExistsError
+            The destination of the transfer already exists.
         """
+        if transfer not in TRANSFER_MODES:
+            raise ValueError("Transfer mode {!r} not supported".format(transfer))
         if formatter is None:
             formatter = self.formatterFactory.getFormatter(ref.datasetType.storageClass,
                                                            ref.datasetType.name)
-        # Create Storage information in the registry
+        path = self._transfer(path, ref, transfer, formatter)
+        self._record([(ref, path, formatter, self._makeStorageInfo(path))])
+
+    def ingestMany(self, items, transfer=None):
+        """Record several Datasets as existing in the store.
+
+        Files are transferred, and their checksums computed, concurrently in
+        a thread pool (see ``threads``); the Datasets are then recorded in
+        the registry and the file records in batches.
+
+        Parameters
+        ----------
+        items : iterable of `tuple`
+            ``(path, ref)`` pairs, as passed to `ingest`; the formatter of
+            each Dataset is the default one for its `DatasetType`.
+        transfer : `str`, optional
+            How to bring the files into the store; see `ingest`.
+
+        Returns
+        -------
+        errors : `list`
+            For each item, in order, `None` if it was ingested or the
+            exception `ingest` would have raised for it.
+        """
+        if transfer not in TRANSFER_MODES:
+            raise ValueError("Transfer mode {!r} not supported".format(transfer))
+
+        def ingest(item):
+            path, ref = item
+            formatter = self.formatterFactory.getFormatter(ref.datasetType.storageClass,
+                                                           ref.datasetType.name)
+            path = self._transfer(path, ref, transfer, formatter)
+            return ref, path, formatter, self._makeStorageInfo(path)
+
+        results = self._mapItems(ingest, list(items))
+        self._record([result for result, err in results if err is None])
+        return [err for result, err in results]
+
+    def _transfer(self, path, ref, transfer, formatter, overwrite=False):
+        """Bring a file to be ingested into the store; see `ingest`.
+
+        The file keeps its extension: the whole extension of the formatter
+        (e.g. ``.json.gz``) if the file has it, else its last suffix.
+        With ``overwrite``, the file of the Dataset and any file already at
+        the destination are replaced.
+
+        Returns
+        -------
+        path : `str`
+            Path of the file, relative to the repository root.
+        """
+        if transfer is None:
+            if os.path.isabs(path):
+                path = os.path.relpath(path, start=self.root)
+            return path
+        template = self.templates.getTemplate(ref.datasetType.name)
+        location = self.locationFactory.fromPath(template.format(ref))
+        extension = getattr(formatter, "extension", None)
+        if not extension or not path.endswith(extension):
+            extension = os.path.splitext(path)[1]
+        location.updateExtension(extension)
+        if overwrite:
+            # Remove the file of the Dataset through _removeFile, which frees
+            # its content object if it was the last link to it
+            try:
+                oldInfo = self.getStoredFileInfo(ref)
+            except KeyError:
+                oldInfo = None
+            if oldInfo is not None:
+                try:
+                    self._removeFile(self.locationFactory.fromPath(oldInfo.path).path, oldInfo.checksum)
+                except FileNotFoundError:
+                    pass
+            if os.path.lexists(location.path):
+                self._removeFile(location.path)
+        transferFile(path, location.path, transfer)
+        return location.pathInStore
+
+    def _makeStorageInfo(self, path, checksum=None):
+        """Compute the `StorageInfo` of a file.
+
+        Parameters
+        ----------
+        path : `str`
+            File path, relative to the repository root.
+        checksum : `str`, optional
+            Checksum of the file, if already known; otherwise it is computed
+            from the file, unless checksums are disabled.
+        """
         ospath = os.path.join(self.root, path)
-        checksum = self.computeChecksum(ospath)
+        if checksum is None and self.checksumAlgorithm is not None:
+            checksum = computeChecksum(ospath, algorithm=self.checksumAlgorithm)
         stat = os.stat(ospath)
         size = stat.st_size
-        info = StorageInfo(self.name, checksum, size)
-        self.registry.addStorageInfo(ref, info)
+        return StorageInfo(self.name, checksum, size)
+
+    def _objectPath(self, checksum):
+        """Absolute path of the content object of a checksum."""
+        return os.path.join(self._objectsRoot, checksum[:2], checksum)
+
+    def _deduplicate(self, path, checksum, size):
+        """Share the content of a newly stored file with identical files.
+
+        If a content object with the same checksum and size exists, the
+        file is replaced by a hard link to it; otherwise the file becomes
+        the object.  Symbolic links, files that cannot be hard linked to the
+        object (e.g. on another file system), and files without an object
+        that are already hard linked elsewhere (e.g. ingested with
+        ``transfer="hardlink"``) are left as they are: the latter would
+        never be freed, and would change if the other link were edited.
+
+        Parameters
+        ----------
+        path : `str`
+            Path of the file, relative to the repository root.
+        checksum : `str`
+            Checksum of the file.
+        size : `int`
+            Size of the file in bytes.
+        """
+        ospath = os.path.join(self.root, path)
+        if checksum is None or os.path.islink(ospath):
+            return
+        objectPath = self._objectPath(checksum)
+        try:
+            try:
+                objectSize = os.stat(objectPath).st_size
+            except FileNotFoundError:
+                if os.stat(ospath).st_nlink > 1:
+                    return
+                self._makeDirectory(os.path.dirname(objectPath))
+                os.link(ospath, objectPath)
+                return
+            if objectSize == size and not os.path.samefile(ospath, objectPath):
+                # Replace the file atomically, in case it is being read
+                tmpPath = ospath + ".dedup"
+                os.link(objectPath, tmpPath)
+                os.replace(tmpPath, ospath)
+        except OSError:
+            # The object appeared or vanished concurrently, or cannot be
+            # linked to; keeping a copy is always correct
+            pass
+
+    def _removeFile(self, ospath, checksum=None):
+        """Remove a stored file, and its content object if no other file
+        is linked to it.
+
+        Parameters
+        ----------
+        ospath : `str`
+            Absolute path of the file.
+        checksum : `str`, optional
+            Checksum of the file.
 
-        # Associate this dataset with the formatter for later read.
-        fileInfo = StoredFileInfo(formatter, path, ref.datasetType.storageClass)
-        self.addStoredFileInfo(ref, fileInfo)
+        Raises
+        ------
+        FileNotFoundError
+            The file does not exist.
+        """
+        objectPath = None
+        if self.deduplicate and checksum is not None:
+            objectPath = self._objectPath(checksum)
+            try:
+                if not os.path.samefile(ospath, objectPath):
+                    objectPath = None
+            except FileNotFoundError:
+                objectPath = None
+        os.remove(ospath)
+        if objectPath is not None:
+            self._releaseObject(checksum)
+
+    def _releaseObject(self, checksum):
+        """Remove the content object of a checksum if no file is linked to
+        it any more.
+
+        Parameters
+        ----------
+        checksum : `str`
+            Checksum of the object.
+        """
+        objectPath = self._objectPath(checksum)
+        # The link count of the object is its reference count
+        try:
+            if os.stat(objectPath).st_nlink == 1:
+                os.remove(objectPath)
+        except FileNotFoundError:
+            pass
+
+    def _record(self, entries):
+        """Record stored Datasets in the registry and the file records.
+
+        If ``deduplicate`` is set, the files are first linked to the
+        content objects of their checksums.
+
+        Parameters
+        ----------
+        entries : `list` of `tuple`
+            ``(ref, path, formatter, storageInfo)`` for each Dataset.
+        """
+        if self.deduplicate:
+            for ref, path, formatter, info in entries:
+                self._deduplicate(path, info.checksum, info.size)
 
         # Register all components with same information
-        for compRef in ref.components.values():
-            self.registry.addStorageInfo(compRef, info)
-            self.addStoredFileInfo(compRef, fileInfo)
+        storageInfos = []
+        for ref, path, formatter, info in entries:
+            storageInfos.append((ref, info))
+            storageInfos.extend((compRef, info) for compRef in ref.components.values())
+        if not storageInfos:
+            return
+        self.registry.addStorageInfoMany(storageInfos)
+
+        # Associate these datasets with the formatter for later read.
+        records = []
+        fileInfos = {}
+        for ref, path, formatter, info in entries:
+            fileInfo = StoredFileInfo(formatter, path, ref.datasetType.storageClass,
+                                      checksum=info.checksum, size=info.size)
+            record = self.RecordTuple(formatter=fileInfo.formatter, path=fileInfo.path,
+                                      storage_class=fileInfo.storageClass.name,
+                                      checksum=fileInfo.checksum, size=fileInfo.size)
+            for datasetId in [ref.id] + [compRef.id for compRef in ref.components.values()]:
+                records.append((datasetId, record))
+                fileInfos[datasetId] = fileInfo
+        self.records.setMany(records)
+        self._cacheStoredFileInfo(fileInfos)
 
     def getUri(self, ref, predict=False):
         """URI to the Dataset.
@@ -384,39 +999,154 @@ class PosixDatastore(Datastore):
         Some Datastores may implement this method as a silent no-op to
         disable Dataset deletion through standard interfaces.
         """
-        # Get file metadata and internal metadata
+        err = self.removeMany([ref])[0]
+        if err is not None:
+            raise err
 
-        try:
-            storedFileInfo = self.getStoredFileInfo(ref)
-        except KeyError:
-            raise FileNotFoundError("Requested dataset ({}) does not exist".format(ref))
-        location = self.locationFactory.fromPath(storedFileInfo.path)
-        if not os.path.exists(location.path):
-            raise FileNotFoundError("No such file: {0}".format(location.uri))
-        os.remove(location.path)
+    def removeMany(self, refs):
+        """Remove several Datasets at once.
 
-        # Remove rows from registries
-        self.removeStoredFileInfo(ref)
-        self.registry.removeStorageInfo(self.name, ref)
-        for compRef in ref.components.values():
-            self.registry.removeStorageInfo(self.name, compRef)
-            self.removeStoredFileInfo(compRef)
+        The file records are looked up together, the files are deleted in
+        the thread pool (see ``threads``), and the records and registry
+        storage information of the Datasets removed, with those of their
+        components, are deleted in batches.
 
-    def transfer(self, inputDatastore, ref):
+        Parameters
+        ----------
+        refs : iterable of `DatasetRef`
+            References to the Datasets.
+
+        Returns
+        -------
+        errors : `list`
+            For each ref, in order, `None` if it was removed or the exception
+            `remove` would have raised for it: `FileNotFoundError` if the
+            Dataset is not in the store or, unless ``ignoreMissingOnRemove``
+            is set in the configuration, its file does not exist.
+        """
+        refs = list(refs)
+        storedFileInfos = self.getStoredFileInfoMany(refs)
+        errors = [None]*len(refs)
+
+        # Components share the file of their composite, so each file is
+        # deleted once
+        paths = {}
+        checksums = {}
+        for index, ref in enumerate(refs):
+            storedFileInfo = storedFileInfos.get(ref.id)
+            if storedFileInfo is None:
+                errors[index] = FileNotFoundError("Requested dataset ({}) does not exist".format(ref))
+            else:
+                paths.setdefault(storedFileInfo.path, []).append(index)
+                checksums[storedFileInfo.path] = storedFileInfo.checksum
+
+        def unlink(path):
+            location = self.locationFactory.fromPath(path)
+            try:
+                self._removeFile(location.path, checksums[path])
+            except FileNotFoundError:
+                if not self.ignoreMissingOnRemove:
+                    raise FileNotFoundError("No such file: {0}".format(location.uri))
+
+        for path, (result, err) in zip(paths, self._mapItems(unlink, list(paths))):
+            if err is not None:
+                for index in paths[path]:
+                    errors[index] = err
+
+        # Remove rows from registries
+        removed = []
+        for ref, err in zip(refs, errors):
+            if err is None:
+                removed.append(ref)
+                removed.extend(ref.components.values())
+        if removed:
+            with self._recordCacheLock:
+                for ref in removed:
+                    self._recordCache.pop(ref.id, None)
+            self.records.delMany({ref.id for ref in removed})
+            self.registry.removeStorageInfoMany(self.name, removed)
+        return errors
+
+    def transfer(self, inputDatastore, ref, transfer="copy"):
         """Retrieve a Dataset from an input `Datastore`,
         and store the result in this `Datastore`.
 
+        If the input is a `PosixDatastore` holding the Dataset in a file
+        written with the formatter this `Datastore` would use, the file is
+        brought over as is and its recorded checksum (if computed with the
+        same algorithm) and size are reused; otherwise the Dataset is read
+        from the input and written again.
+
         Parameters
         ----------
         inputDatastore : `Datastore`
             The external `Datastore` from which to retreive the Dataset.
         ref : `DatasetRef`
             Reference to the required Dataset in the input data store.
+        transfer : `str`, optional
+            How files are brought over: ``"copy"``, ``"hardlink"``,
+            ``"symlink"`` or ``"relsymlink"`` (see `ingest`).
+        """
+        err = self.transferMany(inputDatastore, [ref], transfer=transfer)[0]
+        if err is not None:
+            raise err
 
+    def transferMany(self, inputDatastore, refs, transfer="copy"):
+        """Retrieve several Datasets from an input `Datastore`, and store
+        them in this `Datastore`.
+
+        The file records of the input are looked up together, files are
+        brought over (or Datasets read and written again, see `transfer`)
+        concurrently in the thread pool, and the Datasets are recorded in
+        batches.
+
+        Parameters
+        ----------
+        inputDatastore : `Datastore`
+            The external `Datastore` from which to retreive the Datasets.
+        refs : iterable of `DatasetRef`
+            References to the required Datasets in the input data store.
+        transfer : `str`, optional
+            How files are brought over; see `transfer`.
+
+        Returns
+        -------
+        errors : `list`
+            For each ref, in order, `None` if it was transferred or the
+            exception `transfer` would have raised for it.
         """
         assert inputDatastore is not self  # unless we want it for renames?
-        inMemoryDataset = inputDatastore.get(ref)
-        return self.put(inMemoryDataset, ref)
+        if transfer not in TRANSFER_MODES or transfer in (None, "move"):
+            raise ValueError("Transfer mode {!r} not supported".format(transfer))
+        refs = list(refs)
+        storedFileInfos = {}
+        if isinstance(inputDatastore, PosixDatastore):
+            storedFileInfos = inputDatastore.getStoredFileInfoMany(refs)
+
+        def transferOne(ref):
+            formatter = self.formatterFactory.getFormatter(ref.datasetType.storageClass,
+                                                           ref.datasetType.name)
+            storedFileInfo = storedFileInfos.get(ref.id)
+            sameFormat = storedFileInfo is not None and storedFileInfo.formatter == formatter.name()
+            if sameFormat:
+                sameFormat = storedFileInfo.storageClass == ref.datasetType.storageClass
+            if not sameFormat:
+                # Different format, or a component of a file: convert
+                path, formatter, checksum = self._write(inputDatastore.get(ref), ref)
+                return ref, path, formatter, self._makeStorageInfo(path, checksum)
+            source = inputDatastore.locationFactory.fromPath(storedFileInfo.path).path
+            # Like put, replace any file already at the destination
+            path = self._transfer(source, ref, transfer, formatter, overwrite=True)
+            checksum = None
+            if inputDatastore.checksumAlgorithm == self.checksumAlgorithm:
+                checksum = storedFileInfo.checksum
+            if storedFileInfo.size is None or (checksum is None and self.checksumAlgorithm is not None):
+                return ref, path, formatter, self._makeStorageInfo(path, checksum)
+            return ref, path, formatter, StorageInfo(self.name, checksum, storedFileInfo.size)
+
+        results = self._mapItems(transferOne, refs)
+        self._record([result for result, err in results if err is None])
+        return [err for result, err in results]
 
     @staticmethod
     def computeChecksum(filename, algorithm="blake2b", block_size=8192):
@@ -436,14 +1166,9 @@ class PosixDatastore(Datastore):
         -------
         hexdigest : `str`
             Hex digest of the file.
-        """
-        if algorithm not in hashlib.algorithms_guaranteed:
-            raise NameError('The specified algorithm "{}" is not supported by hashlib'.format(algorithm))
-
-        hasher = hashlib.new(algorithm)
 
-        with open(filename, 'rb') as f:
-            for chunk in iter(lambda: f.read(block_size), b''):
-                hasher.update(chunk)
-
-        return hasher.hexdigest()
+        See Also
+        --------
+        lsst.daf.butler.core.checksum.computeChecksum
+        """
+        return computeChecksum(filename, algorithm=algorithm, block_size=block_size)
@@ -0,0 +1,239 @@
+# This file is part of daf_butler.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (http://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Offline verification of the files of a `PosixDatastore`.
+
+The records of the datastore are read in batches of increasing dataset_id,
+and the files of each batch are checked in a process pool against the size
+and checksum recorded when they were stored (the same values as in the
+registry's DatasetStorage table, from which the size and checksum of
+records written before the records table stored them are read).  After each batch the problems found are
+appended to a report and the last dataset_id checked is saved in a
+checkpoint file, so that an interrupted scan continues where it stopped.
+"""
+
+import hashlib
+import json
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from lsst.daf.butler.core.checksum import computeChecksum
+
+__all__ = ("Problem", "verifyDatastore")
+
+Problem = namedtuple("Problem", ["datasetId", "path", "kind", "detail"])
+"""A file that does not match its record; ``kind`` is ``"missing"``,
+``"size"`` or ``"checksum"``."""
+
+_DatasetId = namedtuple("_DatasetId", ["id"])
+"""Stands in for a `DatasetRef` in `Registry.getStorageInfoMany`, which only
+uses its id."""
+
+
+def _hashThrottled(path, algorithm, maxBytesPerSecond, blockSize=2**20):
+    """Compute the checksum of a file without reading faster than a rate.
+    """
+    hasher = hashlib.new(algorithm)
+    start = time.monotonic()
+    done = 0
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(blockSize), b""):
+            hasher.update(block)
+            done += len(block)
+            ahead = done/maxBytesPerSecond - (time.monotonic() - start)
+            if ahead > 0:
+                time.sleep(ahead)
+    return hasher.hexdigest()
+
+
+def _checkFile(task):
+    """Check one file; run in the worker processes.
+
+    Parameters
+    ----------
+    task : `tuple`
+        ``(datasetId, path, ospath, size, checksum, algorithm,
+        maxBytesPerSecond)``.
+
+    Returns
+    -------
+    problem : `Problem` or `None`
+        What is wrong with the file, if anything.
+    """
+    datasetId, path, ospath, size, checksum, algorithm, maxBytesPerSecond = task
+    try:
+        actualSize = os.stat(ospath).st_size
+    except FileNotFoundError:
+        return Problem(datasetId, path, "missing", None)
+    if size is not None and actualSize != size:
+        return Problem(datasetId, path, "size", "{} bytes instead of {}".format(actualSize, size))
+    if checksum is None or algorithm is None:
+        return None
+    try:
+        if maxBytesPerSecond:
+            actual = _hashThrottled(ospath, algorithm, maxBytesPerSecond)
+        else:
+            actual = computeChecksum(ospath, algorithm=algorithm)
+    except FileNotFoundError:
+        return Problem(datasetId, path, "missing", None)
+    if actual != checksum:
+        return Problem(datasetId, path, "checksum", "{} instead of {}".format(actual, checksum))
+    return None
+
+
+def _completeRecords(datastore, batch):
+    """Fill in the sizes and checksums missing from records written before
+    the records table stored them, from the registry.
+    """
+    legacy = [_DatasetId(datasetId) for datasetId, record in batch
+              if record.checksum is None and record.size is None]
+    if not legacy:
+        return batch
+    storageInfos = datastore.registry.getStorageInfoMany(legacy, datastore.name)
+    completed = []
+    for datasetId, record in batch:
+        storageInfo = storageInfos.get(datasetId)
+        if storageInfo is not None and record.checksum is None and record.size is None:
+            record = record._replace(checksum=storageInfo.checksum, size=storageInfo.size)
+        completed.append((datasetId, record))
+    return completed
+
+
+def _checkAlgorithm(checksum, algorithm):
+    """Check that a recorded checksum can have been computed with an
+    algorithm.
+
+    Raises
+    ------
+    ValueError
+        No algorithm is given, or the checksum does not have the length of
+        its digests.
+    """
+    if algorithm is None:
+        raise ValueError("Records have checksums but no checksum algorithm is given")
+    digestSize = hashlib.new(algorithm).digest_size
+    if digestSize and len(checksum) != 2*digestSize:
+        raise ValueError("Checksum {!r} was not computed with {}".format(checksum, algorithm))
+
+
+def _readCheckpoint(checkpoint):
+    if checkpoint is None or not os.path.exists(checkpoint):
+        return None
+    with open(checkpoint, "r") as fd:
+        return json.load(fd)["lastDatasetId"]
+
+
+def _writeCheckpoint(checkpoint, lastDatasetId):
+    # Replace the file atomically, so an interruption leaves either the old
+    # or the new checkpoint
+    tmpPath = checkpoint + ".tmp"
+    with open(tmpPath, "w") as fd:
+        json.dump({"lastDatasetId": lastDatasetId}, fd)
+    os.replace(tmpPath, checkpoint)
+
+
+def verifyDatastore(datastore, checkpoint=None, report=None, batchSize=1000, processes=None,
+                    maxBytesPerSecond=None, algorithm=None):
+    """Check the files of a datastore against their recorded size and
+    checksum.
+
+    Parameters
+    ----------
+    datastore : `PosixDatastore`
+        The datastore to verify.
+    checkpoint : `str`, optional
+        Path of a file recording the progress of the scan; if it exists the
+        scan starts after the last dataset_id it records.
+    report : `str`, optional
+        Path of a file to which the problems found are appended, one JSON
+        object per line.
+    batchSize : `int`, optional
+        Number of records read, and files checked, at a time.
+    processes : `int`, optional
+        Number of worker processes hashing files; ``0`` checks files in this
+        process, `None` uses one per CPU.
+    maxBytesPerSecond : `int`, optional
+        Total read rate, shared evenly between the workers, for checksums.
+    algorithm : `str`, optional
+        Name of the :py:mod:`hashlib` algorithm the recorded checksums were
+        computed with; the ``checksumAlgorithm`` of the datastore if `None`.
+
+    Returns
+    -------
+    problems : `list` of `Problem`
+        The problems found by this call (those found before the checkpoint
+        are only in the report).
+
+    Raises
+    ------
+    ValueError
+        A record has a checksum, but there is no algorithm or the checksum
+        was computed with another one.
+    """
+    if algorithm is None:
+        algorithm = datastore.checksumAlgorithm
+    if processes is None:
+        processes = os.cpu_count() or 1
+    workerRate = None
+    if maxBytesPerSecond:
+        workerRate = maxBytesPerSecond/max(processes, 1)
+
+    executor = ProcessPoolExecutor(max_workers=processes) if processes > 0 else None
+    problems = []
+    after = _readCheckpoint(checkpoint)
+    try:
+        while True:
+            batch = datastore.records.getBatch(after=after, limit=batchSize)
+            if not batch:
+                break
+            batch = _completeRecords(datastore, batch)
+            # Components are recorded with the file of their composite
+            tasks = []
+            paths = set()
+            for datasetId, record in batch:
+                if record.path in paths:
+                    continue
+                paths.add(record.path)
+                if record.checksum is not None:
+                    _checkAlgorithm(record.checksum, algorithm)
+                tasks.append((datasetId, record.path, os.path.join(datastore.root, record.path),
+                              record.size, record.checksum, algorithm, workerRate))
+            if executor is None:
+                results = map(_checkFile, tasks)
+            else:
+                results = executor.map(_checkFile, tasks)
+            found = [problem for problem in results if problem is not None]
+
+            if report is not None and found:
+                with open(report, "a") as fd:
+                    for problem in found:
+                        fd.write(json.dumps(problem._asdict()) + "\n")
+            problems.extend(found)
+            after = batch[-1][0]
+            if checkpoint is not None:
+                _writeCheckpoint(checkpoint, after)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return problems
@@ -22,10 +22,58 @@
 """Support for reading and writing files to a POSIX file system."""
 
 from abc import abstractmethod
+from contextlib import contextmanager, ExitStack
+import bz2
+import gzip
+import io
+import lzma
 
 from lsst.daf.butler.core.formatter import Formatter
-
-__all__ = ("FileFormatter", )
+from lsst.daf.butler.core.checksum import HashingWriter
+
+__all__ = ("FileFormatter", "openCompressed")
+
+COMPRESSIONS = ("gzip", "bz2", "lzma")
+"""Names of the compression codecs supported by `openCompressed`."""
+
+
+def openCompressed(fileobj, compression, mode="rb", level=None):
+    """Wrap a binary file object in a streaming compressor or decompressor.
+
+    Parameters
+    ----------
+    fileobj : file object
+        The underlying binary file; it is not closed with the returned
+        file object.
+    compression : `str`
+        One of `COMPRESSIONS`.
+    mode : `str`, optional
+        ``"rb"`` to decompress or ``"wb"`` to compress.
+    level : `int`, optional
+        Compression level (the preset for ``lzma``); the codec default
+        if `None`. Ignored when reading.
+
+    Returns
+    -------
+    fd : file object
+        Binary file object reading or writing uncompressed bytes.
+
+    Raises
+    ------
+    ValueError
+        Unknown compression.
+    """
+    writing = "w" in mode
+    if compression == "gzip":
+        # No file name or time stamp in the header, so that the same
+        # content always gives the same file (and checksum).
+        return gzip.GzipFile(filename="", fileobj=fileobj, mode=mode, mtime=0,
+                             compresslevel=9 if level is None else level)
+    if compression == "bz2":
+        return bz2.BZ2File(fileobj, mode=mode, compresslevel=9 if level is None else level)
+    if compression == "lzma":
+        return lzma.LZMAFile(fileobj, mode=mode, preset=level if writing else None)
+    raise ValueError("Unknown compression '{}'; expected one of {}".format(compression, COMPRESSIONS))
 
 
 class FileFormatter(Formatter):
@@ -36,6 +84,19 @@ class FileFormatter(Formatter):
     """Default file extension to use for writing files. None means that no
     modifications will be made to the supplied file extension."""
 
+    compression = None
+    """Codec (one of `COMPRESSIONS`) with which files are compressed while
+    they are written and decompressed while they are read, by formatters
+    using `_openForRead` and `_openForWrite`. None means no compression."""
+
+    compresslevel = None
+    """Level passed to the compression codec; None uses the codec default.
+    Set per instance with the ``compresslevel`` constructor parameter."""
+
+    def __init__(self, compresslevel=None):
+        if compresslevel is not None:
+            self.compresslevel = compresslevel
+
     @abstractmethod
     def _readFile(self, path, pytype=None):
         """Read a file from the path in the correct format.
@@ -78,6 +139,78 @@ class FileFormatter(Formatter):
         """
         pass
 
+    @contextmanager
+    def _openForRead(self, path, mode="r"):
+        """Open a file for reading, decompressing it if the formatter
+        uses compression.
+
+        Parameters
+        ----------
+        path : `str`
+            Path of the file.
+        mode : `str`, optional
+            ``"r"`` for a text file or ``"rb"`` for a binary file.
+
+        Yields
+        ------
+        fd : file object
+            The open file.
+        """
+        if self.compression is None:
+            with open(path, mode) as fd:
+                yield fd
+            return
+        with ExitStack() as stack:
+            fd = stack.enter_context(open(path, "rb"))
+            fd = stack.enter_context(openCompressed(fd, self.compression, "rb"))
+            if "b" not in mode:
+                fd = stack.enter_context(io.TextIOWrapper(fd))
+            yield fd
+
+    @contextmanager
+    def _openForWrite(self, fileDescriptor, mode="w"):
+        """Open the file of a descriptor for writing.
+
+        Implementations of `_writeFile` that write through a Python file
+        object should open it with this method: if the descriptor requests
+        a checksum, the bytes are hashed as they are written and the hex
+        digest is stored in ``fileDescriptor.checksum`` when the file is
+        closed.  If the formatter uses compression, the data are
+        compressed as they are written (the checksum is that of the
+        compressed file).
+
+        Parameters
+        ----------
+        fileDescriptor : `FileDescriptor`
+            Details of the file to be written.
+        mode : `str`, optional
+            ``"w"`` for a text file or ``"wb"`` for a binary file.
+
+        Yields
+        ------
+        fd : file object
+            The open file.
+        """
+        path = fileDescriptor.location.path
+        if fileDescriptor.checksumAlgorithm is None and self.compression is None:
+            with open(path, mode) as fd:
+                yield fd
+            return
+        writer = None
+        with ExitStack() as stack:
+            if fileDescriptor.checksumAlgorithm is None:
+                fd = stack.enter_context(open(path, "wb"))
+            else:
+                writer = HashingWriter(open(path, "wb", buffering=0), fileDescriptor.checksumAlgorithm)
+                fd = stack.enter_context(io.BufferedWriter(writer))
+            if self.compression is not None:
+                fd = stack.enter_context(openCompressed(fd, self.compression, "wb", self.compresslevel))
+            if "b" not in mode:
+                fd = stack.enter_context(io.TextIOWrapper(fd))
+            yield fd
+        if writer is not None:
+            fileDescriptor.checksum = writer.hexdigest()
+
     def _coerceType(self, inMemoryDataset, storageClass, pytype=None):
         """Coerce the supplied inMemoryDataset to type `pytype`.
 
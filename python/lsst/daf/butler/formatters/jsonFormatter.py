@@ -24,7 +24,7 @@ import json
 
 from lsst.daf.butler.formatters.fileFormatter import FileFormatter
 
-__all__ = ("JsonFormatter", )
+__all__ = ("JsonFormatter", "JsonGzipFormatter", "JsonBz2Formatter", "JsonLzmaFormatter")
 
 
 class JsonFormatter(FileFormatter):
@@ -47,7 +47,7 @@ class JsonFormatter(FileFormatter):
             if the file could not be opened.
         """
         try:
-            with open(path, "r") as fd:
+            with self._openForRead(path, "r") as fd:
                 data = json.load(fd)
         except FileNotFoundError:
             data = None
@@ -72,7 +72,7 @@ class JsonFormatter(FileFormatter):
         Exception
             The file could not be written.
         """
-        with open(fileDescriptor.location.path, "w") as fd:
+        with self._openForWrite(fileDescriptor, "w") as fd:
             if hasattr(inMemoryDataset, "_asdict"):
                 inMemoryDataset = inMemoryDataset._asdict()
             json.dump(inMemoryDataset, fd)
@@ -97,3 +97,27 @@ class JsonFormatter(FileFormatter):
         if not hasattr(builtins, pytype.__name__):
             inMemoryDataset = storageClass.assembler().assemble(inMemoryDataset, pytype=pytype)
         return inMemoryDataset
+
+
+class JsonGzipFormatter(JsonFormatter):
+    """Interface for reading and writing Python objects to and from
+    gzip-compressed JSON files.
+    """
+    extension = ".json.gz"
+    compression = "gzip"
+
+
+class JsonBz2Formatter(JsonFormatter):
+    """Interface for reading and writing Python objects to and from
+    bz2-compressed JSON files.
+    """
+    extension = ".json.bz2"
+    compression = "bz2"
+
+
+class JsonLzmaFormatter(JsonFormatter):
+    """Interface for reading and writing Python objects to and from
+    lzma-compressed JSON files.
+    """
+    extension = ".json.xz"
+    compression = "lzma"
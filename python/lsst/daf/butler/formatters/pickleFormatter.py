@@ -25,7 +25,7 @@ import pickle
 
 from lsst.daf.butler.formatters.fileFormatter import FileFormatter
 
-__all__ = ("PickleFormatter", )
+__all__ = ("PickleFormatter", "PickleGzipFormatter", "PickleBz2Formatter", "PickleLzmaFormatter")
 
 
 class PickleFormatter(FileFormatter):
@@ -50,7 +50,7 @@ class PickleFormatter(FileFormatter):
             if the file could not be opened.
         """
         try:
-            with open(path, "rb") as fd:
+            with self._openForRead(path, "rb") as fd:
                 data = pickle.load(fd)
         except FileNotFoundError:
             data = None
@@ -72,5 +72,29 @@ class PickleFormatter(FileFormatter):
         Exception
             The file could not be written.
         """
-        with open(fileDescriptor.location.path, "wb") as fd:
+        with self._openForWrite(fileDescriptor, "wb") as fd:
             pickle.dump(inMemoryDataset, fd, protocol=-1)
+
+
+class PickleGzipFormatter(PickleFormatter):
+    """Interface for reading and writing Python objects to and from
+    gzip-compressed pickle files.
+    """
+    extension = ".pickle.gz"
+    compression = "gzip"
+
+
+class PickleBz2Formatter(PickleFormatter):
+    """Interface for reading and writing Python objects to and from
+    bz2-compressed pickle files.
+    """
+    extension = ".pickle.bz2"
+    compression = "bz2"
+
+
+class PickleLzmaFormatter(PickleFormatter):
+    """Interface for reading and writing Python objects to and from
+    lzma-compressed pickle files.
+    """
+    extension = ".pickle.xz"
+    compression = "lzma"
@@ -24,7 +24,7 @@ import yaml
 
 from lsst.daf.butler.formatters.fileFormatter import FileFormatter
 
-__all__ = ("YamlFormatter", )
+__all__ = ("YamlFormatter", "YamlGzipFormatter", "YamlBz2Formatter", "YamlLzmaFormatter")
 
 
 class YamlFormatter(FileFormatter):
@@ -47,7 +47,7 @@ class YamlFormatter(FileFormatter):
             if the file could not be opened.
         """
         try:
-            with open(path, "r") as fd:
+            with self._openForRead(path, "r") as fd:
                 data = yaml.load(fd)
         except FileNotFoundError:
             data = None
@@ -72,7 +72,7 @@ class YamlFormatter(FileFormatter):
         Exception
             The file could not be written.
         """
-        with open(fileDescriptor.location.path, "w") as fd:
+        with self._openForWrite(fileDescriptor, "w") as fd:
             if hasattr(inMemoryDataset, "_asdict"):
                 inMemoryDataset = inMemoryDataset._asdict()
             yaml.dump(inMemoryDataset, stream=fd)
@@ -97,3 +97,27 @@ class YamlFormatter(FileFormatter):
         if not hasattr(builtins, pytype.__name__):
             inMemoryDataset = storageClass.assembler().assemble(inMemoryDataset, pytype=pytype)
         return inMemoryDataset
+
+
+class YamlGzipFormatter(YamlFormatter):
+    """Interface for reading and writing Python objects to and from
+    gzip-compressed YAML files.
+    """
+    extension = ".yaml.gz"
+    compression = "gzip"
+
+
+class YamlBz2Formatter(YamlFormatter):
+    """Interface for reading and writing Python objects to and from
+    bz2-compressed YAML files.
+    """
+    extension = ".yaml.bz2"
+    compression = "bz2"
+
+
+class YamlLzmaFormatter(YamlFormatter):
+    """Interface for reading and writing Python objects to and from
+    lzma-compressed YAML files.
+    """
+    extension = ".yaml.xz"
+    compression = "lzma"
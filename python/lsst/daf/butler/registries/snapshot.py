@@ -0,0 +1,135 @@
+# This file is part of daf_butler.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (http://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Per-job registry snapshots.
+
+A snapshot is a self-contained SQLite registry holding the slice of a
+central `SqlRegistry` that a batch job needs, so that the job can run
+without touching the central database.  A worker `Butler` uses it by
+pointing ``registry.db`` at the snapshot file (with the rest of the
+registry configuration unchanged); the Datasets it produces are merged
+back into the central registry in bulk with `mergeSnapshot`.
+
+Only registry content is copied: the worker's `Datastore` must be able to
+read the files of its inputs and write its outputs where the central
+`Datastore` will find them.
+"""
+
+from collections import namedtuple
+
+from ..core.registry import Registry
+from .sqlRegistry import SqlRegistryConfig
+
+__all__ = ("makeSnapshot", "mergeSnapshot")
+
+SNAPSHOT_INFO_TABLE = "SnapshotInfo"
+"""Name of the snapshot table recording the ids copied from the central
+registry."""
+
+SnapshotInfo = namedtuple("SnapshotInfo", ["max_dataset_id", "max_execution_id"])
+
+
+def _makeSnapshotInfoDict(registry):
+    types = {"name": str, "max_dataset_id": int, "max_execution_id": int}
+    return registry.makeDatabaseDict(SNAPSHOT_INFO_TABLE, types=types, key="name", value=SnapshotInfo)
+
+
+def makeSnapshot(registry, path, datasets, datasetTypes=(), datastoreTables=(), **params):
+    r"""Write the part of a registry needed by a job to a SQLite file.
+
+    Parameters
+    ----------
+    registry : `SqlRegistry`
+        The central registry.
+    path : `str`
+        Name of the SQLite file to create.
+    datasets : `str` or iterable of `DatasetRef`
+        The input Datasets of the job, as an expression or a sequence of
+        `DatasetRef`\ s (see `SqlRegistry.export`).
+    datasetTypes : iterable of `DatasetType`, optional
+        Further `DatasetType`\ s to register in the snapshot, typically those
+        of the outputs of the job.
+    datastoreTables : iterable of `str`, optional
+        Names of the tables holding `Datastore` records in the central
+        registry's database, to be copied as well.
+    **params
+        Parameter name-value pairs to insert into the ``datasets`` query.
+
+    Returns
+    -------
+    snapshot : `SqliteRegistry`
+        The registry backed by the new file.
+    """
+    tables = registry.export(datasets, datastoreTables=datastoreTables, **params)
+    config = SqlRegistryConfig(registry.config)
+    config["cls"] = "lsst.daf.butler.registries.sqliteRegistry.SqliteRegistry"
+    config["db"] = "sqlite:///{}".format(path)
+    snapshot = Registry.fromConfig(config)
+    snapshot.import_(tables)
+    for datasetType in datasetTypes:
+        snapshot.registerDatasetType(datasetType)
+    maxIds = {}
+    for table, rows in tables.items():
+        if table.name in ("Dataset", "Execution"):
+            key = table.primary_key.columns.values()[0].name
+            maxIds[table.name] = max((row[key] for row in rows), default=0)
+    info = SnapshotInfo(max_dataset_id=maxIds["Dataset"], max_execution_id=maxIds["Execution"])
+    _makeSnapshotInfoDict(snapshot)["baseline"] = info
+    return snapshot
+
+
+def mergeSnapshot(snapshot, registry, collection=None, datastoreTables=()):
+    """Add the Datasets created in a snapshot to the central registry.
+
+    All Datasets added to the snapshot after `makeSnapshot` are imported,
+    with their Runs, Quanta, provenance, Collection memberships, storage
+    information and `Datastore` records, in a single transaction.  They
+    receive new ids in ``registry``; references to the Datasets that were
+    copied into the snapshot are kept.
+
+    Parameters
+    ----------
+    snapshot : `SqlRegistry`
+        A registry created by `makeSnapshot`.
+    registry : `SqlRegistry`
+        The central registry.
+    collection : `str`, optional
+        An additional Collection for the merged Datasets.
+    datastoreTables : iterable of `str`, optional
+        Names of the tables holding `Datastore` records in both databases.
+
+    Returns
+    -------
+    datasetIds : `dict`
+        The ids of the merged Datasets in ``registry``, keyed by their id in
+        ``snapshot``.
+    """
+    baseline = _makeSnapshotInfoDict(snapshot)["baseline"]
+    tables = snapshot.export("SELECT dataset_id FROM Dataset WHERE dataset_id > :baseline",
+                             datastoreTables=datastoreTables, baseline=baseline.max_dataset_id)
+    # Rows copied from the central registry are already there; dropping
+    # them makes references to them resolve to the existing rows.
+    for table, rows in tables.items():
+        if table.name == "Dataset":
+            rows[:] = [row for row in rows if row["dataset_id"] > baseline.max_dataset_id]
+        elif table.name in ("Execution", "Run", "Quantum"):
+            rows[:] = [row for row in rows if row["execution_id"] > baseline.max_execution_id]
+    return registry.import_(tables, collection, preserveIds=False)
@@ -19,12 +19,19 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import bisect
 import itertools
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager, closing
 
-from sqlalchemy import create_engine, text
-from sqlalchemy.sql import select, and_, exists
+from sqlalchemy import create_engine, text, event, MetaData, Table
+from sqlalchemy.sql import select, and_, or_, exists, func, literal, union_all, case
 from sqlalchemy.exc import IntegrityError
 
+from lsst.log import Log
+
 from ..core.datasets import DatasetType, DatasetRef
 from ..core.registry import RegistryConfig, Registry
 from ..core.schema import Schema
@@ -35,14 +42,136 @@ from ..core.storageInfo import StorageInfo
 from ..core.storageClass import StorageClassFactory
 from ..core.config import Config
 from ..core.sqlDatabaseDict import SqlDatabaseDict
+from ..core.utils import chunked
 
-__all__ = ("SqlRegistryConfig", "SqlRegistry")
+__all__ = ("SqlRegistryConfig", "SqlRegistry", "DatasetTypeSummary")
 
 
 class SqlRegistryConfig(RegistryConfig):
     pass
 
 
+class DatasetTypeSummary(namedtuple("DatasetTypeSummary", ("count", "ranges"))):
+    """Summary of the Datasets of one `DatasetType` in a Collection.
+
+    Attributes
+    ----------
+    count : `int`
+        Number of Datasets.
+    ranges : `dict`
+        ``(min, max)`` tuples of the values of each DataUnit link of the
+        Datasets, keyed by link name.  After Datasets are removed from the
+        Collection the range may be wider than the remaining values.
+    """
+    __slots__ = ()
+
+
+class _InsertBuffer:
+    r"""Rows queued for insertion by a `SqlRegistry` in buffered-write mode.
+
+    Parameters
+    ----------
+    maxSize : `int`
+        Number of queued rows that triggers a flush.
+    maxAge : `float`
+        Age in seconds of the oldest queued row that triggers a flush.
+        May be `None` to only flush on size.
+    nextDatasetId : `int`
+        First ``dataset_id`` to hand out to provisional `DatasetRef`\ s.
+    """
+
+    TABLES = ("Dataset", "DatasetCollection", "DatasetComposition", "DatasetStorage")
+    """Tables that may be buffered, in the order they must be flushed to
+    satisfy foreign key constraints.  Partitioned Dataset tables (see
+    `Schema.getDatasetTable`) are flushed after these."""
+
+    def __init__(self, maxSize, maxAge, nextDatasetId):
+        self.maxSize = maxSize
+        self.maxAge = maxAge
+        self.nextDatasetId = nextDatasetId
+        self.clear()
+
+    def clear(self):
+        """Discard all queued rows."""
+        self.rows = OrderedDict((tableName, []) for tableName in self.TABLES)
+        self.datasets = {}
+        self.size = 0
+        self.started = None
+
+    def append(self, tableName, row):
+        """Queue a row for insertion into the named table."""
+        if self.started is None:
+            self.started = time.monotonic()
+        self.rows.setdefault(tableName, []).append(row)
+        self.size += 1
+
+    def allocateDatasetId(self):
+        """Return a new provisional ``dataset_id``."""
+        datasetId = self.nextDatasetId
+        self.nextDatasetId += 1
+        return datasetId
+
+    def isFull(self):
+        """Return `True` if either the size or the time threshold has been
+        reached."""
+        if self.size >= self.maxSize:
+            return True
+        if self.maxAge is None or self.started is None:
+            return False
+        return time.monotonic() - self.started >= self.maxAge
+
+
+class _ImportState:
+    """Bookkeeping for `SqlRegistry.import_`.
+
+    Parameters
+    ----------
+    tables : `collections.OrderedDict`
+        The exported rows, keyed by table.
+    preserveIds : `bool`
+        Whether imported Datasets and Executions keep their ids.
+    """
+
+    def __init__(self, tables, preserveIds):
+        self.preserveIds = preserveIds
+        # Ids of the exported Datasets and Executions
+        self.exported = {'Dataset': set(), 'Execution': set()}
+        for table, rows in tables.items():
+            if table.name in self.exported:
+                key = table.primary_key.columns.values()[0].name
+                self.exported[table.name].update(row[key] for row in rows)
+        # Other ids referred to by the export that exist in the registry
+        self.existing = {'Dataset': set(), 'Execution': set()}
+        # Ids in the registry of the imported rows, keyed by exported id
+        self.ids = {'Dataset': {}, 'Execution': {}}
+        # Refs of the inserted Datasets, keyed by id
+        self.refs = {}
+        # Inserted rows, keyed by table
+        self.inserted = {}
+        # References to set once the referred rows are inserted
+        self.deferred = []
+
+    def findExisting(self, connection, registry, tables, idColumns):
+        """Find ids referred to by ``tables`` but not exported that exist in
+        ``registry``."""
+        referred = {'Dataset': set(), 'Execution': set()}
+        for table, rows in tables.items():
+            for name, idTableName in idColumns[table].items():
+                referred[idTableName].update(row[name] for row in rows
+                                             if row.get(name) is not None)
+        for idTableName, ids in referred.items():
+            table = registry._schema.metadata.tables[idTableName]
+            column = table.primary_key.columns.values()[0]
+            for chunk in chunked(list(ids - self.exported[idTableName]), registry.MAX_IN_CLAUSE_SIZE):
+                self.existing[idTableName].update(row[0] for row in connection.execute(
+                    select([column]).where(column.in_(chunk))).fetchall())
+
+    def defer(self, table, values, name, idTableName, value):
+        """Record a reference to a row that has not been imported yet."""
+        key = {column.name: values[column.name] for column in table.primary_key.columns}
+        self.deferred.append((table, key, name, idTableName, value))
+
+
 class SqlRegistry(Registry):
     """Registry backed by a SQL database.
 
@@ -50,17 +179,165 @@ class SqlRegistry(Registry):
     ----------
     config : `SqlRegistryConfig` or `str`
         Load configuration
+
+    Notes
+    -----
+    The ``datasetLayout`` configuration entry selects how the DataUnit
+    values of Datasets are stored (see `Schema`): ``single`` (default) keeps
+    them in the ``Dataset`` table, ``partitioned`` in narrow tables
+    dedicated to each combination of DataUnits, which are created when a
+    `DatasetType` using them is first registered or looked up.  In the
+    partitioned layout, ``dataId`` entries that are not primary keys of the
+    `DatasetType`'s DataUnits are not stored.
+
+    If the configuration contains a ``slowQueryThreshold`` entry (in seconds),
+    every SQL statement that takes at least that long to execute is logged
+    as a warning to the ``daf.butler.registry`` logger, together with its
+    parameters and (for SELECT statements) the query plan reported by the
+    database.  The threshold may also be changed at runtime through the
+    ``slowQueryThreshold`` attribute; `None` disables the log.
+
+    A `SqlRegistry` may be shared between threads.  Each operation checks
+    a connection out of the engine's pool for its own use (subclasses
+    adapt the pool to their database through `_createEngine`), and the
+    in-memory `DatasetType` cache and buffered-write queue are protected
+    by a lock.  `DatabaseDict` instances returned by `makeDatabaseDict`
+    share the engine and are equally safe.
     """
 
+    EXPLAIN_PREFIXES = {"sqlite": "EXPLAIN QUERY PLAN"}
+    """Statement prefix used to obtain a query plan, keyed by SQLAlchemy
+    dialect name.  Dialects not listed use ``EXPLAIN``."""
+
+    MAX_IN_CLAUSE_SIZE = 500
+    """Maximum number of values bound in a single ``IN`` clause."""
+
+    DATA_UNIT_ENTRY_CACHE_SIZE = 100000
+    """Maximum number of dataIds whose `DataUnit` entries are memoized by
+    `expandMany`."""
+
     def __init__(self, config):
         super().__init__(config)
 
         self.config = SqlRegistryConfig(config)
         self.storageClasses = StorageClassFactory()
-        self._schema = Schema(self.config['schema'])
-        self._engine = create_engine(self.config['db'])
+        datasetLayout = self.config['datasetLayout'] if 'datasetLayout' in self.config else "single"
+        self._schema = Schema(self.config['schema'], datasetLayout=datasetLayout)
+        self._lock = threading.RLock()
+        self._engine = self._createEngine()
         self._schema.metadata.create_all(self._engine)
+        self._createdDatasetTables = {'Dataset'}
         self._datasetTypes = {}
+        self._dataUnitEntryCache = OrderedDict()
+        self._dataUnitEntryGeneration = 0
+        self._insertBuffer = None
+        self._log = Log.getLogger("daf.butler.registry")
+        self._statementRecorder = None
+        self.slowQueryThreshold = None
+        if 'slowQueryThreshold' in self.config:
+            self.slowQueryThreshold = float(self.config['slowQueryThreshold'])
+        event.listen(self._engine, "before_cursor_execute", self._beforeCursorExecute)
+        event.listen(self._engine, "after_cursor_execute", self._afterCursorExecute)
+        event.listen(self._engine, "handle_error", self._handleError)
+
+    def _createEngine(self):
+        """Create the SQLAlchemy engine used by this registry.
+
+        Subclasses may override this to configure connection pooling for
+        their database; the default uses SQLAlchemy's defaults for the
+        ``db`` URI in the configuration.
+
+        Returns
+        -------
+        engine : `sqlalchemy.engine.Engine`
+            A new engine.
+        """
+        return create_engine(self.config['db'])
+
+    @contextmanager
+    def bufferedWrites(self, maxSize=1000, maxAge=None):
+        r"""Context manager that enables buffered-write mode.
+
+        While active, `addDataset`, `attachComponent` and `addStorageInfo`
+        queue their inserts in memory instead of executing them immediately.
+        The queue is written with one ``executemany`` per table (in a single
+        transaction) when ``maxSize`` rows are queued, when the oldest row is
+        older than ``maxAge`` seconds, on an explicit call to `flush`, before
+        any other `SqlRegistry` method reads or modifies the database, and
+        when the context exits.
+
+        `addDataset` hands out provisional `DatasetRef`\ s whose ``id`` is
+        allocated from this process; they are valid once flushed.  This
+        assumes no other process inserts Datasets into the same database
+        concurrently; if one does, the flush fails with an `IntegrityError`.
+        The queue belongs to the registry, so while it is active writes from
+        all threads sharing the registry are buffered.
+
+        Parameters
+        ----------
+        maxSize : `int`, optional
+            Number of queued rows that triggers a flush.
+        maxAge : `float`, optional
+            Age in seconds of the oldest queued row that triggers a flush.
+            If `None` (default), only size triggers an automatic flush.
+        """
+        with self._lock:
+            # Nested use is a no-op.
+            owner = self._insertBuffer is None
+            if owner:
+                datasetTable = self._schema.metadata.tables['Dataset']
+                with self._engine.begin() as connection:
+                    maxId = connection.execute(select([func.max(datasetTable.c.dataset_id)])).scalar()
+                self._insertBuffer = _InsertBuffer(maxSize, maxAge, 1 if maxId is None else maxId + 1)
+        try:
+            yield
+        finally:
+            if owner:
+                with self._lock:
+                    try:
+                        self.flush()
+                    finally:
+                        self._insertBuffer = None
+
+    def flush(self):
+        r"""Write all inserts queued in buffered-write mode to the database.
+
+        Does nothing if buffered-write mode is not active.  On failure none of
+        the queued rows are written and they are kept in the queue, so that
+        the provisional `DatasetRef`\ s already handed out are written by the
+        next successful flush; if the flush done when leaving `bufferedWrites`
+        fails, the rows are lost and the error is raised from the context.
+        """
+        if self._insertBuffer is None:
+            return
+        with self._lock:
+            buffer = self._insertBuffer
+            if buffer is None or buffer.size == 0:
+                return
+            with self._engine.begin() as connection:
+                for tableName, rows in buffer.rows.items():
+                    table = self._schema.metadata.tables[tableName]
+                    # executemany requires all rows in a batch to have
+                    # the same columns (Dataset rows differ in their links)
+                    rows = sorted(rows, key=lambda row: tuple(sorted(row)))
+                    for _, batch in itertools.groupby(rows, key=lambda row: tuple(sorted(row))):
+                        connection.execute(table.insert(), list(batch))
+                collections = {}
+                for (collection, _, _), ref in buffer.datasets.items():
+                    collections.setdefault(collection, []).append(ref)
+                for collection, refs in collections.items():
+                    self._updateCollectionSummary(connection, collection, refs)
+            buffer.clear()
+
+    def _flushIfFull(self):
+        """Flush the insert buffer if one of its thresholds was reached."""
+        if self._insertBuffer.isFull():
+            self.flush()
+
+    def _makeDataIdKey(self, datasetType, dataId):
+        """Return a hashable key for the primary-key values of a dataId."""
+        return tuple(sorted((name, dataId[name]) for name in self._schema.dataUnits.getPrimaryKeyNames(
+            datasetType.dataUnits)))
 
     def query(self, sql, **params):
         """Execute a SQL SELECT statement directly.
@@ -83,12 +360,105 @@ class SqlRegistry(Registry):
         row : `dict`
             The next row result from executing the query.
 
+        Notes
+        -----
+        All rows are fetched before the first is yielded, so that no
+        connection (nor, for in-memory SQLite, the registry lock) is held
+        while the caller iterates.
         """
         # TODO: make this guard against non-SELECT queries.
+        self.flush()
         t = text(sql)
         with self._engine.begin() as connection:
-            for row in connection.execute(t, **params):
-                yield dict(row)
+            rows = connection.execute(t, **params).fetchall()
+        for row in rows:
+            yield dict(row)
+
+    def explain(self, statement, parameters=None):
+        """Return the plan the database would use to execute a statement.
+
+        Parameters
+        ----------
+        statement : `str` or `sqlalchemy.sql.expression.ClauseElement`
+            Statement to explain.  A `str` is passed to the database driver
+            as is, so any placeholders must use the driver's parameter style
+            (as recorded by `recordStatements` or reported in the slow-query
+            log).  SQLAlchemy constructs are compiled for this database,
+            including their bound parameters; to explain a `query` string use
+            ``sqlalchemy.text(sql).bindparams(**params)``.
+        parameters : `tuple` or `dict`, optional
+            Driver-level parameters for a `str` statement.
+
+        Returns
+        -------
+        plan : `list` of `tuple`
+            Rows returned by the database's ``EXPLAIN`` statement (``EXPLAIN
+            QUERY PLAN`` for SQLite).
+        """
+        if not isinstance(statement, str):
+            compiled = statement.compile(dialect=self._engine.dialect)
+            statement = str(compiled)
+            if compiled.positional:
+                parameters = tuple(compiled.params[name] for name in compiled.positiontup)
+            else:
+                parameters = compiled.params
+        with self._engine.begin() as connection:
+            return self._explain(connection.connection, statement, parameters)
+
+    @contextmanager
+    def recordStatements(self):
+        """Record the SQL statements executed by this registry.
+
+        Yields
+        ------
+        statements : `list` of `tuple`
+            List that receives a ``(statement, parameters)`` tuple for every
+            statement executed inside the context, in driver form; each may
+            be passed to `explain`.
+
+        Examples
+        --------
+        >>> with registry.recordStatements() as statements:
+        ...     registry.find(collection, datasetType, dataId)
+        >>> for statement, parameters in statements:
+        ...     print(registry.explain(statement, parameters))
+        """
+        previous = self._statementRecorder
+        self._statementRecorder = []
+        try:
+            yield self._statementRecorder
+        finally:
+            self._statementRecorder = previous
+
+    def _explain(self, dbapiConnection, statement, parameters):
+        prefix = self.EXPLAIN_PREFIXES.get(self._engine.dialect.name, "EXPLAIN")
+        with closing(dbapiConnection.cursor()) as cursor:
+            cursor.execute("{} {}".format(prefix, statement), parameters if parameters is not None else ())
+            return [tuple(row) for row in cursor.fetchall()]
+
+    def _beforeCursorExecute(self, connection, cursor, statement, parameters, context, executemany):
+        connection.info.setdefault("queryStartTime", []).append((context, time.monotonic()))
+
+    def _afterCursorExecute(self, connection, cursor, statement, parameters, context, executemany):
+        _, startTime = connection.info["queryStartTime"].pop()
+        elapsed = time.monotonic() - startTime
+        if self._statementRecorder is not None:
+            self._statementRecorder.append((statement, parameters))
+        if self.slowQueryThreshold is None or elapsed < self.slowQueryThreshold:
+            return
+        plan = None
+        if not executemany and statement.lstrip().upper().startswith("SELECT"):
+            plan = self._explain(connection.connection, statement, parameters)
+        self._log.warn("Slow query ({:.3f}s): {}; parameters: {}; plan: {}".format(
+            elapsed, statement, parameters, plan))
+
+    def _handleError(self, exceptionContext):
+        # A failed statement gets no after_cursor_execute event
+        if exceptionContext.connection is None:
+            return
+        startTimes = exceptionContext.connection.info.get("queryStartTime")
+        if startTimes and startTimes[-1][0] is exceptionContext.execution_context:
+            startTimes.pop()
 
     def _isValidDatasetType(self, datasetType):
         """Check if given `DatasetType` instance is valid for this `Registry`.
@@ -117,18 +487,20 @@ class SqlRegistry(Registry):
         """
         if not self._isValidDatasetType(datasetType):
             raise ValueError("DatasetType is not valid for this registry")
-        if datasetType.name in self._datasetTypes:
-            raise KeyError("DatasetType: {} already registered".format(datasetType.name))
         datasetTypeTable = self._schema.metadata.tables['DatasetType']
         datasetTypeUnitsTable = self._schema.metadata.tables['DatasetTypeUnits']
-        with self._engine.begin() as connection:
-            connection.execute(datasetTypeTable.insert().values(dataset_type_name=datasetType.name,
-                                                                storage_class=datasetType.storageClass.name))
-            if datasetType.dataUnits:
-                connection.execute(datasetTypeUnitsTable.insert(),
-                                   [{'dataset_type_name': datasetType.name, 'unit_name': dataUnitName}
-                                    for dataUnitName in datasetType.dataUnits])
+        with self._lock:
+            if datasetType.name in self._datasetTypes:
+                raise KeyError("DatasetType: {} already registered".format(datasetType.name))
+            with self._engine.begin() as connection:
+                connection.execute(datasetTypeTable.insert().values(
+                    dataset_type_name=datasetType.name, storage_class=datasetType.storageClass.name))
+                if datasetType.dataUnits:
+                    connection.execute(datasetTypeUnitsTable.insert(),
+                                       [{'dataset_type_name': datasetType.name, 'unit_name': dataUnitName}
+                                        for dataUnitName in datasetType.dataUnits])
             self._datasetTypes[datasetType.name] = datasetType
+            self._getDatasetTable(datasetType)
 
     def getDatasetType(self, name):
         """Get the `DatasetType`.
@@ -148,10 +520,8 @@ class SqlRegistry(Registry):
         KeyError
             Requested named DatasetType could not be found in registry.
         """
-        datasetType = None
-        if name in self._datasetTypes:
-            datasetType = self._datasetTypes[name]
-        else:
+        datasetType = self._datasetTypes.get(name)
+        if datasetType is None:
             datasetTypeTable = self._schema.metadata.tables['DatasetType']
             datasetTypeUnitsTable = self._schema.metadata.tables['DatasetTypeUnits']
             with self._engine.begin() as connection:
@@ -172,6 +542,31 @@ class SqlRegistry(Registry):
                                           dataUnits=dataUnits)
         return datasetType
 
+    def _getDatasetTable(self, datasetType):
+        """Return the table holding the DataUnit link values of Datasets of
+        the given type, creating it in the database if needed.
+
+        Must not be called inside a transaction.
+
+        Parameters
+        ----------
+        datasetType : `DatasetType`
+            The type of the Datasets.
+
+        Returns
+        -------
+        table : `sqlalchemy.Table`
+            The ``Dataset`` table, or the partition holding ``datasetType``
+            in the partitioned layout (see `Schema.getDatasetTable`).
+        """
+        linkNames = self._schema.dataUnits.getPrimaryKeyNames(datasetType.dataUnits)
+        with self._lock:
+            table = self._schema.getDatasetTable(linkNames)
+            if table.name not in self._createdDatasetTables:
+                table.create(self._engine, checkfirst=True)
+                self._createdDatasetTables.add(table.name)
+        return table
+
     def addDataset(self, datasetType, dataId, run, producer=None):
         """Add a Dataset to a Collection.
 
@@ -207,30 +602,87 @@ class SqlRegistry(Registry):
         """
         # TODO this is obviously not the most efficient way to check
         # for existence.
-        # TODO also note that this check is not safe
-        # in the presence of concurrent calls to addDataset.
+        # TODO also note that this check is only safe against concurrent
+        # calls to addDataset from threads sharing this SqlRegistry (which
+        # are serialized by the lock), not from other processes.
         # Then again, it is undoubtedly not the only place where
         # this problem occurs. Needs some serious thought.
-        if self.find(run.collection, datasetType, dataId) is not None:
+        with self._lock:
+            if self._insertBuffer is not None:
+                return self._addDatasetBuffered(datasetType, dataId, run)
+            if self.find(run.collection, datasetType, dataId) is not None:
+                raise ValueError("A dataset with id: {} already exists in collection {}".format(
+                    dataId, run.collection))
+            datasetTable = self._schema.metadata.tables['Dataset']
+            datasetCollectionTable = self._schema.metadata.tables['DatasetCollection']
+            linkTable = self._getDatasetTable(datasetType)
+            datasetRef = None
+            with self._engine.begin() as connection:
+                if linkTable is datasetTable:
+                    result = connection.execute(datasetTable.insert().values(
+                        dataset_type_name=datasetType.name,
+                        run_id=run.id,
+                        quantum_id=None,  # TODO add producer
+                        **dataId))
+                else:
+                    result = connection.execute(datasetTable.insert().values(
+                        dataset_type_name=datasetType.name,
+                        run_id=run.id,
+                        quantum_id=None))  # TODO add producer
+                    connection.execute(linkTable.insert().values(
+                        self._makeLinkRow(linkTable, datasetType, dataId, result.inserted_primary_key[0])))
+                datasetRef = DatasetRef(datasetType=datasetType, dataId=dataId,
+                                        id=result.inserted_primary_key[0])
+                # A dataset is always associated with its Run collection
+                # TODO: this should delegate to associate(), but the nested
+                # connection contexts produce OperationalErrors in Gen2 conversion
+                # of ci_hsc outputs, for unknown reasons.
+                connection.execute(datasetCollectionTable.insert(),
+                                   [{'dataset_id': datasetRef.id, 'collection': run.collection}])
+                self._updateCollectionSummary(connection, run.collection, [datasetRef])
+            return datasetRef
+
+    def _addDatasetBuffered(self, datasetType, dataId, run):
+        """Implementation of `addDataset` for buffered-write mode.
+
+        The dataId is validated here rather than when the rows are flushed,
+        so that an invalid one cannot make the whole buffer fail.
+        """
+        buffer = self._insertBuffer
+        self._validateDataId(datasetType, dataId)
+        linkTable = self._getDatasetTable(datasetType)
+        if linkTable.name == 'Dataset':
+            unknown = set(dataId) - set(linkTable.columns.keys())
+            if unknown:
+                raise ValueError("Unknown keys: {} in dataId {}".format(unknown, dataId))
+        key = (run.collection, datasetType.name, self._makeDataIdKey(datasetType, dataId))
+        if key in buffer.datasets or self._findDatasetId(run.collection, datasetType, dataId) is not None:
             raise ValueError("A dataset with id: {} already exists in collection {}".format(
                 dataId, run.collection))
-        datasetTable = self._schema.metadata.tables['Dataset']
-        datasetCollectionTable = self._schema.metadata.tables['DatasetCollection']
-        datasetRef = None
-        with self._engine.begin() as connection:
-            result = connection.execute(datasetTable.insert().values(dataset_type_name=datasetType.name,
-                                                                     run_id=run.id,
-                                                                     quantum_id=None,  # TODO add producer
-                                                                     **dataId))
-            datasetRef = DatasetRef(datasetType=datasetType, dataId=dataId, id=result.inserted_primary_key[0])
-            # A dataset is always associated with its Run collection
-            # TODO: this should delegate to associate(), but the nested
-            # connection contexts produce OperationalErrors in Gen2 conversion
-            # of ci_hsc outputs, for unknown reasons.
-            connection.execute(datasetCollectionTable.insert(),
-                               [{'dataset_id': datasetRef.id, 'collection': run.collection}])
+        datasetRef = DatasetRef(datasetType=datasetType, dataId=dataId, id=buffer.allocateDatasetId())
+        if linkTable.name == 'Dataset':
+            buffer.append('Dataset', dict(dataset_id=datasetRef.id,
+                                          dataset_type_name=datasetType.name,
+                                          run_id=run.id,
+                                          quantum_id=None,  # TODO add producer
+                                          **dataId))
+        else:
+            buffer.append('Dataset', dict(dataset_id=datasetRef.id,
+                                          dataset_type_name=datasetType.name,
+                                          run_id=run.id,
+                                          quantum_id=None))  # TODO add producer
+            buffer.append(linkTable.name, self._makeLinkRow(linkTable, datasetType, dataId, datasetRef.id))
+        buffer.append('DatasetCollection', {'dataset_id': datasetRef.id, 'collection': run.collection})
+        buffer.datasets[key] = datasetRef
+        self._flushIfFull()
         return datasetRef
 
+    def _makeLinkRow(self, linkTable, datasetType, dataId, datasetId):
+        """Return the row of a partitioned Dataset table for a Dataset."""
+        row = {name: dataId[name] for name in linkTable.columns.keys() if name in dataId}
+        row.update(dataset_id=datasetId, dataset_type_name=datasetType.name)
+        return row
+
     def getDataset(self, id):
         """Retrieve an Dataset.
 
@@ -239,35 +691,138 @@ class SqlRegistry(Registry):
         id : `int`
             The unique identifier for the Dataset.
         """
+        self.flush()
+        return self._getDatasets([id]).get(id)
+
+    def _getDatasets(self, ids):
+        """Retrieve many Datasets, and their components, in batched queries.
+
+        Parameters
+        ----------
+        ids : iterable of `int`
+            The unique identifiers of the Datasets.
+
+        Returns
+        -------
+        refs : `dict`
+            `DatasetRef` instances keyed by ``dataset_id``, for all requested
+            Datasets that exist and all their (recursive) components.
+        """
         datasetTable = self._schema.metadata.tables['Dataset']
-        with self._engine.begin() as connection:
-            result = connection.execute(
-                select([datasetTable]).where(datasetTable.c.dataset_id == id)).fetchone()
-        if result is not None:
-            datasetType = self.getDatasetType(result['dataset_type_name'])
-            # dataUnitName gives a `str` key which which is used to lookup
-            # the corresponding sqlalchemy.core.Column entry to index the result
-            # because the name of the key may not be the name of the name of the
-            # DataUnit link.
-            dataId = {dataUnitName: result[self._schema.dataUnits.links[dataUnitName]]
-                      for dataUnitName in self._schema.dataUnits.getPrimaryKeyNames(datasetType.dataUnits)}
-            # Get components (if present)
-            # TODO check against expected components
-            components = {}
-            datasetCompositionTable = self._schema.metadata.tables['DatasetComposition']
+        datasetCompositionTable = self._schema.metadata.tables['DatasetComposition']
+        datasetTypes = {}
+        refs = {}
+        compositions = []
+        pending = list(set(ids))
+        requested = set(pending)
+        while pending:
+            rows = []
             with self._engine.begin() as connection:
-                results = connection.execute(
-                    select([datasetCompositionTable.c.component_name,
-                            datasetCompositionTable.c.component_dataset_id]).where(
-                                datasetCompositionTable.c.parent_dataset_id == id)).fetchall()
-                if results is not None:
-                    for result in results:
-                        components[result['component_name']] = self.getDataset(result['component_dataset_id'])
-            ref = DatasetRef(datasetType=datasetType, dataId=dataId, id=id)
-            ref._components = components
-            return ref
-        else:
-            return None
+                for chunk in chunked(pending, self.MAX_IN_CLAUSE_SIZE):
+                    rows.extend(connection.execute(
+                        select([datasetTable]).where(datasetTable.c.dataset_id.in_(chunk))).fetchall())
+                    # TODO check against expected components
+                    compositions.extend(connection.execute(
+                        select([datasetCompositionTable.c.parent_dataset_id,
+                                datasetCompositionTable.c.component_name,
+                                datasetCompositionTable.c.component_dataset_id]).where(
+                                    datasetCompositionTable.c.parent_dataset_id.in_(chunk))).fetchall())
+            # Link values live either in the Dataset rows themselves or in
+            # partitioned tables, which are read with one query per table.
+            linkRows = {}
+            partitions = {}
+            for row in rows:
+                name = row['dataset_type_name']
+                if name not in datasetTypes:
+                    datasetType = self.getDatasetType(name)
+                    datasetTypes[name] = (datasetType, self._getDatasetTable(datasetType))
+                datasetType, linkTable = datasetTypes[name]
+                if linkTable is datasetTable:
+                    linkRows[row['dataset_id']] = row
+                else:
+                    partitions.setdefault(linkTable, []).append(row['dataset_id'])
+            if partitions:
+                with self._engine.begin() as connection:
+                    for linkTable, partitionIds in partitions.items():
+                        for chunk in chunked(partitionIds, self.MAX_IN_CLAUSE_SIZE):
+                            for row in connection.execute(select([linkTable]).where(
+                                    linkTable.c.dataset_id.in_(chunk))).fetchall():
+                                linkRows[row['dataset_id']] = row
+            for row in rows:
+                datasetType, linkTable = datasetTypes[row['dataset_type_name']]
+                linkRow = linkRows[row['dataset_id']]
+                # dataUnitName gives a `str` key which which is used to lookup
+                # the corresponding sqlalchemy.core.Column entry to index the result
+                # because the name of the key may not be the name of the name of the
+                # DataUnit link.
+                dataUnitNames = self._schema.dataUnits.getPrimaryKeyNames(datasetType.dataUnits)
+                dataId = {dataUnitName: linkRow[linkTable.columns[dataUnitName]]
+                          for dataUnitName in dataUnitNames}
+                refs[row['dataset_id']] = DatasetRef(datasetType=datasetType, dataId=dataId,
+                                                     id=row['dataset_id'])
+            pending = list({componentId for _, _, componentId in compositions} - requested)
+            requested.update(pending)
+        for parentId, componentName, componentId in compositions:
+            if parentId in refs and componentId in refs:
+                refs[parentId]._components[componentName] = refs[componentId]
+        return refs
+
+    def iterDatasets(self, collection, datasetType, where=None, pageSize=1000):
+        """Iterate over all Datasets of a `DatasetType` in a Collection.
+
+        Datasets are read in pages of ``pageSize``, ordered by ``dataset_id``
+        and selected with a ``dataset_id`` greater than the last one of the
+        previous page (rather than with an ``OFFSET``), so every page costs
+        the same regardless of how far the scan has progressed.  Each page is
+        turned into `DatasetRef` instances, with their components, in a
+        constant number of queries.
+
+        Parameters
+        ----------
+        collection : `str`
+            Identifies the Collection to search.
+        datasetType : `DatasetType` or `str`
+            The `DatasetType` (or its name) of the Datasets to list.
+        where : `str` or `sqlalchemy.sql.expression.ColumnElement`, optional
+            Additional SQL boolean expression on the columns of the
+            ``Dataset`` table, e.g. ``"visit > 10"``.
+        pageSize : `int`, optional
+            Number of Datasets read per query.
+
+        Yields
+        ------
+        ref : `DatasetRef`
+            The next Dataset, in increasing ``dataset_id`` order.
+        """
+        if isinstance(datasetType, str):
+            datasetType = self.getDatasetType(datasetType)
+        self.flush()
+        datasetTable = self._getDatasetTable(datasetType)
+        datasetCollectionTable = self._schema.metadata.tables['DatasetCollection']
+        conditions = [datasetTable.c.dataset_type_name == datasetType.name,
+                      datasetCollectionTable.c.collection == collection]
+        if where is not None:
+            conditions.append(text(where) if isinstance(where, str) else where)
+        fromClause = datasetTable.join(datasetCollectionTable,
+                                       datasetTable.c.dataset_id == datasetCollectionTable.c.dataset_id)
+        lastId = None
+        while True:
+            pageConditions = list(conditions)
+            if lastId is not None:
+                pageConditions.append(datasetTable.c.dataset_id > lastId)
+            with self._engine.begin() as connection:
+                ids = [row['dataset_id'] for row in connection.execute(
+                    select([datasetTable.c.dataset_id]).select_from(fromClause).where(
+                        and_(*pageConditions)).order_by(
+                            datasetTable.c.dataset_id).limit(pageSize)).fetchall()]
+            if not ids:
+                return
+            refs = self._getDatasets(ids)
+            for id in ids:
+                yield refs[id]
+            if len(ids) < pageSize:
+                return
+            lastId = ids[-1]
 
     def setAssembler(self, ref, assembler):
         """Set the assembler to use for a composite dataset.
@@ -279,6 +834,7 @@ class SqlRegistry(Registry):
         assembler : `str`
             Fully qualified name of the assembler.
         """
+        self.flush()
         datasetTable = self._schema.metadata.tables['Dataset']
         with self._engine.begin() as connection:
             connection.execute(datasetTable.update().where(
@@ -299,6 +855,14 @@ class SqlRegistry(Registry):
             A reference to the component dataset.
         """
         # TODO Insert check for component name and type against parent.storageClass specified components
+        with self._lock:
+            if self._insertBuffer is not None:
+                self._insertBuffer.append('DatasetComposition', {'component_name': name,
+                                                                 'parent_dataset_id': parent.id,
+                                                                 'component_dataset_id': component.id})
+                parent._components[name] = component
+                self._flushIfFull()
+                return
         datasetCompositionTable = self._schema.metadata.tables['DatasetComposition']
         with self._engine.begin() as connection:
             connection.execute(datasetCompositionTable.insert().values(component_name=name,
@@ -318,10 +882,13 @@ class SqlRegistry(Registry):
             A `list` of `DatasetRef` instances that already exist in this
             `SqlRegistry`.
         """
+        self.flush()
         datasetCollectionTable = self._schema.metadata.tables['DatasetCollection']
-        with self._engine.begin() as connection:
-            connection.execute(datasetCollectionTable.insert(),
-                               [{'dataset_id': ref.id, 'collection': collection} for ref in refs])
+        with self._lock:
+            with self._engine.begin() as connection:
+                connection.execute(datasetCollectionTable.insert(),
+                                   [{'dataset_id': ref.id, 'collection': collection} for ref in refs])
+                self._updateCollectionSummary(connection, collection, refs)
 
     def disassociate(self, collection, refs, remove=True):
         r"""Remove existing Datasets from a Collection.
@@ -345,16 +912,377 @@ class SqlRegistry(Registry):
         removed : `list` of `DatasetRef`
             If `remove` is `True`, the `list` of `DatasetRef`\ s that were
             removed.
+        storageInfos : `dict`
+            If `remove` is `True`, the storage information of the removed
+            Datasets (including components), as returned by
+            `removeDatasets`, so that each `Datastore` can delete their
+            files.
+        """
+        self.flush()
+        datasetCollectionTable = self._schema.metadata.tables['DatasetCollection']
+        datasetCompositionTable = self._schema.metadata.tables['DatasetComposition']
+        with self._lock:
+            with self._engine.begin() as connection:
+                disassociated = []
+                for ref in refs:
+                    result = connection.execute(datasetCollectionTable.delete().where(
+                        and_(datasetCollectionTable.c.dataset_id == ref.id,
+                             datasetCollectionTable.c.collection == collection)))
+                    if result.rowcount > 0:
+                        disassociated.append(ref)
+                self._updateCollectionSummary(connection, collection, disassociated, added=False)
+                if not remove:
+                    return [], {}
+                # Datasets still in a Collection, or components of a
+                # composite that is kept, must be kept; this applies to the
+                # components of the given Datasets as much as to themselves.
+                orphans = self._expandComponents(connection, {ref.id for ref in refs})
+                for chunk in chunked(list(orphans), self.MAX_IN_CLAUSE_SIZE):
+                    orphans.difference_update(row['dataset_id'] for row in connection.execute(
+                        select([datasetCollectionTable.c.dataset_id]).where(
+                            datasetCollectionTable.c.dataset_id.in_(chunk))).fetchall())
+                compositions = []
+                for chunk in chunked(list(orphans), self.MAX_IN_CLAUSE_SIZE):
+                    compositions.extend(connection.execute(
+                        select([datasetCompositionTable.c.parent_dataset_id,
+                                datasetCompositionTable.c.component_dataset_id]).where(
+                                    datasetCompositionTable.c.component_dataset_id.in_(chunk))).fetchall())
+                # Keeping a component keeps its own components, so iterate
+                # until no more Datasets are kept.
+                changed = True
+                while changed:
+                    changed = False
+                    for parentId, componentId in compositions:
+                        if componentId in orphans and parentId not in orphans:
+                            orphans.discard(componentId)
+                            changed = True
+                storageInfos = self._removeDatasetIds(connection, orphans)
+        return [ref for ref in refs if ref.id in orphans], storageInfos
+
+    def removeDatasets(self, datasets, **params):
+        """Remove Datasets, and their components, from the `SqlRegistry`.
+
+        All rows referring to the Datasets (Collection memberships,
+        composition, storage information, consumers and validity ranges)
+        are deleted with set-based statements on chunks of ids, in a single
+        transaction.  File artifacts are not touched; the returned storage
+        information tells each `Datastore` what it should delete.
+
+        Parameters
+        ----------
+        datasets : iterable of `DatasetRef`, or `str`
+            The Datasets to remove, or a SQL SELECT statement returning their
+            ids in a ``dataset_id`` column (with named parameters as in
+            `query`), e.g. ``"SELECT dataset_id FROM Dataset WHERE
+            run_id = :run"``.
+        **params
+            Parameter name-value pairs to insert into the query.
+
+        Returns
+        -------
+        storageInfos : `dict`
+            For each `Datastore` name, a `dict` of the `StorageInfo` of the
+            removed Datasets (including components) it held, keyed by
+            ``dataset_id``.
+        """
+        self.flush()
+        with self._lock:
+            with self._engine.begin() as connection:
+                if isinstance(datasets, str):
+                    ids = {row['dataset_id'] for row in connection.execute(text(datasets),
+                                                                           **params).fetchall()}
+                else:
+                    ids = {ref.id for ref in datasets}
+                return self._removeDatasetIds(connection, self._expandComponents(connection, ids))
+
+    def _expandComponents(self, connection, ids):
+        """Add the (recursive) components of Datasets to a set of ids.
+
+        Parameters
+        ----------
+        connection : `sqlalchemy.engine.Connection`
+            Connection with the open transaction.
+        ids : `set` of `int`
+            Ids of the Datasets; updated in place.
+
+        Returns
+        -------
+        ids : `set` of `int`
+            The updated ``ids``.
+        """
+        datasetCompositionTable = self._schema.metadata.tables['DatasetComposition']
+        pending = list(ids)
+        while pending:
+            components = set()
+            for chunk in chunked(pending, self.MAX_IN_CLAUSE_SIZE):
+                components.update(row['component_dataset_id'] for row in connection.execute(
+                    select([datasetCompositionTable.c.component_dataset_id]).where(
+                        datasetCompositionTable.c.parent_dataset_id.in_(chunk))).fetchall())
+            pending = list(components - ids)
+            ids.update(pending)
+        return ids
+
+    def _removeDatasetIds(self, connection, ids):
+        """Implementation of `removeDatasets`; caller must hold the lock.
+
+        Parameters
+        ----------
+        connection : `sqlalchemy.engine.Connection`
+            Connection with the open transaction.
+        ids : `set` of `int`
+            Ids of the Datasets to remove.  Their components are not added;
+            components that are not in ``ids`` are only detached.
+
+        Returns
+        -------
+        storageInfos : `dict`
+            As returned by `removeDatasets`.
         """
-        if remove:
-            raise NotImplementedError("Cleanup of datasets not yet implemented")
+        datasetTable = self._schema.metadata.tables['Dataset']
+        datasetTypeUnitsTable = self._schema.metadata.tables['DatasetTypeUnits']
+        datasetCompositionTable = self._schema.metadata.tables['DatasetComposition']
         datasetCollectionTable = self._schema.metadata.tables['DatasetCollection']
+        datasetStorageTable = self._schema.metadata.tables['DatasetStorage']
+        runTable = self._schema.metadata.tables['Run']
+        ids = list(ids)
+        # Find the link tables involved.  They already exist in the database
+        # since they hold the Datasets, so only their definitions are needed
+        # (and `_getDatasetTable` must not be called inside a transaction).
+        datasetTypeNames = set()
+        for chunk in chunked(ids, self.MAX_IN_CLAUSE_SIZE):
+            datasetTypeNames.update(row['dataset_type_name'] for row in connection.execute(
+                select([datasetTable.c.dataset_type_name]).where(
+                    datasetTable.c.dataset_id.in_(chunk)).distinct()).fetchall())
+        linkTables = set()
+        for name in datasetTypeNames:
+            datasetType = self._datasetTypes.get(name)
+            if datasetType is not None:
+                dataUnits = datasetType.dataUnits
+            else:
+                dataUnits = [row['unit_name'] for row in connection.execute(
+                    select([datasetTypeUnitsTable.c.unit_name]).where(
+                        datasetTypeUnitsTable.c.dataset_type_name == name)).fetchall()]
+            linkTables.add(self._schema.getDatasetTable(self._schema.dataUnits.getPrimaryKeyNames(dataUnits)))
+        linkTables.discard(datasetTable)
+        storageInfos = {}
+        removedCounts = {}
+        countColumns = [datasetCollectionTable.c.collection, datasetTable.c.dataset_type_name,
+                        func.count(datasetTable.c.dataset_id).label('count')]
+        for chunk in chunked(ids, self.MAX_IN_CLAUSE_SIZE):
+            for row in connection.execute(select([datasetStorageTable]).where(
+                    datasetStorageTable.c.dataset_id.in_(chunk))).fetchall():
+                storageInfos.setdefault(row['datastore_name'], {})[row['dataset_id']] = StorageInfo(
+                    datastoreName=row['datastore_name'], checksum=row['checksum'], size=row['size'])
+            for row in connection.execute(select(countColumns).select_from(
+                    datasetCollectionTable.join(datasetTable)).where(
+                        datasetTable.c.dataset_id.in_(chunk)).group_by(*countColumns[:2])).fetchall():
+                key = (row['collection'], row['dataset_type_name'])
+                removedCounts[key] = removedCounts.get(key, 0) + row['count']
+        self._decrementCollectionSummary(connection, removedCounts)
+        # Delete referring rows first, so no foreign key is ever violated
+        for chunk in chunked(ids, self.MAX_IN_CLAUSE_SIZE):
+            for tableName in ('DatasetCollection', 'DatasetStorage', 'DatasetConsumers',
+                              'DatasetValidityRange'):
+                table = self._schema.metadata.tables[tableName]
+                connection.execute(table.delete().where(table.c.dataset_id.in_(chunk)))
+            connection.execute(datasetCompositionTable.delete().where(
+                datasetCompositionTable.c.parent_dataset_id.in_(chunk)))
+            connection.execute(datasetCompositionTable.delete().where(
+                datasetCompositionTable.c.component_dataset_id.in_(chunk)))
+            for column in (runTable.c.environment_id, runTable.c.pipeline_id):
+                connection.execute(runTable.update().where(column.in_(chunk)).values({column.name: None}))
+            for linkTable in linkTables:
+                connection.execute(linkTable.delete().where(linkTable.c.dataset_id.in_(chunk)))
+        for chunk in chunked(ids, self.MAX_IN_CLAUSE_SIZE):
+            connection.execute(datasetTable.delete().where(datasetTable.c.dataset_id.in_(chunk)))
+        return storageInfos
+
+    def _updateCollectionSummary(self, connection, collection, refs, added=True):
+        """Update the ``CollectionSummary`` of a Collection for Datasets
+        added to or removed from it.
+
+        Must be called with the lock held, in the transaction that adds or
+        removes the Datasets.
+
+        Parameters
+        ----------
+        connection : `sqlalchemy.engine.Connection`
+            Connection with the open transaction.
+        collection : `str`
+            The Collection.
+        refs : iterable of `DatasetRef`
+            Datasets added to or removed from the Collection.
+        added : `bool`, optional
+            If `False`, the Datasets were removed; counts are decremented but
+            ranges are left as they are.
+        """
+        summaryTable = self._schema.metadata.tables['CollectionSummary']
+        datasetTypes = {}
+        for ref in refs:
+            datasetTypes.setdefault(ref.datasetType.name, (ref.datasetType, []))[1].append(ref)
+        if not added:
+            self._decrementCollectionSummary(connection, {(collection, datasetTypeName): len(typeRefs)
+                                                          for datasetTypeName, (_, typeRefs)
+                                                          in datasetTypes.items()})
+            return
+        for datasetTypeName, (datasetType, typeRefs) in datasetTypes.items():
+            condition = and_(summaryTable.c.collection == collection,
+                             summaryTable.c.dataset_type_name == datasetTypeName)
+            # The existing row is updated in a single statement, so that
+            # concurrent updates from other processes are not lost
+            values = {'count': summaryTable.c.count + len(typeRefs)}
+            insertValues = {'collection': collection, 'dataset_type_name': datasetTypeName,
+                            'count': len(typeRefs)}
+            for linkName in self._schema.dataUnits.getPrimaryKeyNames(datasetType.dataUnits):
+                linkValues = [ref.dataId[linkName] for ref in typeRefs
+                              if ref.dataId.get(linkName) is not None]
+                if not linkValues:
+                    continue
+                minName, maxName = "min_{}".format(linkName), "max_{}".format(linkName)
+                minColumn, maxColumn = summaryTable.columns[minName], summaryTable.columns[maxName]
+                lower, upper = min(linkValues), max(linkValues)
+                values[minName] = case([(or_(minColumn.is_(None), minColumn > lower), lower)],
+                                       else_=minColumn)
+                values[maxName] = case([(or_(maxColumn.is_(None), maxColumn < upper), upper)],
+                                       else_=maxColumn)
+                insertValues[minName] = lower
+                insertValues[maxName] = upper
+            update = summaryTable.update().where(condition).values(values)
+            if connection.execute(update).rowcount > 0:
+                continue
+            try:
+                with connection.begin_nested():
+                    connection.execute(summaryTable.insert().values(insertValues))
+            except IntegrityError:
+                # Inserted by another process in the meantime
+                connection.execute(update)
+
+    def _decrementCollectionSummary(self, connection, counts):
+        """Decrement ``CollectionSummary`` counts for removed Datasets.
+
+        Ranges are left as they are; rows whose count drops to zero are
+        deleted.
+
+        Parameters
+        ----------
+        connection : `sqlalchemy.engine.Connection`
+            Connection with the open transaction.
+        counts : `dict`
+            Number of Datasets removed, keyed by ``(collection,
+            datasetTypeName)``.
+        """
+        summaryTable = self._schema.metadata.tables['CollectionSummary']
+        for (collection, datasetTypeName), count in counts.items():
+            condition = and_(summaryTable.c.collection == collection,
+                             summaryTable.c.dataset_type_name == datasetTypeName)
+            connection.execute(summaryTable.update().where(condition).values(
+                count=summaryTable.c.count - count))
+            connection.execute(summaryTable.delete().where(and_(condition, summaryTable.c.count <= 0)))
+
+    def getCollectionSummary(self, collection):
+        """Return a summary of the Datasets in a Collection.
+
+        The summary is read from a small table that is kept up to date by
+        `addDataset`, `associate` and `disassociate`, so this does not query
+        the (potentially very large) Dataset tables.
+
+        Parameters
+        ----------
+        collection : `str`
+            The Collection to summarize.
+
+        Returns
+        -------
+        summary : `dict`
+            `DatasetTypeSummary` instances keyed by `DatasetType` name, for
+            every `DatasetType` present in the Collection.
+        """
+        self.flush()
+        summaryTable = self._schema.metadata.tables['CollectionSummary']
         with self._engine.begin() as connection:
-            for ref in refs:
-                connection.execute(datasetCollectionTable.delete().where(
-                    and_(datasetCollectionTable.c.dataset_id == ref.id,
-                         datasetCollectionTable.c.collection == collection)))
-        return []
+            rows = connection.execute(select([summaryTable]).where(
+                summaryTable.c.collection == collection)).fetchall()
+        return {row['dataset_type_name']: self._makeDatasetTypeSummary(row) for row in rows}
+
+    def mayContain(self, collection, datasetType, dataId=None):
+        """Test whether a Collection may contain a Dataset, using only its
+        summary (see `getCollectionSummary`).
+
+        Parameters
+        ----------
+        collection : `str`
+            The Collection to check.
+        datasetType : `DatasetType` or `str`
+            The `DatasetType` (or its name) of the Dataset.
+        dataId : `dict`, optional
+            A `dict` of `DataUnit` link name, value pairs of the Dataset.
+
+        Returns
+        -------
+        mayContain : `bool`
+            `False` if the Collection holds no Dataset of this type, or none
+            within the range of one of the ``dataId`` values; `True`
+            otherwise (in which case the Dataset may still not exist).
+        """
+        if not isinstance(datasetType, str):
+            datasetType = datasetType.name
+        self.flush()
+        summaryTable = self._schema.metadata.tables['CollectionSummary']
+        with self._engine.begin() as connection:
+            row = connection.execute(select([summaryTable]).where(
+                and_(summaryTable.c.collection == collection,
+                     summaryTable.c.dataset_type_name == datasetType))).fetchone()
+        if row is None:
+            return False
+        if dataId is not None:
+            ranges = self._makeDatasetTypeSummary(row).ranges
+            for linkName, value in dataId.items():
+                if linkName in ranges and not ranges[linkName][0] <= value <= ranges[linkName][1]:
+                    return False
+        return True
+
+    def rebuildCollectionSummaries(self):
+        """Recompute the summaries of all Collections from the Dataset tables.
+
+        This is only needed for databases populated before summaries were
+        maintained, or to tighten ranges after Datasets were removed.
+        """
+        self.flush()
+        summaryTable = self._schema.metadata.tables['CollectionSummary']
+        datasetTypeTable = self._schema.metadata.tables['DatasetType']
+        datasetCollectionTable = self._schema.metadata.tables['DatasetCollection']
+        with self._lock:
+            with self._engine.begin() as connection:
+                names = [row['dataset_type_name'] for row in connection.execute(
+                    select([datasetTypeTable.c.dataset_type_name])).fetchall()]
+            datasetTypes = [self.getDatasetType(name) for name in names]
+            datasetTables = [self._getDatasetTable(datasetType) for datasetType in datasetTypes]
+            with self._engine.begin() as connection:
+                connection.execute(summaryTable.delete())
+                for datasetType, datasetTable in zip(datasetTypes, datasetTables):
+                    columns = [datasetCollectionTable.c.collection,
+                               func.count(datasetTable.c.dataset_id).label('count')]
+                    for linkName in self._schema.dataUnits.getPrimaryKeyNames(datasetType.dataUnits):
+                        linkColumn = datasetTable.columns[linkName]
+                        columns.append(func.min(linkColumn).label("min_{}".format(linkName)))
+                        columns.append(func.max(linkColumn).label("max_{}".format(linkName)))
+                    onClause = datasetTable.c.dataset_id == datasetCollectionTable.c.dataset_id
+                    fromClause = datasetTable.join(datasetCollectionTable, onClause)
+                    rows = connection.execute(select(columns).select_from(fromClause).where(
+                        datasetTable.c.dataset_type_name == datasetType.name).group_by(
+                            datasetCollectionTable.c.collection)).fetchall()
+                    for row in rows:
+                        connection.execute(summaryTable.insert().values(dataset_type_name=datasetType.name,
+                                                                        **dict(row)))
+
+    def _makeDatasetTypeSummary(self, row):
+        """Make a `DatasetTypeSummary` from a ``CollectionSummary`` row."""
+        ranges = {}
+        for linkName in self._schema.dataUnits.links:
+            lower = row["min_{}".format(linkName)]
+            if lower is not None:
+                ranges[linkName] = (lower, row["max_{}".format(linkName)])
+        return DatasetTypeSummary(count=row['count'], ranges=ranges)
 
     def addStorageInfo(self, ref, storageInfo):
         """Add storage information for a given dataset.
@@ -368,6 +1296,14 @@ class SqlRegistry(Registry):
         storageInfo : `StorageInfo`
             Storage information about the dataset.
         """
+        with self._lock:
+            if self._insertBuffer is not None:
+                self._insertBuffer.append('DatasetStorage', {'dataset_id': ref.id,
+                                                             'datastore_name': storageInfo.datastoreName,
+                                                             'checksum': storageInfo.checksum,
+                                                             'size': storageInfo.size})
+                self._flushIfFull()
+                return
         datasetStorageTable = self._schema.metadata.tables['DatasetStorage']
         with self._engine.begin() as connection:
             connection.execute(datasetStorageTable.insert().values(dataset_id=ref.id,
@@ -375,6 +1311,31 @@ class SqlRegistry(Registry):
                                                                    checksum=storageInfo.checksum,
                                                                    size=storageInfo.size))
 
+    def addStorageInfoMany(self, items):
+        """Add storage information for several datasets at once.
+
+        Typically used by `Datastore`.
+
+        Parameters
+        ----------
+        items : iterable of `tuple`
+            ``(ref, storageInfo)`` pairs, as passed to `addStorageInfo`.
+        """
+        rows = [{'dataset_id': ref.id,
+                 'datastore_name': storageInfo.datastoreName,
+                 'checksum': storageInfo.checksum,
+                 'size': storageInfo.size} for ref, storageInfo in items]
+        with self._lock:
+            if self._insertBuffer is not None:
+                for row in rows:
+                    self._insertBuffer.append('DatasetStorage', row)
+                self._flushIfFull()
+                return
+        if rows:
+            datasetStorageTable = self._schema.metadata.tables['DatasetStorage']
+            with self._engine.begin() as connection:
+                connection.execute(datasetStorageTable.insert(), rows)
+
     def updateStorageInfo(self, ref, datastoreName, storageInfo):
         """Update storage information for a given dataset.
 
@@ -389,6 +1350,7 @@ class SqlRegistry(Registry):
         storageInfo : `StorageInfo`
             Storage information about the dataset.
         """
+        self.flush()
         datasetStorageTable = self._schema.metadata.tables['DatasetStorage']
         with self._engine.begin() as connection:
             connection.execute(datasetStorageTable.update().where(and_(
@@ -420,6 +1382,7 @@ class SqlRegistry(Registry):
         KeyError
             The requested Dataset does not exist.
         """
+        self.flush()
         datasetStorageTable = self._schema.metadata.tables['DatasetStorage']
         storageInfo = None
         with self._engine.begin() as connection:
@@ -439,6 +1402,37 @@ class SqlRegistry(Registry):
                                   size=result["size"])
         return storageInfo
 
+    def getStorageInfoMany(self, refs, datastoreName):
+        """Retrieve storage information for several datasets at once.
+
+        Typically used by `Datastore`.
+
+        Parameters
+        ----------
+        refs : iterable of `DatasetRef`
+            References to the datasets.
+        datastoreName : `str`
+            What datastore association to retrieve.
+
+        Returns
+        -------
+        infos : `dict`
+            `StorageInfo` keyed by ``dataset_id``.  Datasets without storage
+            information in the datastore are left out.
+        """
+        self.flush()
+        datasetStorageTable = self._schema.metadata.tables['DatasetStorage']
+        infos = {}
+        with self._engine.begin() as connection:
+            for chunk in chunked(list({ref.id for ref in refs}), self.MAX_IN_CLAUSE_SIZE):
+                for row in connection.execute(select([datasetStorageTable]).where(
+                        and_(datasetStorageTable.c.dataset_id.in_(chunk),
+                             datasetStorageTable.c.datastore_name == datastoreName))).fetchall():
+                    infos[row["dataset_id"]] = StorageInfo(datastoreName=row["datastore_name"],
+                                                           checksum=row["checksum"],
+                                                           size=row["size"])
+        return infos
+
     def removeStorageInfo(self, datastoreName, ref):
         """Remove storage information associated with this dataset.
 
@@ -451,12 +1445,33 @@ class SqlRegistry(Registry):
         ref : `DatasetRef`
             A reference to the dataset for which information is to be removed.
         """
+        self.flush()
         datasetStorageTable = self._schema.metadata.tables['DatasetStorage']
         with self._engine.begin() as connection:
             connection.execute(datasetStorageTable.delete().where(
                                and_(datasetStorageTable.c.dataset_id == ref.id,
                                     datasetStorageTable.c.datastore_name == datastoreName)))
 
+    def removeStorageInfoMany(self, datastoreName, refs):
+        """Remove storage information associated with several datasets at
+        once.
+
+        Parameters
+        ----------
+        datastoreName : `str`
+            Name of this `Datastore`.
+        refs : iterable of `DatasetRef`
+            References to the datasets for which information is to be
+            removed.
+        """
+        self.flush()
+        datasetStorageTable = self._schema.metadata.tables['DatasetStorage']
+        with self._engine.begin() as connection:
+            for chunk in chunked(list({ref.id for ref in refs}), self.MAX_IN_CLAUSE_SIZE):
+                connection.execute(datasetStorageTable.delete().where(
+                                   and_(datasetStorageTable.c.dataset_id.in_(chunk),
+                                        datasetStorageTable.c.datastore_name == datastoreName)))
+
     def addExecution(self, execution):
         """Add a new `Execution` to the `SqlRegistry`.
 
@@ -647,6 +1662,7 @@ class SqlRegistry(Registry):
               `DatasetRef`\ s, and its.
             - `actualInputs` and `outputs` will be ignored.
         """
+        self.flush()
         quantumTable = self._schema.metadata.tables['Quantum']
         datasetConsumersTable = self._schema.metadata.tables['DatasetConsumers']
         with self._engine.begin() as connection:
@@ -762,6 +1778,9 @@ class SqlRegistry(Registry):
                 connection.execute(dataUnitTable.insert().values(**values))
             except IntegrityError as err:
                 raise ValueError(str(err))  # TODO this should do an explicit validity check instead
+        with self._lock:
+            self._dataUnitEntryCache.clear()
+            self._dataUnitEntryGeneration += 1
 
     def findDataUnitEntry(self, dataUnitName, value):
         """Return a `DataUnit` entry corresponding to a `value`.
@@ -802,8 +1821,163 @@ class SqlRegistry(Registry):
         -------
         ref : `DatasetRef`
             The expanded reference.
+
+        See Also
+        --------
+        SqlRegistry.expandMany
         """
-        raise NotImplementedError("Must be implemented by subclass")
+        return self.expandMany([ref])[0]
+
+    def expandMany(self, refs):
+        """Expand several `DatasetRef` instances at once.
+
+        The `DataUnit` entries of all refs sharing the same DataUnits are
+        looked up in a single query, which joins the primary tables of the
+        DataUnits of their `DatasetType` and of all the DataUnits these
+        depend on, following the order of the `DataUnitRegistry`.  Results
+        are memoized per unique dataId until `addDataUnitEntry` is called.
+
+        Parameters
+        ----------
+        refs : iterable of `DatasetRef`
+            The references to expand.
+
+        Returns
+        -------
+        expanded : `list` of `DatasetRef`
+            New references, in the same order as ``refs``.  Their ``dataId``
+            is completed with the link values of the DataUnits that could be
+            resolved (e.g. ``physical_filter`` and ``abstract_filter`` for a
+            Visit), and their ``dataUnitEntries`` hold the full entry of each
+            DataUnit present in the registry.  DataUnits without an entry are
+            left out.
+
+        Raises
+        ------
+        ValueError
+            If the dataId of a ref is invalid for its `DatasetType`.
+        """
+        refs = list(refs)
+        keys = []
+        missing = {}
+        resolved = {}
+        with self._lock:
+            generation = self._dataUnitEntryGeneration
+            for ref in refs:
+                self._validateDataId(ref.datasetType, ref.dataId)
+                dataUnitNames = frozenset(ref.datasetType.dataUnits)
+                keyNames = tuple(sorted(self._schema.dataUnits.getPrimaryKeyNames(dataUnitNames)))
+                key = (dataUnitNames, tuple(ref.dataId[name] for name in keyNames))
+                keys.append(key)
+                if key in self._dataUnitEntryCache:
+                    resolved[key] = self._dataUnitEntryCache[key]
+                else:
+                    missing.setdefault((dataUnitNames, keyNames), set()).add(key[1])
+        for (dataUnitNames, keyNames), values in missing.items():
+            results = self._resolveDataUnitEntries(dataUnitNames, keyNames, values)
+            with self._lock:
+                for value, result in results.items():
+                    resolved[(dataUnitNames, value)] = result
+                    if generation == self._dataUnitEntryGeneration:
+                        self._dataUnitEntryCache[(dataUnitNames, value)] = result
+                while len(self._dataUnitEntryCache) > self.DATA_UNIT_ENTRY_CACHE_SIZE:
+                    self._dataUnitEntryCache.popitem(last=False)
+        return [self._makeExpandedRef(ref, *resolved[key]) for ref, key in zip(refs, keys)]
+
+    def _resolveDataUnitEntries(self, dataUnitNames, keyNames, values):
+        """Look up the `DataUnit` entries for a set of dataIds.
+
+        The dataIds are turned into a derived table that is outer-joined to
+        the tables of ``dataUnitNames`` and their required dependencies
+        (joined on the dataId values) and then to those of their optional
+        dependencies (joined on the columns of the tables already in the
+        query, dependents before dependencies).
+
+        Parameters
+        ----------
+        dataUnitNames : `frozenset` of `str`
+            Names of the DataUnits of a `DatasetType`.
+        keyNames : `tuple` of `str`
+            Primary-key column names of ``dataUnitNames``.
+        values : iterable of `tuple`
+            Values of ``keyNames`` for each dataId.
+
+        Returns
+        -------
+        results : `dict`
+            ``(links, entries)`` tuples keyed by the value tuples, where
+            ``links`` maps link names to the values found in the entries and
+            ``entries`` maps DataUnit names to their entry.
+        """
+        values = list(values)
+        if not keyNames:
+            return {value: ({}, {}) for value in values}
+        dataUnits = self._schema.dataUnits
+        given = set()
+        pending = list(dataUnitNames)
+        while pending:
+            dataUnit = dataUnits[pending.pop()]
+            if dataUnit.name not in given:
+                given.add(dataUnit.name)
+                pending.extend(dependency.name for dependency in dataUnit.requiredDependencies)
+        implied = set()
+        pending = list(given)
+        while pending:
+            for dependency in dataUnits[pending.pop()].dependencies:
+                if dependency.name not in given and dependency.name not in implied:
+                    implied.add(dependency.name)
+                    pending.append(dependency.name)
+        order = [name for name in dataUnits if name in given]
+        order.extend(reversed([name for name in dataUnits if name in implied]))
+
+        results = {value: ({}, {}) for value in values}
+        chunkSize = max(1, self.MAX_IN_CLAUSE_SIZE // len(keyNames))
+        with self._engine.begin() as connection:
+            for chunk in chunked(values, chunkSize):
+                idRows = [select([literal(v).label(name) for name, v in zip(keyNames, value)])
+                          for value in chunk]
+                ids = (union_all(*idRows) if len(idRows) > 1 else idRows[0]).alias("ids")
+                available = {name: ids.c[name] for name in keyNames}
+                fromClause = ids
+                columns = list(ids.c)
+                labels = []
+                for name in order:
+                    dataUnit = dataUnits[name]
+                    table = dataUnit.table
+                    if table is None or not dataUnit.primaryKey <= available.keys():
+                        continue
+                    onClause = and_(*[table.c[key] == available[key] for key in dataUnit.primaryKey])
+                    fromClause = fromClause.outerjoin(table, onClause)
+                    tableLabels = []
+                    for column in table.columns:
+                        label = "c{}_{}".format(len(labels), len(tableLabels))
+                        columns.append(column.label(label))
+                        tableLabels.append((column.name, label))
+                        available.setdefault(column.name, column)
+                    labels.append((dataUnit, tableLabels))
+                for row in connection.execute(select(columns).select_from(fromClause)):
+                    links, entries = results[tuple(row[name] for name in keyNames)]
+                    for dataUnit, tableLabels in labels:
+                        entry = {columnName: row[label] for columnName, label in tableLabels}
+                        # Unmatched outer joins leave the primary key NULL
+                        if all(entry[key] is not None for key in dataUnit.primaryKey):
+                            entries[dataUnit.name] = entry
+                    for entry in entries.values():
+                        for columnName, value in entry.items():
+                            if columnName in dataUnits.links and value is not None:
+                                links.setdefault(columnName, value)
+        return results
+
+    def _makeExpandedRef(self, ref, links, entries):
+        """Return a copy of ``ref`` with an expanded dataId and entries.
+        """
+        dataId = dict(links)
+        dataId.update(ref.dataId)
+        expanded = DatasetRef(ref.datasetType, dataId, id=ref.id)
+        for name in ("_producer", "_predictedConsumers", "_actualConsumers", "_components", "_assembler"):
+            setattr(expanded, name, getattr(ref, name))
+        expanded._dataUnitEntries = entries
+        return expanded
 
     def _validateDataId(self, datasetType, dataId):
         """Check if a dataId is valid for a particular `DatasetType`.
@@ -853,23 +2027,179 @@ class SqlRegistry(Registry):
             If dataId is invalid.
         """
         self._validateDataId(datasetType, dataId)
-        datasetTable = self._schema.metadata.tables['Dataset']
+        self.flush()
+        datasetId = self._findDatasetId(collection, datasetType, dataId)
+        # TODO update unit values and add Run, Quantum and assembler?
+        if datasetId is not None:
+            return self.getDataset(datasetId)
+        else:
+            return None
+
+    def _findDatasetId(self, collection, datasetType, dataId):
+        """Lookup the ``dataset_id`` of a Dataset in the database.
+
+        Unlike `find`, this does not validate ``dataId`` and ignores any
+        writes still queued in buffered-write mode.
+
+        Returns
+        -------
+        id : `int`
+            The ``dataset_id``, or `None` if no matching Dataset was found.
+        """
+        datasetTable = self._getDatasetTable(datasetType)
         datasetCollectionTable = self._schema.metadata.tables['DatasetCollection']
-        dataIdExpression = and_((self._schema.dataUnits.links[name] == dataId[name]
+        dataIdExpression = and_((datasetTable.columns[name] == dataId[name]
                                  for name in self._schema.dataUnits.getPrimaryKeyNames(
                                      datasetType.dataUnits)))
+        fromClause = datasetTable.join(datasetCollectionTable,
+                                       datasetTable.c.dataset_id == datasetCollectionTable.c.dataset_id)
         with self._engine.begin() as connection:
             result = connection.execute(select([datasetTable.c.dataset_id]).select_from(
-                datasetTable.join(datasetCollectionTable)).where(and_(
+                fromClause).where(and_(
                     datasetTable.c.dataset_type_name == datasetType.name,
                     datasetCollectionTable.c.collection == collection,
                     dataIdExpression))).fetchone()
-        # TODO update unit values and add Run, Quantum and assembler?
         if result is not None:
-            return self.getDataset(result['dataset_id'])
+            return result['dataset_id']
         else:
             return None
 
+    def addValidityRange(self, ref, camera, begin, end=None):
+        """Record the range of observation times for which a Dataset
+        (typically a master calibration) is valid.
+
+        Parameters
+        ----------
+        ref : `DatasetRef`
+            A reference to the Dataset.
+        camera : `str`
+            Name of the Camera the Dataset may be used with.
+        begin : `datetime.datetime`
+            Start of the validity range (inclusive).
+        end : `datetime.datetime`, optional
+            End of the validity range (exclusive).  If `None` the range is
+            open in the future.
+
+        Raises
+        ------
+        ValueError
+            If ``end`` is not later than ``begin``.
+        """
+        if end is not None and end <= begin:
+            raise ValueError("Validity range end ({}) must be later than begin ({})".format(end, begin))
+        self.flush()
+        validityTable = self._schema.metadata.tables['DatasetValidityRange']
+        with self._engine.begin() as connection:
+            connection.execute(validityTable.insert().values(dataset_id=ref.id,
+                                                             camera=camera,
+                                                             datetime_begin=begin,
+                                                             datetime_end=end))
+
+    def getValidityRange(self, ref):
+        """Retrieve the validity range of a Dataset.
+
+        Parameters
+        ----------
+        ref : `DatasetRef`
+            A reference to the Dataset.
+
+        Returns
+        -------
+        validityRange : `tuple`
+            A ``(camera, begin, end)`` tuple, or `None` if no validity range
+            was recorded for this Dataset.
+        """
+        validityTable = self._schema.metadata.tables['DatasetValidityRange']
+        with self._engine.begin() as connection:
+            result = connection.execute(
+                select([validityTable.c.camera,
+                        validityTable.c.datetime_begin,
+                        validityTable.c.datetime_end]).where(
+                            validityTable.c.dataset_id == ref.id)).fetchone()
+        if result is None:
+            return None
+        return (result['camera'], result['datetime_begin'], result['datetime_end'])
+
+    def findValid(self, collection, datasetType, camera, timestamp):
+        """Lookup the Dataset that is valid at a particular observation time.
+
+        Parameters
+        ----------
+        collection : `str`
+            Identifies the Collection to search.
+        datasetType : `DatasetType`
+            The `DatasetType`.
+        camera : `str`
+            Name of the Camera.
+        timestamp : `datetime.datetime`
+            Observation time (e.g. ``Exposure.datetime_begin``).
+
+        Returns
+        -------
+        ref : `DatasetRef`
+            A ref to the Dataset, or `None` if no Dataset in the Collection
+            is valid at ``timestamp``.
+        """
+        return self.findValidMany(collection, datasetType, camera, [timestamp])[0]
+
+    def findValidMany(self, collection, datasetType, camera, timestamps):
+        """Lookup the Datasets that are valid at a batch of observation times.
+
+        All validity ranges overlapping the span of ``timestamps`` are
+        retrieved with a single query (a range scan on the
+        ``(camera, datetime_begin, datetime_end)`` index) and matched to the
+        individual timestamps in memory.  When more than one range contains
+        a timestamp, the one that starts latest wins.
+
+        Parameters
+        ----------
+        collection : `str`
+            Identifies the Collection to search.
+        datasetType : `DatasetType`
+            The `DatasetType`.
+        camera : `str`
+            Name of the Camera.
+        timestamps : iterable of `datetime.datetime`
+            Observation times.
+
+        Returns
+        -------
+        refs : `list` of `DatasetRef`
+            The Dataset valid at each of the given ``timestamps`` (in the same
+            order), with `None` entries where no Dataset is valid.
+        """
+        timestamps = list(timestamps)
+        if not timestamps:
+            return []
+        self.flush()
+        datasetTable = self._schema.metadata.tables['Dataset']
+        datasetCollectionTable = self._schema.metadata.tables['DatasetCollection']
+        validityTable = self._schema.metadata.tables['DatasetValidityRange']
+        with self._engine.begin() as connection:
+            results = connection.execute(
+                select([validityTable.c.dataset_id,
+                        validityTable.c.datetime_begin,
+                        validityTable.c.datetime_end]).select_from(
+                            validityTable.join(datasetTable).join(datasetCollectionTable)).where(and_(
+                                validityTable.c.camera == camera,
+                                validityTable.c.datetime_begin <= max(timestamps),
+                                or_(validityTable.c.datetime_end.is_(None),
+                                    validityTable.c.datetime_end > min(timestamps)),
+                                datasetTable.c.dataset_type_name == datasetType.name,
+                                datasetCollectionTable.c.collection == collection)).order_by(
+                                    validityTable.c.datetime_begin)).fetchall()
+        begins = [result['datetime_begin'] for result in results]
+        matches = []
+        for timestamp in timestamps:
+            match = None
+            for result in reversed(results[:bisect.bisect_right(begins, timestamp)]):
+                if result['datetime_end'] is None or result['datetime_end'] > timestamp:
+                    match = result['dataset_id']
+                    break
+            matches.append(match)
+        refs = {datasetId: self.getDataset(datasetId) for datasetId in set(matches) if datasetId is not None}
+        return [refs.get(datasetId) for datasetId in matches]
+
     def subset(self, collection, expr, datasetTypes):
         r"""Create a new `Collection` by subsetting an existing one.
 
@@ -951,39 +2281,319 @@ class SqlRegistry(Registry):
         """
         raise NotImplementedError("Must be implemented by subclass")
 
-    def export(self, expr):
-        """Export contents of the `SqlRegistry`, limited to those reachable from
+    def export(self, expr, datastoreTables=(), **params):
+        r"""Export contents of the `SqlRegistry`, limited to those reachable from
         the Datasets identified by the expression `expr`, into a `TableSet`
         format such that it can be imported into a different database.
 
+        The selected Datasets are completed with their components and with
+        the environment and pipeline Datasets of their Runs; the export then
+        holds their `DatasetType` definitions, the primary-table entries of
+        their `DataUnit`\ s, their Runs, producing Quanta and Executions,
+        and their Collection memberships, composition, consumers, storage
+        information and validity ranges.
+
         Parameters
         ----------
-        expr : `str`
+        expr : `str` or iterable of `DatasetRef`
             An expression (SQL query that evaluates to a list of Dataset
-            primary keys) that selects the `Datasets, or a `QuantumGraph`
-            that can be similarly interpreted.
+            primary keys, in a ``dataset_id`` column, with named parameters
+            as in `query`) that selects the Datasets, or the `DatasetRef`\ s
+            themselves (e.g. the predicted inputs of the Quanta of a job).
+        datastoreTables : iterable of `str`, optional
+            Names of further tables in the same database that hold `Datastore`
+            records keyed by ``dataset_id`` (e.g. the ``records`` table of a
+            `PosixDatastore`).
+        **params
+            Parameter name-value pairs to insert into the query.
 
         Returns
         -------
-        ts : `TableSet`
-            Containing all rows, from all tables in the `SqlRegistry` that
-            are reachable from the selected Datasets.
+        ts : `collections.OrderedDict`
+            Lists of rows (`dict` keyed by column name), keyed by
+            `sqlalchemy.Table` in an order in which they can be inserted.
+            ``Dataset`` rows hold their DataUnit link values whatever the
+            Dataset layout (see `Schema`), so the export can be imported in
+            a registry using either layout.
         """
-        raise NotImplementedError("Must be implemented by subclass")
-
-    def import_(self, tables, collection):
+        self.flush()
+        if isinstance(expr, str):
+            with self._engine.begin() as connection:
+                selected = {row['dataset_id'] for row in connection.execute(text(expr), **params).fetchall()}
+        else:
+            selected = {ref.id for ref in expr}
+        tables = self._schema.metadata.tables
+        datasetTable = tables['Dataset']
+        datasetCompositionTable = tables['DatasetComposition']
+        runTable = tables['Run']
+        quantumTable = tables['Quantum']
+        ids = set()
+        executionIds = set()
+        datasetRows = {}
+        with self._engine.begin() as connection:
+            pendingIds = selected
+            pendingExecutionIds = set()
+            while pendingIds or pendingExecutionIds:
+                ids.update(pendingIds)
+                executionIds.update(pendingExecutionIds)
+                foundIds = set()
+                foundExecutionIds = set()
+                for chunk in chunked(list(pendingIds), self.MAX_IN_CLAUSE_SIZE):
+                    for row in connection.execute(select([datasetTable]).where(
+                            datasetTable.c.dataset_id.in_(chunk))).fetchall():
+                        datasetRows[row['dataset_id']] = dict(row)
+                        foundExecutionIds.update(executionId for executionId
+                                                 in (row['run_id'], row['quantum_id'])
+                                                 if executionId is not None)
+                    foundIds.update(row['component_dataset_id'] for row in connection.execute(
+                        select([datasetCompositionTable.c.component_dataset_id]).where(
+                            datasetCompositionTable.c.parent_dataset_id.in_(chunk))).fetchall())
+                for chunk in chunked(list(pendingExecutionIds), self.MAX_IN_CLAUSE_SIZE):
+                    foundExecutionIds.update(row['run_id'] for row in connection.execute(
+                        select([quantumTable.c.run_id]).where(
+                            quantumTable.c.execution_id.in_(chunk))).fetchall())
+                    for row in connection.execute(select([runTable]).where(
+                            runTable.c.execution_id.in_(chunk))).fetchall():
+                        foundIds.update(datasetId for datasetId in (row['environment_id'], row['pipeline_id'])
+                                        if datasetId is not None)
+                pendingIds = foundIds - ids
+                pendingExecutionIds = foundExecutionIds - executionIds
+        ids = set(datasetRows)
+        datasetTypeNames = {row['dataset_type_name'] for row in datasetRows.values()}
+        linkTables = {self._getDatasetTable(self.getDatasetType(name)) for name in datasetTypeNames}
+        extraTables = [Table(name, MetaData(), autoload=True, autoload_with=self._engine)
+                       for name in datastoreTables]
+
+        def selectRows(connection, table, column, values):
+            rows = []
+            for chunk in chunked(list(values), self.MAX_IN_CLAUSE_SIZE):
+                rows.extend(dict(row) for row in connection.execute(
+                    select([table]).where(table.c[column].in_(chunk))).fetchall())
+            return rows
+
+        result = OrderedDict()
+        entries = OrderedDict((dataUnit.name, {}) for dataUnit in self._schema.dataUnits.values()
+                              if dataUnit.table is not None)
+        for ref in self.expandMany(self._getDatasets(ids).values()):
+            for name, entry in ref.dataUnitEntries.items():
+                key = tuple(entry[column] for column in sorted(self._schema.dataUnits[name].primaryKey))
+                entries[name][key] = entry
+        for name, unitEntries in entries.items():
+            result[self._schema.dataUnits[name].table] = list(unitEntries.values())
+        with self._engine.begin() as connection:
+            for name in ('DatasetType', 'DatasetTypeUnits', 'DatasetTypeMetadata'):
+                result[tables[name]] = selectRows(connection, tables[name], 'dataset_type_name',
+                                                  datasetTypeNames)
+            for name in ('Execution', 'Run', 'Quantum'):
+                result[tables[name]] = selectRows(connection, tables[name], 'execution_id', executionIds)
+            for linkTable in linkTables:
+                if linkTable is not datasetTable:
+                    for row in selectRows(connection, linkTable, 'dataset_id', ids):
+                        datasetRows[row['dataset_id']].update(row)
+            result[datasetTable] = list(datasetRows.values())
+            result[datasetCompositionTable] = selectRows(connection, datasetCompositionTable,
+                                                         'parent_dataset_id', ids)
+            result[tables['DatasetCollection']] = selectRows(connection, tables['DatasetCollection'],
+                                                             'dataset_id', ids)
+            consumers = selectRows(connection, tables['DatasetConsumers'], 'quantum_id', executionIds)
+            consumers.extend(row for row
+                             in selectRows(connection, tables['DatasetConsumers'], 'dataset_id', ids)
+                             if row['quantum_id'] not in executionIds)
+            result[tables['DatasetConsumers']] = consumers
+            for name in ('DatasetStorage', 'DatasetValidityRange'):
+                result[tables[name]] = selectRows(connection, tables[name], 'dataset_id', ids)
+            for table in extraTables:
+                result[table] = selectRows(connection, table, 'dataset_id', ids)
+        return result
+
+    def import_(self, tables, collection=None, preserveIds=True):
         """Import (previously exported) contents into the (possibly empty)
         `SqlRegistry`.
 
+        Rows whose primary key is already present are skipped, so importing
+        overlapping exports is safe.  Rows referring to Datasets or
+        Executions that are neither in ``tables`` nor in this registry lose
+        the reference if it is optional, and are skipped otherwise.  Tables
+        missing from this registry (e.g. `Datastore` records) are created.
+
         Parameters
         ----------
-        ts : `TableSet`
-            Contains the previously exported content.
-        collection : `str`
+        tables : `collections.OrderedDict`
+            Contains the previously exported content, as returned by
+            `export`.
+        collection : `str`, optional
             An additional Collection collection assigned to the newly
             imported Datasets.
+        preserveIds : `bool`, optional
+            If `True` (default), imported Datasets and Executions (hence Runs
+            and Quanta) keep their ids, which must not be used by other
+            entries in this registry.  If `False`, they get new ids and all
+            references to them are rewritten.
+
+        Returns
+        -------
+        datasetIds : `dict`
+            The ids of the imported Datasets in this registry, keyed by their
+            id in ``tables``.
         """
-        raise NotImplementedError("Must be implemented by subclass")
+        self.flush()
+        targets = OrderedDict()
+        for table, rows in tables.items():
+            if table.name in self._schema.metadata.tables:
+                targets[self._schema.metadata.tables[table.name]] = rows
+            else:
+                target = table.tometadata(MetaData())
+                target.create(self._engine, checkfirst=True)
+                targets[target] = rows
+        idColumns = {table: {column.name: self._getIdTableName(column) for column in table.columns
+                             if self._getIdTableName(column) is not None}
+                     for table in targets}
+        # Rows that do not refer to Datasets or Executions (DatasetTypes and
+        # DataUnits) go first: partitioned Dataset tables depend on them.
+        state = _ImportState(tables, preserveIds)
+        with self._lock:
+            with self._engine.begin() as connection:
+                for table, rows in targets.items():
+                    if not idColumns[table]:
+                        self._importRows(connection, table, rows, idColumns[table], state)
+            datasetTable = self._schema.metadata.tables['Dataset']
+            datasetTypes = {name: self.getDatasetType(name) for name in
+                            {row['dataset_type_name'] for row in targets.get(datasetTable, ())}}
+            linkTables = {name: self._getDatasetTable(datasetType)
+                          for name, datasetType in datasetTypes.items()}
+            with self._engine.begin() as connection:
+                state.findExisting(connection, self, targets, idColumns)
+                for table, rows in targets.items():
+                    if idColumns[table]:
+                        self._importRows(connection, table, rows, idColumns[table], state,
+                                         datasetTypes=datasetTypes, linkTables=linkTables)
+                for table, pkValues, columnName, idTableName, value in state.deferred:
+                    if value in state.ids[idTableName]:
+                        connection.execute(table.update().where(
+                            and_(*[table.c[name] == v for name, v in pkValues.items()])).values(
+                            {columnName: state.ids[idTableName][value]}))
+                datasetCollectionTable = self._schema.metadata.tables['DatasetCollection']
+                if collection is not None:
+                    memberships = [{'dataset_id': datasetId, 'collection': collection}
+                                   for datasetId in state.ids['Dataset'].values()]
+                    self._importRows(connection, datasetCollectionTable, memberships, {}, state)
+                added = {}
+                for row in state.inserted.get(datasetCollectionTable, ()):
+                    if row['dataset_id'] in state.refs:
+                        added.setdefault(row['collection'], []).append(state.refs[row['dataset_id']])
+                for name, refs in added.items():
+                    self._updateCollectionSummary(connection, name, refs)
+        return dict(state.ids['Dataset'])
+
+    def _getIdTableName(self, column):
+        """Return the name of the table (``Dataset`` or ``Execution``) whose
+        autoincrement ids are held by a column, or `None`.
+
+        Foreign keys are followed, and untyped ``dataset_id`` columns (such
+        as those of `Datastore` records) are taken to refer to Datasets.
+        """
+        for foreignKey in column.foreign_keys:
+            return self._getIdTableName(foreignKey.column)
+        if column.table.name in ('Dataset', 'Execution') and column.primary_key:
+            return column.table.name
+        if column.name == 'dataset_id':
+            return 'Dataset'
+        return None
+
+    def _importRows(self, connection, table, rows, idColumns, state, datasetTypes=None, linkTables=None):
+        """Insert the rows of one table for `import_`.
+
+        Parameters
+        ----------
+        connection : `sqlalchemy.engine.Connection`
+            Connection with the open transaction.
+        table : `sqlalchemy.Table`
+            Table of this registry to insert into.
+        rows : `list` of `dict`
+            Exported rows.
+        idColumns : `dict`
+            Name of the table whose ids are held by each column of ``table``
+            that refers to a Dataset or Execution (see `_getIdTableName`).
+        state : `_ImportState`
+            Ids and rows imported so far.
+        datasetTypes : `dict`, optional
+            `DatasetType` instances by name; required for ``Dataset`` rows.
+        linkTables : `dict`, optional
+            Tables returned by `_getDatasetTable`, by DatasetType name;
+            required for ``Dataset`` rows.
+        """
+        ownIdColumn = None
+        if table.name in ('Dataset', 'Execution'):
+            ownIdColumn = table.primary_key.columns.values()[0].name
+        # Tables without a primary key are deduplicated on all columns
+        keyNames = [column.name for column in table.primary_key.columns] or list(table.columns.keys())
+        pending = []
+        for row in rows:
+            values = {name: value for name, value in row.items() if name in table.columns}
+            skip = False
+            deferred = []
+            for name, idTableName in idColumns.items():
+                value = values.get(name)
+                if value is None or name == ownIdColumn:
+                    continue
+                if value in state.ids[idTableName]:
+                    values[name] = state.ids[idTableName][value]
+                elif value in state.exported[idTableName]:
+                    # Refers to a row imported later (Run to Dataset)
+                    values[name] = None
+                    deferred.append((name, idTableName, value))
+                elif value not in state.existing[idTableName]:
+                    if table.columns[name].nullable:
+                        values[name] = None
+                    else:
+                        skip = True
+            if not skip:
+                for name, idTableName, value in deferred:
+                    state.defer(table, values, name, idTableName, value)
+                pending.append((row, values))
+        if ownIdColumn is None or state.preserveIds:
+            existing = set()
+            keyColumns = [table.columns[name] for name in keyNames]
+            for chunk in chunked(list({values.get(keyNames[0]) for _, values in pending}),
+                                 self.MAX_IN_CLAUSE_SIZE):
+                existing.update(tuple(r) for r in connection.execute(
+                    select(keyColumns).where(keyColumns[0].in_(chunk))).fetchall())
+            for row, values in pending:
+                key = tuple(values.get(name) for name in keyNames)
+                if ownIdColumn is not None:
+                    state.ids[table.name][row[ownIdColumn]] = row[ownIdColumn]
+                if key in existing:
+                    continue
+                existing.add(key)
+                if table.name == 'Dataset':
+                    self._importDataset(connection, row, values, datasetTypes, linkTables, state)
+                else:
+                    connection.execute(table.insert(), values)
+                state.inserted.setdefault(table, []).append(values)
+        else:
+            for row, values in pending:
+                values.pop(ownIdColumn, None)
+                if table.name == 'Dataset':
+                    self._importDataset(connection, row, values, datasetTypes, linkTables, state)
+                else:
+                    newId = connection.execute(table.insert(), values).inserted_primary_key[0]
+                    state.ids[table.name][row[ownIdColumn]] = newId
+                state.inserted.setdefault(table, []).append(values)
+
+    def _importDataset(self, connection, row, values, datasetTypes, linkTables, state):
+        """Insert one ``Dataset`` row, and its partition row, for `import_`."""
+        datasetType = datasetTypes[row['dataset_type_name']]
+        linkTable = linkTables[datasetType.name]
+        datasetId = connection.execute(self._schema.metadata.tables['Dataset'].insert(),
+                                       values).inserted_primary_key[0]
+        linkNames = self._schema.dataUnits.getPrimaryKeyNames(datasetType.dataUnits)
+        dataId = {name: row[name] for name in linkNames if name in row}
+        if linkTable.name != 'Dataset':
+            connection.execute(linkTable.insert(),
+                               self._makeLinkRow(linkTable, datasetType, dataId, datasetId))
+        values['dataset_id'] = datasetId
+        state.ids['Dataset'][row['dataset_id']] = datasetId
+        state.refs[datasetId] = DatasetRef(datasetType, dataId, id=datasetId)
 
     def transfer(self, src, expr, collection):
         r"""Transfer contents from a source `SqlRegistry`, limited to those
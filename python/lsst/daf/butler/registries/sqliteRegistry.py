@@ -19,10 +19,13 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import weakref
 from contextlib import closing
 
 from sqlalchemy.engine import Engine
-from sqlalchemy import event
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import StaticPool
+from sqlalchemy import create_engine, event
 
 from sqlite3 import Connection as SQLite3Connection
 
@@ -45,7 +48,49 @@ class SqliteRegistry(SqlRegistry):
     ----------
     config : `SqlRegistryConfig` or `str`
         Load configuration
+
+    Notes
+    -----
+    File databases open a new connection for every operation, in the
+    calling thread, and rely on SQLite's own locking.  An in-memory database
+    only exists within a single connection, so it is shared by all threads
+    and each transaction holds the registry's lock until it ends.
     """
 
     def __init__(self, config):
         super().__init__(config)
+
+    def _createEngine(self):
+        url = make_url(self.config['db'])
+        if url.database not in (None, "", ":memory:"):
+            return create_engine(url, connect_args={"check_same_thread": False})
+        engine = create_engine(url, connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        lock = _TransactionLock(self._lock)
+        event.listen(engine, "begin", lock.acquire)
+        event.listen(engine, "commit", lock.release)
+        event.listen(engine, "rollback", lock.release)
+        return engine
+
+
+class _TransactionLock:
+    """Hold a lock for the duration of each transaction on an engine.
+
+    Parameters
+    ----------
+    lock : `threading.RLock`
+        Lock to hold; re-entrant so that a thread may nest transactions.
+    """
+
+    def __init__(self, lock):
+        self._lock = lock
+        self._holders = weakref.WeakSet()
+
+    def acquire(self, connection):
+        self._lock.acquire()
+        self._holders.add(connection)
+
+    def release(self, connection):
+        # A failed commit is followed by a rollback; only release once.
+        if connection in self._holders:
+            self._holders.discard(connection)
+            self._lock.release()
@@ -20,6 +20,24 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 
+class DummyDatabaseDict(dict):
+    """Dummy DatabaseDict, for Datastore test purposes."""
+
+    def getMany(self, keys):
+        return {key: self[key] for key in keys if key in self}
+
+    def setMany(self, items):
+        self.update(items)
+
+    def delMany(self, keys):
+        for key in keys:
+            self.pop(key, None)
+
+    def getBatch(self, after=None, limit=1000):
+        keys = sorted(key for key in self if after is None or key > after)[:limit]
+        return [(key, self[key]) for key in keys]
+
+
 class DummyRegistry:
     """Dummy Registry, for Datastore test purposes.
 
@@ -31,15 +49,28 @@ class DummyRegistry:
         self._entries = {}
 
     def addStorageInfo(self, ref, storageInfo):
-        ref._id = self._counter
-        self._entries[ref.id] = storageInfo
-        self._counter += 1
+        if ref.id is None:
+            ref._id = self._counter
+            self._counter += 1
+        self._entries[(ref.id, storageInfo.datastoreName)] = storageInfo
+
+    def addStorageInfoMany(self, items):
+        for ref, storageInfo in items:
+            self.addStorageInfo(ref, storageInfo)
 
     def getStorageInfo(self, ref, datastoreName):
-        return self._entries[ref.id]
+        return self._entries[(ref.id, datastoreName)]
+
+    def getStorageInfoMany(self, refs, datastoreName):
+        return {ref.id: self._entries[(ref.id, datastoreName)] for ref in refs
+                if (ref.id, datastoreName) in self._entries}
 
     def removeStorageInfo(self, datastoreName, ref):
-        del self._entries[ref.id]
+        del self._entries[(ref.id, datastoreName)]
+
+    def removeStorageInfoMany(self, datastoreName, refs):
+        for ref in refs:
+            self._entries.pop((ref.id, datastoreName), None)
 
     def makeDatabaseDict(self, table, types, key, value):
-        return dict()
+        return DummyDatabaseDict()
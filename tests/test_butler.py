@@ -23,11 +23,13 @@
 """
 
 import os
+import pickle
 import unittest
 
 import lsst.utils.tests
 
 from lsst.daf.butler import Butler
+from lsst.daf.butler import ButlerConfig
 from lsst.daf.butler import StorageClassFactory
 from lsst.daf.butler import DatasetType, DatasetRef
 from examplePythonTypes import MetricsExample
@@ -123,6 +125,57 @@ class ButlerTestCase(lsst.utils.tests.TestCase):
         self.assertGetComponents(butler, datasetTypeName, dataId,
                                  ("summary", "data", "output"), metric)
 
+    def testGetDeferred(self):
+        butler = Butler(self.configFile)
+        datasetTypeName = "test_metric_deferred"
+        dataUnits = ("Camera", "Visit")
+        storageClass = self.storageClassFactory.getStorageClass("StructuredData")
+        self.registerDatasetTypes(datasetTypeName, dataUnits, storageClass, butler.registry)
+        metric = makeExampleMetrics()
+        dataId = {"camera": "DummyCamDeferred", "visit": 424}
+        ref = butler.put(metric, datasetTypeName, dataId)
+
+        handle = butler.getDeferred(datasetTypeName, dataId, cache=True)
+        self.assertEqual(handle.ref, ref)
+        self.assertEqual(handle.get(), metric)
+        self.assertIs(handle.get(), handle.get())
+
+        # Pickled handles carry no data and find the Butler again
+        copy = pickle.loads(pickle.dumps(handle))
+        self.assertNotIn(pickle.dumps(metric.output), pickle.dumps(handle))
+        self.assertIs(copy.butler, butler)
+        self.assertEqual(copy.get(), metric)
+
+        with self.assertRaises(ValueError):
+            butler.getDeferred(datasetTypeName, {"camera": "DummyCamDeferred", "visit": 425})
+
+
+class InMemoryDatastoreButlerTestCase(ButlerTestCase):
+    """Test for Butler with an InMemoryDatastore.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.configFile = ButlerConfig(cls.configFile)
+        cls.configFile["datastore.cls"] = "lsst.daf.butler.datastores.inMemoryDatastore.InMemoryDatastore"
+
+
+class ChainedDatastoreButlerTestCase(ButlerTestCase):
+    """Test for Butler with an InMemoryDatastore in front of a
+    PosixDatastore.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.configFile = ButlerConfig(cls.configFile)
+        cls.configFile["datastore.cls"] = "lsst.daf.butler.datastores.chainedDatastore.ChainedDatastore"
+        cls.configFile["datastore.datastores"] = [
+            {"cls": "lsst.daf.butler.datastores.inMemoryDatastore.InMemoryDatastore"},
+            {"cls": "lsst.daf.butler.datastores.posixDatastore.PosixDatastore"},
+        ]
+
 
 class MemoryTester(lsst.utils.tests.MemoryTestCase):
     pass
@@ -0,0 +1,157 @@
+# This file is part of daf_butler.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (http://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import tempfile
+import unittest
+
+import lsst.utils.tests
+
+from lsst.daf.butler import StorageClassFactory, DatastoreConfig
+from lsst.daf.butler.datastores.chainedDatastore import ChainedDatastore
+
+from datasetsHelper import DatasetTestHelper
+from examplePythonTypes import MetricsExample
+
+from dummyRegistry import DummyRegistry
+
+
+def makeExampleMetrics():
+    return MetricsExample({"AM1": 5.2, "AM2": 30.6},
+                          {"a": [1, 2, 3],
+                           "b": {"blue": 5, "red": "green"}},
+                          [563, 234, 456.7]
+                          )
+
+
+class ChainedDatastoreTestCase(lsst.utils.tests.TestCase, DatasetTestHelper):
+    """Tests of an in-memory datastore in front of a POSIX datastore."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.testDir = os.path.dirname(__file__)
+        cls.storageClassFactory = StorageClassFactory()
+        cls.configFile = os.path.join(cls.testDir, "config/basic/butler.yaml")
+        cls.storageClassFactory.addFromConfig(cls.configFile)
+
+    def setUp(self):
+        self.registry = DummyRegistry()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.config = DatastoreConfig(self.configFile)
+        self.config["datastore.cls"] = "lsst.daf.butler.datastores.chainedDatastore.ChainedDatastore"
+        self.config["datastore.root"] = self.tmpdir.name
+        self.config["datastore.datastores"] = [
+            {"cls": "lsst.daf.butler.datastores.inMemoryDatastore.InMemoryDatastore"},
+            {"cls": "lsst.daf.butler.datastores.posixDatastore.PosixDatastore"},
+        ]
+        self.sc = self.storageClassFactory.getStorageClass("StructuredData")
+        self.dataUnits = frozenset(("visit", "filter"))
+
+        # Need to keep ID for each datasetRef since we have no butler
+        # for these tests
+        self.id = 1
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def testWriteThrough(self):
+        metrics = makeExampleMetrics()
+        datastore = ChainedDatastore(config=self.config, registry=self.registry)
+        fast, durable = datastore.datastores
+        ref = self.makeDatasetRef("metric", self.dataUnits, self.sc, {"visit": 52, "filter": "V"})
+        datastore.put(metrics, ref)
+        self.assertTrue(fast.exists(ref))
+        self.assertTrue(durable.exists(ref))
+        self.assertIs(datastore.get(ref), metrics)
+        self.assertTrue(datastore.getUri(ref).startswith("mem://"))
+        # Each child has its own storage record
+        self.assertIsNotNone(self.registry.getStorageInfo(ref, fast.name))
+        self.assertIsNotNone(self.registry.getStorageInfo(ref, durable.name))
+
+        # Reads fall back to the durable tier, without promotion by default
+        fast.remove(ref)
+        self.assertEqual(datastore.get(ref), metrics)
+        self.assertFalse(fast.exists(ref))
+        self.assertTrue(datastore.getUri(ref).startswith("file:"))
+
+        datastore.remove(ref)
+        self.assertFalse(datastore.exists(ref))
+        with self.assertRaises(FileNotFoundError):
+            datastore.get(ref)
+        with self.assertRaises(FileNotFoundError):
+            datastore.remove(ref)
+
+    def testWriteBackAndPromotion(self):
+        metrics = makeExampleMetrics()
+        self.config["datastore.putPolicy"] = "writeBack"
+        self.config["datastore.promoteOnRead"] = True
+        datastore = ChainedDatastore(config=self.config, registry=self.registry)
+        fast, durable = datastore.datastores
+        refs = [self.makeDatasetRef("metric", self.dataUnits, self.sc, {"visit": visit, "filter": "V"})
+                for visit in range(5)]
+        for ref in refs:
+            datastore.put(metrics, ref)
+            self.assertTrue(fast.exists(ref))
+        datastore.flush()
+        for ref in refs:
+            self.assertTrue(durable.exists(ref))
+
+        fast.remove(refs[0])
+        self.assertEqual(datastore.get(refs[0]), metrics)
+        self.assertTrue(fast.exists(refs[0]))
+
+        # Children that cannot apply parameters are skipped
+        self.assertEqual(datastore.get(refs[0], parameters={"slice": 1}), metrics)
+
+        # Completed writes are forgotten without a flush, and failed ones
+        # are raised by the next flush
+        def failingPut(inMemoryDataset, ref):
+            raise RuntimeError("Durable tier unavailable")
+
+        durable.put = failingPut
+        ref = self.makeDatasetRef("metric", self.dataUnits, self.sc, {"visit": 10, "filter": "V"})
+        datastore.put(metrics, ref)
+        datastore.put(metrics, refs[1])
+        datastore._executor.submit(lambda: None).result()
+        self.assertEqual(datastore._pending, {})
+        with self.assertRaises(RuntimeError):
+            datastore.flush(ref)
+        with self.assertRaises(RuntimeError):
+            datastore.flush()
+        datastore.flush()
+
+        self.config["datastore.putPolicy"] = "writeAround"
+        with self.assertRaises(ValueError):
+            ChainedDatastore(config=self.config, registry=self.registry)
+
+
+class MemoryTester(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
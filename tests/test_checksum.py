@@ -0,0 +1,79 @@
+# This file is part of daf_butler.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (http://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import hashlib
+import io
+import os
+import tempfile
+import unittest
+
+import lsst.utils.tests
+
+from lsst.daf.butler.core.checksum import HashingWriter, computeChecksum
+
+
+class ChecksumTestCase(lsst.utils.tests.TestCase):
+    """Tests of hash-on-write and file checksums."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "data.bin")
+        self.data = os.urandom(100000)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def testHashingWriter(self):
+        writer = HashingWriter(open(self.path, "wb", buffering=0), "sha256")
+        with io.BufferedWriter(writer, buffer_size=4096) as fd:
+            fd.write(self.data[:10])
+            fd.write(self.data[10:])
+        self.assertTrue(writer.closed)
+        self.assertEqual(writer.size, len(self.data))
+        self.assertEqual(writer.hexdigest(), hashlib.sha256(self.data).hexdigest())
+        with open(self.path, "rb") as fd:
+            self.assertEqual(fd.read(), self.data)
+        with self.assertRaises(NameError):
+            HashingWriter(io.BytesIO(), "nosuchhash")
+
+    def testComputeChecksum(self):
+        with open(self.path, "wb") as fd:
+            fd.write(self.data)
+        expected = hashlib.blake2b(self.data).hexdigest()
+        self.assertEqual(computeChecksum(self.path), expected)
+        self.assertEqual(computeChecksum(self.path, block_size=4096, parallel=True), expected)
+        open(self.path, "wb").close()
+        self.assertEqual(computeChecksum(self.path), hashlib.blake2b().hexdigest())
+        self.assertEqual(computeChecksum(self.path, parallel=True), hashlib.blake2b().hexdigest())
+
+
+class MemoryTester(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
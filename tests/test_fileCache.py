@@ -0,0 +1,113 @@
+# This file is part of daf_butler.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (http://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import hashlib
+import os
+import tempfile
+import time
+import unittest
+
+import lsst.utils.tests
+
+from lsst.daf.butler.core.fileCache import FileCache
+
+
+class FileCacheTestCase(lsst.utils.tests.TestCase):
+    """Tests of the local file cache."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cacheRoot = os.path.join(self.tmpdir.name, "cache")
+        self.sources = []
+        for i in range(4):
+            path = os.path.join(self.tmpdir.name, "file{}.dat".format(i))
+            with open(path, "wb") as fd:
+                fd.write(bytes([i])*1000)
+            self.sources.append(path)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def checksum(self, i):
+        return hashlib.blake2b(bytes([i])*1000).hexdigest()
+
+    def testHitsAndMisses(self):
+        cache = FileCache(self.cacheRoot, checksumAlgorithm="blake2b")
+        path = cache.getPath(1, self.sources[1], size=1000, checksum=self.checksum(1))
+        self.assertEqual(os.path.dirname(path), self.cacheRoot)
+        self.assertTrue(path.endswith(".dat"))
+        self.assertEqual(cache.getPath(1, self.sources[1], size=1000, checksum=self.checksum(1)), path)
+        self.assertEqual(cache.getStats(), {"hits": 1, "misses": 1, "evictions": 0})
+
+        # Copies that do not match are rejected and not kept
+        with self.assertRaises(RuntimeError):
+            cache.getPath(2, self.sources[2], size=999)
+        with self.assertRaises(RuntimeError):
+            cache.getPath(2, self.sources[2], checksum=self.checksum(3))
+        self.assertEqual(os.listdir(self.cacheRoot), [os.path.basename(path)])
+        with self.assertRaises(FileNotFoundError):
+            cache.getPath(5, os.path.join(self.tmpdir.name, "missing.dat"))
+
+    def testEviction(self):
+        cache = FileCache(self.cacheRoot, maxSize=2500)
+        paths = [cache.getPath(i, self.sources[i]) for i in range(2)]
+        # Make the first copy the oldest, then use it again
+        os.utime(paths[0], (time.time() - 100, time.time() - 100))
+        os.utime(paths[1], (time.time() - 50, time.time() - 50))
+        cache.getPath(0, self.sources[0])
+        cache.getPath(2, self.sources[2])
+        self.assertTrue(os.path.exists(paths[0]))
+        self.assertFalse(os.path.exists(paths[1]))
+        self.assertEqual(cache.evictions, 1)
+
+        cache = FileCache(self.cacheRoot, maxAge=10)
+        os.utime(paths[0], (time.time() - 100, time.time() - 100))
+        cache.evict()
+        self.assertFalse(os.path.exists(paths[0]))
+        self.assertEqual(len(os.listdir(self.cacheRoot)), 1)
+
+    def testOversized(self):
+        # Files larger than the cache are read from their source
+        cache = FileCache(self.cacheRoot, maxSize=500)
+        self.assertEqual(cache.getPath(1, self.sources[1], size=1000), self.sources[1])
+        self.assertEqual(cache.getPath(2, self.sources[2]), self.sources[2])
+        self.assertEqual(os.listdir(self.cacheRoot), [])
+        with self.assertRaises(RuntimeError):
+            cache.getPath(1, self.sources[1], size=999)
+        # A new copy is never evicted to make room for itself
+        cache = FileCache(self.cacheRoot, maxSize=1500)
+        paths = [cache.getPath(i, self.sources[i]) for i in range(2)]
+        self.assertFalse(os.path.exists(paths[0]))
+        self.assertTrue(os.path.exists(paths[1]))
+
+
+class MemoryTester(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
@@ -0,0 +1,115 @@
+# This file is part of daf_butler.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (http://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import tempfile
+import unittest
+import unittest.mock
+
+import lsst.utils.tests
+
+from lsst.daf.butler.core.fileTransfer import copyFile, transferFile
+
+
+class FileTransferTestCase(lsst.utils.tests.TestCase):
+    """Tests of file transfer modes."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.data = os.urandom(10000)
+        self.src = self.makeFile("src.bin")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def makeFile(self, name):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, "wb") as fd:
+            fd.write(self.data)
+        return path
+
+    def read(self, path):
+        with open(path, "rb") as fd:
+            return fd.read()
+
+    def testCopyFile(self):
+        dst = os.path.join(self.tmpdir.name, "dst.bin")
+        copyFile(self.src, dst)
+        self.assertEqual(self.read(dst), self.data)
+        with self.assertRaises(FileExistsError):
+            copyFile(self.src, dst)
+        empty = os.path.join(self.tmpdir.name, "empty.bin")
+        open(empty, "wb").close()
+        copyFile(empty, os.path.join(self.tmpdir.name, "empty2.bin"))
+        self.assertEqual(self.read(os.path.join(self.tmpdir.name, "empty2.bin")), b"")
+
+    @unittest.skipUnless(hasattr(os, "copy_file_range"), "copy_file_range not available")
+    def testCopyFileShortKernelCopy(self):
+        # A kernel call copying nothing falls back to the next method
+        dst = os.path.join(self.tmpdir.name, "dst.bin")
+        with unittest.mock.patch("os.copy_file_range", return_value=0):
+            copyFile(self.src, dst)
+        self.assertEqual(self.read(dst), self.data)
+        # One stopping part way is an error, and leaves no partial copy
+        dst = os.path.join(self.tmpdir.name, "dst2.bin")
+        with unittest.mock.patch("os.copy_file_range", side_effect=[100, 0]):
+            with self.assertRaises(OSError):
+                copyFile(self.src, dst)
+        self.assertFalse(os.path.exists(dst))
+        copyFile(self.src, dst)
+        self.assertEqual(self.read(dst), self.data)
+
+    def testTransferModes(self):
+        for mode in ("copy", "hardlink", "symlink", "relsymlink"):
+            dst = os.path.join(self.tmpdir.name, mode, "sub", "dst.bin")
+            transferFile(self.src, dst, mode)
+            self.assertEqual(self.read(dst), self.data)
+            self.assertTrue(os.path.exists(self.src))
+            with self.assertRaises(FileExistsError):
+                transferFile(self.src, dst, mode)
+        self.assertTrue(os.path.samefile(os.path.join(self.tmpdir.name, "hardlink", "sub", "dst.bin"),
+                                         self.src))
+        self.assertEqual(os.readlink(os.path.join(self.tmpdir.name, "relsymlink", "sub", "dst.bin")),
+                         os.path.join(os.path.pardir, os.path.pardir, "src.bin"))
+        self.assertEqual(os.readlink(os.path.join(self.tmpdir.name, "symlink", "sub", "dst.bin")),
+                         os.path.abspath(self.src))
+
+        dst = os.path.join(self.tmpdir.name, "move", "dst.bin")
+        transferFile(self.src, dst, "move")
+        self.assertEqual(self.read(dst), self.data)
+        self.assertFalse(os.path.exists(self.src))
+
+        with self.assertRaises(ValueError):
+            transferFile(dst, self.src, "teleport")
+
+
+class MemoryTester(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
@@ -93,6 +93,46 @@ class FormatterFactoryTestCase(lsst.utils.tests.TestCase):
             self.factory.registerFormatter(storageClassName,
                                            "lsst.daf.butler.formatters.jsonFormatter.JsonFormatter")
 
+    def testSharedInstances(self):
+        """Test that formatter instances and lookups are reused.
+        """
+        yamlTypeName = "lsst.daf.butler.formatters.yamlFormatter.YamlFormatter"
+        jsonTypeName = "lsst.daf.butler.formatters.jsonFormatter.JsonFormatter"
+        self.factory.registerFormatter("SharedClass", yamlTypeName)
+        f = self.factory.getFormatter("SharedClass", "shared")
+        self.assertIs(self.factory.getFormatter("SharedClass", "shared"), f)
+        self.assertIs(formatter.FormatterFactory.getSharedInstance(yamlTypeName), f)
+        other = formatter.FormatterFactory()
+        other.registerFormatter("SharedClass", yamlTypeName)
+        self.assertIs(other.getFormatter("SharedClass"), f)
+
+        # Registering an override replaces the cached lookup
+        self.factory.registerFormatter("shared", jsonTypeName)
+        f = self.factory.getFormatter("SharedClass", "shared")
+        self.assertEqual(f.name(), jsonTypeName)
+
+    def testParameters(self):
+        """Test that formatters can be registered with constructor parameters.
+        """
+        gzipTypeName = "lsst.daf.butler.formatters.jsonFormatter.JsonGzipFormatter"
+        self.factory.registerFormatter("Default", gzipTypeName)
+        self.factory.registerFormatter("Fast", gzipTypeName, {"compresslevel": 1})
+        default = self.factory.getFormatter("Default")
+        fast = self.factory.getFormatter("Fast")
+        self.assertIsNone(default.compresslevel)
+        self.assertEqual(fast.compresslevel, 1)
+        self.assertIsNot(fast, default)
+        self.assertEqual(fast.name(), default.name())
+
+        # A DatasetType override uses its own parameters
+        self.factory.registerFormatter("fastType", gzipTypeName, {"compresslevel": 2})
+        self.assertEqual(self.factory.getFormatter("Fast", "fastType").compresslevel, 2)
+        self.assertIs(self.factory.getFormatter("Fast", "otherType"), fast)
+
+        with self.assertRaises(KeyError):
+            self.factory.registerFormatter("Fast", gzipTypeName, {"compresslevel": 9})
+        self.factory.registerFormatter("Fast", gzipTypeName, {"compresslevel": 1})
+
 
 class MemoryTester(lsst.utils.tests.MemoryTestCase):
     pass
@@ -0,0 +1,167 @@
+# This file is part of daf_butler.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (http://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import gc
+import os
+import unittest
+
+import lsst.utils.tests
+
+from lsst.daf.butler import StorageClassFactory, DatastoreConfig
+from lsst.daf.butler.datastores.inMemoryDatastore import InMemoryDatastore, estimateSize
+
+from datasetsHelper import DatasetTestHelper
+from examplePythonTypes import MetricsExample
+
+from dummyRegistry import DummyRegistry
+
+
+def makeExampleMetrics():
+    return MetricsExample({"AM1": 5.2, "AM2": 30.6},
+                          {"a": [1, 2, 3],
+                           "b": {"blue": 5, "red": "green"}},
+                          [563, 234, 456.7]
+                          )
+
+
+class InMemoryDatastoreTestCase(lsst.utils.tests.TestCase, DatasetTestHelper):
+    """Some basic tests of an in-memory datastore."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.testDir = os.path.dirname(__file__)
+        cls.storageClassFactory = StorageClassFactory()
+        cls.configFile = os.path.join(cls.testDir, "config/basic/butler.yaml")
+        cls.storageClassFactory.addFromConfig(cls.configFile)
+
+    def setUp(self):
+        self.registry = DummyRegistry()
+        self.config = DatastoreConfig(self.configFile)
+        self.config["datastore.cls"] = "lsst.daf.butler.datastores.inMemoryDatastore.InMemoryDatastore"
+
+        # Need to keep ID for each datasetRef since we have no butler
+        # for these tests
+        self.id = 1
+
+    def testConstructor(self):
+        datastore = InMemoryDatastore(config=self.config, registry=self.registry)
+        self.assertIsNotNone(datastore)
+
+    def testBasicPutGet(self):
+        metrics = makeExampleMetrics()
+        datastore = InMemoryDatastore(config=self.config, registry=self.registry)
+        sc = self.storageClassFactory.getStorageClass("StructuredData")
+        dataUnits = frozenset(("visit", "filter"))
+        dataId = {"visit": 52, "filter": "V"}
+        compRef = self.makeDatasetRef("metric.output", dataUnits, sc.components["output"], dataId)
+        ref = self.makeDatasetRef("metric", dataUnits, sc, dataId)
+        ref._components["output"] = compRef
+        datastore.put(metrics, ref)
+
+        self.assertTrue(datastore.exists(ref))
+        self.assertIs(datastore.get(ref), metrics)
+        self.assertEqual(datastore.getUri(ref)[:6], "mem://")
+
+        # Components are extracted from the stored Dataset
+        self.assertTrue(datastore.exists(compRef))
+        self.assertEqual(datastore.get(compRef), metrics.output)
+
+        with self.assertRaises(ValueError):
+            datastore.put([1, 2, 3], ref)
+
+        # Removing the Dataset removes its components
+        datastore.remove(ref)
+        self.assertFalse(datastore.exists(ref))
+        self.assertFalse(datastore.exists(compRef))
+        with self.assertRaises(FileNotFoundError):
+            datastore.get(compRef)
+        with self.assertRaises(FileNotFoundError):
+            datastore.remove(ref)
+        with self.assertRaises(FileNotFoundError):
+            datastore.getUri(ref)
+        self.assertTrue(datastore.getUri(ref, predict=True).endswith("#predicted"))
+
+    def testEviction(self):
+        # Room for three Datasets
+        self.config["datastore.maxSize"] = 3*estimateSize(list(range(100)))
+        datastore = InMemoryDatastore(config=self.config, registry=self.registry)
+        sc = self.storageClassFactory.getStorageClass("StructuredDataListYaml")
+        dataUnits = frozenset(("visit", "filter"))
+        refs = []
+        for visit in range(3):
+            ref = self.makeDatasetRef("metric", dataUnits, sc, {"visit": visit, "filter": "V"})
+            datastore.put(list(range(100)), ref)
+            refs.append(ref)
+        self.assertTrue(all(datastore.exists(ref) for ref in refs))
+        # Reading the first Dataset makes the second the least recently used
+        datastore.get(refs[0])
+        ref = self.makeDatasetRef("metric", dataUnits, sc, {"visit": 3, "filter": "V"})
+        datastore.put(list(range(100)), ref)
+        self.assertTrue(datastore.exists(refs[0]))
+        self.assertFalse(datastore.exists(refs[1]))
+        self.assertTrue(datastore.exists(ref))
+        with self.assertRaises(KeyError):
+            self.registry.getStorageInfo(refs[1], datastore.name)
+        # Storing a Dataset again replaces its size
+        size = datastore.size
+        datastore.put(list(range(100)), ref)
+        self.assertEqual(datastore.size, size)
+        self.assertTrue(datastore.exists(refs[2]))
+
+    def testParameters(self):
+        datastore = InMemoryDatastore(config=self.config, registry=self.registry)
+        sc = self.storageClassFactory.getStorageClass("StructuredDataListYaml")
+        ref = self.makeDatasetRef("metric", frozenset(("visit", "filter")), sc, {"visit": 1, "filter": "V"})
+        # Missing Datasets are reported as such, so that other Datastores
+        # may be tried
+        with self.assertRaises(FileNotFoundError):
+            datastore.get(ref, parameters={"slice": 1})
+        datastore.put([1, 2, 3], ref)
+        with self.assertRaises(ValueError):
+            datastore.get(ref, parameters={"slice": 1})
+
+    def testStorageInfoCleanup(self):
+        self.config["datastore.name"] = "scratch"
+        datastore = InMemoryDatastore(config=self.config, registry=self.registry)
+        self.assertEqual(datastore.name, "scratch")
+        sc = self.storageClassFactory.getStorageClass("StructuredDataListYaml")
+        ref = self.makeDatasetRef("metric", frozenset(("visit", "filter")), sc, {"visit": 1, "filter": "V"})
+        datastore.put([1, 2, 3], ref)
+        self.assertIsNotNone(self.registry.getStorageInfo(ref, "scratch"))
+        # Storage information does not outlive the Datastore
+        del datastore
+        gc.collect()
+        with self.assertRaises(KeyError):
+            self.registry.getStorageInfo(ref, "scratch")
+
+
+class MemoryTester(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
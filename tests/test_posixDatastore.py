@@ -19,13 +19,19 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import gzip
+import io
 import os
+import tempfile
 import unittest
 
+import yaml
+
 import lsst.utils.tests
 
 from lsst.daf.butler import StorageClassFactory
 from lsst.daf.butler.datastores.posixDatastore import PosixDatastore, DatastoreConfig
+from lsst.daf.butler.formatters.fileFormatter import openCompressed
 
 from datasetsHelper import DatasetTestHelper
 from examplePythonTypes import MetricsExample
@@ -154,6 +160,306 @@ class PosixDatastoreTestCase(lsst.utils.tests.TestCase, DatasetTestHelper):
             metricsOut = sc.assembler().assemble(compsRead)
             self.assertEqual(metrics, metricsOut)
 
+    def testGetManyPutMany(self):
+        datastore = PosixDatastore(config=self.configFile, registry=self.registry)
+        sc = self.storageClassFactory.getStorageClass("StructuredData")
+        dataUnits = frozenset(("visit", "filter"))
+        items = []
+        for visit in range(10):
+            metrics = makeExampleMetrics()
+            metrics.summary["visit"] = visit
+            items.append((metrics, self.makeDatasetRef("metric", dataUnits, sc,
+                                                       {"visit": 5000 + visit, "filter": "V"})))
+        # The wrong type is reported for its item only
+        badRef = self.makeDatasetRef("metric", dataUnits, sc, {"visit": 4999, "filter": "V"})
+        items.insert(3, ([1, 2, 3], badRef))
+        errors = datastore.putMany(items)
+        self.assertIsInstance(errors[3], ValueError)
+        self.assertEqual(errors[:3] + errors[4:], [None]*10)
+        for metrics, ref in items[:3] + items[4:]:
+            self.assertTrue(datastore.exists(ref))
+
+        missingRef = self.makeDatasetRef("metric", dataUnits, sc, {"visit": 4998, "filter": "V"}, id=20000)
+        refs = [ref for _, ref in items[:3]] + [missingRef] + [ref for _, ref in items[4:]]
+        results = datastore.getMany(refs)
+        self.assertIsInstance(results[3], FileNotFoundError)
+        self.assertEqual(results[:3] + results[4:], [metrics for metrics, _ in items[:3] + items[4:]])
+
+        # A failure to record the Datasets is reported for every item, and
+        # leaves no file behind
+        def failingSetMany(records):
+            raise RuntimeError("Records unavailable")
+
+        datastore.records.setMany = failingSetMany
+        refs = [self.makeDatasetRef("metric", dataUnits, sc, {"visit": 5100 + visit, "filter": "V"})
+                for visit in range(3)]
+        errors = datastore.putMany([(makeExampleMetrics(), ref) for ref in refs])
+        self.assertEqual([type(err) for err in errors], [RuntimeError]*3)
+        for ref in refs:
+            self.assertFalse(datastore.exists(ref))
+            path = datastore.templates.getTemplate("metric").format(ref) + ".yaml"
+            self.assertFalse(os.path.exists(datastore.locationFactory.fromPath(path).path))
+
+    def testRecordCache(self):
+        metrics = makeExampleMetrics()
+        datastore = PosixDatastore(config=self.configFile, registry=self.registry)
+        sc = self.storageClassFactory.getStorageClass("StructuredData")
+        ref = self.makeDatasetRef("metric", frozenset(("visit", "filter")), sc, {"visit": 639, "filter": "U"})
+        datastore.put(metrics, ref)
+        info = datastore.getStoredFileInfo(ref)
+        self.assertIsNotNone(info.checksum)
+        self.assertEqual(info.size, os.stat(datastore.locationFactory.fromPath(info.path).path).st_size)
+
+        # Get is served from the cache, without the records
+        records, datastore.records = datastore.records, {}
+        self.assertEqual(datastore.get(ref), metrics)
+        datastore.records = records
+
+        # Without the cache the record is read, and the recorded size checked
+        datastore._recordCache.clear()
+        with open(datastore.locationFactory.fromPath(info.path).path, "a") as fd:
+            fd.write("\n")
+        with self.assertRaises(RuntimeError):
+            datastore.get(ref)
+        self.assertIs(datastore.getStoredFileInfo(ref), datastore.getStoredFileInfo(ref))
+
+    def testChecksum(self):
+        metrics = makeExampleMetrics()
+        datastore = PosixDatastore(config=self.configFile, registry=self.registry)
+        dataUnits = frozenset(("visit", "filter"))
+        # Checksums computed while writing match the files
+        for visit, name in enumerate(("StructuredData", "StructuredDataJson", "StructuredDataPickle")):
+            sc = self.storageClassFactory.getStorageClass(name)
+            ref = self.makeDatasetRef("metric", dataUnits, sc, {"visit": 700 + visit, "filter": "U"})
+            datastore.put(metrics, ref)
+            info = datastore.getStoredFileInfo(ref)
+            path = datastore.locationFactory.fromPath(info.path).path
+            self.assertEqual(info.checksum, datastore.computeChecksum(path))
+            self.assertEqual(self.registry.getStorageInfo(ref, datastore.name).checksum, info.checksum)
+
+        config = DatastoreConfig(self.configFile)
+        config["datastore.checksum"] = "none"
+        datastore = PosixDatastore(config=config, registry=self.registry)
+        ref = self.makeDatasetRef("metric", dataUnits, sc, {"visit": 710, "filter": "U"})
+        datastore.put(metrics, ref)
+        self.assertIsNone(datastore.getStoredFileInfo(ref).checksum)
+        self.assertEqual(datastore.get(ref), metrics)
+
+    def testCompressedFormatters(self):
+        metrics = makeExampleMetrics()
+        dataUnits = frozenset(("visit", "filter"))
+        sc = self.storageClassFactory.getStorageClass("StructuredData")
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for visit, name in enumerate(("json.JsonGzipFormatter", "json.JsonBz2Formatter",
+                                          "yaml.YamlLzmaFormatter", "pickle.PickleGzipFormatter")):
+                module, cls = name.split(".")
+                config = DatastoreConfig(self.configFile)
+                config["datastore.root"] = os.path.join(tmpdir, cls)
+                config["datastore.formatters.StructuredData"] = \
+                    "lsst.daf.butler.formatters.{}Formatter.{}".format(module, cls)
+                datastore = PosixDatastore(config=config, registry=self.registry)
+                ref = self.makeDatasetRef("metric", dataUnits, sc, {"visit": 900 + visit, "filter": "U"})
+                datastore.put(metrics, ref)
+                self.assertEqual(datastore.get(ref), metrics)
+                compRef = self.makeDatasetRef(ref.datasetType.componentTypeName("output"), dataUnits,
+                                              sc.components["output"], ref.dataId, id=ref.id)
+                self.assertEqual(datastore.get(compRef), metrics.output)
+
+                # The file is compressed, and its checksum is that of the
+                # compressed bytes
+                info = datastore.getStoredFileInfo(ref)
+                path = datastore.locationFactory.fromPath(info.path).path
+                formatter = datastore.formatterFactory.getFormatter(sc)
+                self.assertTrue(path.endswith(formatter.extension))
+                with open(path, "rb") as fd:
+                    with self.assertRaises(UnicodeDecodeError):
+                        fd.read().decode()
+                self.assertEqual(info.checksum, datastore.computeChecksum(path))
+
+                # The same content always gives the same file
+                datastore.put(metrics, ref)
+                self.assertEqual(datastore.getStoredFileInfo(ref).checksum, info.checksum)
+
+            # The level is set in the configuration, and ingested files keep
+            # the whole extension of the formatter
+            config = DatastoreConfig(self.configFile)
+            config["datastore.root"] = os.path.join(tmpdir, "level")
+            config["datastore.formatters.StructuredData"] = {
+                "formatter": "lsst.daf.butler.formatters.jsonFormatter.JsonGzipFormatter",
+                "compresslevel": 1}
+            datastore = PosixDatastore(config=config, registry=self.registry)
+            self.assertEqual(datastore.formatterFactory.getFormatter(sc).compresslevel, 1)
+            ref = self.makeDatasetRef("metric", dataUnits, sc, {"visit": 910, "filter": "U"})
+            datastore.put(metrics, ref)
+            path = datastore.locationFactory.fromPath(datastore.getStoredFileInfo(ref).path).path
+            with open(path, "rb") as fd:
+                compressed = fd.read()
+            buffer = io.BytesIO()
+            with openCompressed(buffer, "gzip", "wb", level=1) as fd:
+                fd.write(gzip.decompress(compressed))
+            self.assertEqual(buffer.getvalue(), compressed)
+            ingested = self.makeDatasetRef("metric", dataUnits, sc, {"visit": 911, "filter": "U"})
+            datastore.ingest(path, ingested, transfer="copy")
+            self.assertTrue(datastore.getUri(ingested).endswith(".json.gz"))
+            self.assertEqual(datastore.get(ingested), metrics)
+
+    def testShardedTemplate(self):
+        metrics = makeExampleMetrics()
+        dataUnits = frozenset(("visit", "filter"))
+        sc = self.storageClassFactory.getStorageClass("StructuredData")
+        with tempfile.TemporaryDirectory() as tmpdir:
+            config = DatastoreConfig(self.configFile)
+            config["datastore.root"] = tmpdir
+            config["datastore.templates.metric"] = "{datasetType}/{idshard:2}/v{visit:08d}_f{filter}"
+            datastore = PosixDatastore(config=config, registry=self.registry)
+            refs = [self.makeDatasetRef("metric", dataUnits, sc, {"visit": 1000 + visit, "filter": "U"})
+                    for visit in range(10)]
+            datastore.putMany([(metrics, ref) for ref in refs])
+            for ref in refs:
+                path = datastore.getStoredFileInfo(ref).path
+                self.assertRegex(path, r"^metric/[0-9a-f]{2}/[0-9a-f]{2}/v0000\d{4}_fU\.yaml$")
+                self.assertIn(os.path.dirname(datastore.locationFactory.fromPath(path).path),
+                              datastore._directories)
+                self.assertEqual(datastore.get(ref), metrics)
+
+            # A directory removed behind the datastore's back is created again
+            path = datastore.locationFactory.fromPath(datastore.getStoredFileInfo(refs[0]).path).path
+            os.remove(path)
+            os.rmdir(os.path.dirname(path))
+            datastore.put(metrics, refs[0])
+            self.assertEqual(datastore.get(refs[0]), metrics)
+
+    def testDeduplicate(self):
+        metrics = makeExampleMetrics()
+        other = MetricsExample({"AM1": 1.0}, {"a": [4]}, [1, 2])
+        dataUnits = frozenset(("visit", "filter"))
+        sc = self.storageClassFactory.getStorageClass("StructuredData")
+        with tempfile.TemporaryDirectory() as tmpdir:
+            config = DatastoreConfig(self.configFile)
+            config["datastore.root"] = os.path.join(tmpdir, "repo")
+            config["datastore.deduplicate"] = True
+            datastore = PosixDatastore(config=config, registry=self.registry)
+            refs = [self.makeDatasetRef("metric", dataUnits, sc, {"visit": 1100 + visit, "filter": "U"})
+                    for visit in range(4)]
+            datastore.putMany([(metrics, ref) for ref in refs[:3]] + [(other, refs[3])])
+
+            def ospath(ref):
+                return datastore.locationFactory.fromPath(datastore.getStoredFileInfo(ref).path).path
+
+            # Each Dataset has its own file, named by the template
+            self.assertEqual(datastore.getStoredFileInfo(refs[0]).path, "metric/metric_v00001100_fU.yaml")
+            self.assertEqual(len(set(datastore.getStoredFileInfo(ref).path for ref in refs)), 4)
+
+            # Identical files share their content
+            self.assertTrue(os.path.samefile(ospath(refs[0]), ospath(refs[1])))
+            self.assertTrue(os.path.samefile(ospath(refs[0]), ospath(refs[2])))
+            self.assertFalse(os.path.samefile(ospath(refs[0]), ospath(refs[3])))
+            self.assertEqual(os.stat(ospath(refs[0])).st_nlink, 4)
+
+            # Writing a Dataset again does not change the others
+            datastore.put(other, refs[2])
+            self.assertEqual(datastore.get(refs[2]), other)
+            self.assertEqual(datastore.get(refs[1]), metrics)
+            self.assertTrue(os.path.samefile(ospath(refs[2]), ospath(refs[3])))
+
+            # An ingested copy is linked too
+            path = os.path.join(tmpdir, "copy.yaml")
+            with open(ospath(refs[0]), "rb") as src, open(path, "wb") as dst:
+                dst.write(src.read())
+            ingested = self.makeDatasetRef("metric", dataUnits, sc, {"visit": 1110, "filter": "U"})
+            datastore.ingest(path, ingested, transfer="copy")
+            self.assertTrue(os.path.samefile(ospath(ingested), ospath(refs[0])))
+
+            # A file hard linked outside the store does not become an object
+            path = os.path.join(tmpdir, "outside.yaml")
+            with open(path, "w") as fd:
+                fd.write("not shared with any other Dataset")
+            outside = self.makeDatasetRef("metric", dataUnits, sc, {"visit": 1111, "filter": "U"})
+            datastore.ingest(path, outside, transfer="hardlink")
+            self.assertTrue(os.path.samefile(ospath(outside), path))
+            self.assertEqual(os.stat(path).st_nlink, 2)
+            datastore.remove(outside)
+            self.assertEqual(os.stat(path).st_nlink, 1)
+
+            # Transferring over a Dataset frees the content object of its old
+            # file
+            inputConfig = DatastoreConfig(self.configFile)
+            inputConfig["datastore.root"] = os.path.join(tmpdir, "input")
+            inputConfig["datastore.records.table"] = "InputRecords"
+            inputDatastore = PosixDatastore(config=inputConfig, registry=self.registry)
+            lone = self.makeDatasetRef("metric", dataUnits, sc, {"visit": 1112, "filter": "U"})
+            datastore.put(MetricsExample({"AM1": 2.0}, {"a": [5]}, [3]), lone)
+            loneObject = datastore._objectPath(datastore.getStoredFileInfo(lone).checksum)
+            self.assertEqual(os.stat(loneObject).st_nlink, 2)
+            inputDatastore.put(metrics, lone)
+            self.assertEqual(datastore.transferMany(inputDatastore, [lone], transfer="copy"), [None])
+            self.assertFalse(os.path.exists(loneObject))
+            self.assertEqual(datastore.get(lone), metrics)
+            self.assertTrue(os.path.samefile(ospath(lone), ospath(refs[0])))
+            datastore.remove(lone)
+
+            # Content objects are removed with their last file
+            objectsDir = os.path.join(datastore.root, ".objects")
+            datastore.remove(refs[0])
+            self.assertEqual(datastore.get(refs[1]), metrics)
+            self.assertEqual(datastore.removeMany([refs[1], ingested]), [None, None])
+            datastore.removeMany(refs[2:])
+            self.assertEqual([files for _, _, files in os.walk(objectsDir) if files], [])
+
+        config = DatastoreConfig(self.configFile)
+        config["datastore.deduplicate"] = True
+        config["datastore.checksum"] = "none"
+        with self.assertRaises(ValueError):
+            PosixDatastore(config=config, registry=self.registry)
+
+    def testIngestTransfer(self):
+        sc = self.storageClassFactory.getStorageClass("StructuredDataDictYaml")
+        dataUnits = frozenset(("visit", "filter"))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            config = DatastoreConfig(self.configFile)
+            config["datastore.root"] = os.path.join(tmpdir, "repo")
+            datastore = PosixDatastore(config=config, registry=self.registry)
+            items = []
+            for visit, mode in enumerate(("copy", "move", "hardlink", "symlink", "relsymlink")):
+                path = os.path.join(tmpdir, "{}.yaml".format(mode))
+                with open(path, "w") as fd:
+                    yaml.dump({"visit": visit, "mode": mode}, fd)
+                ref = self.makeDatasetRef("metric", dataUnits, sc, {"visit": 800 + visit, "filter": "U"})
+                datastore.ingest(path, ref, transfer=mode)
+                self.assertEqual(datastore.get(ref), {"visit": visit, "mode": mode})
+                self.assertEqual(os.path.exists(path), mode != "move")
+                self.assertTrue(datastore.getUri(ref).endswith(".yaml"))
+                items.append((path, ref))
+
+            # Bulk ingest reports failures per item
+            path = os.path.join(tmpdir, "bulk.yaml")
+            with open(path, "w") as fd:
+                yaml.dump({"bulk": True}, fd)
+            ref = self.makeDatasetRef("metric", dataUnits, sc, {"visit": 810, "filter": "U"})
+            errors = datastore.ingestMany([(path, ref), items[0]], transfer="copy")
+            self.assertIsNone(errors[0])
+            self.assertIsInstance(errors[1], FileExistsError)
+            self.assertEqual(datastore.get(ref), {"bulk": True})
+
+            with self.assertRaises(ValueError):
+                datastore.ingest(path, ref, transfer="teleport")
+
+    def testFileCache(self):
+        metrics = makeExampleMetrics()
+        sc = self.storageClassFactory.getStorageClass("StructuredData")
+        with tempfile.TemporaryDirectory() as tmpdir:
+            config = DatastoreConfig(self.configFile)
+            config["datastore.root"] = os.path.join(tmpdir, "repo")
+            config["datastore.cache.root"] = os.path.join(tmpdir, "cache")
+            datastore = PosixDatastore(config=config, registry=self.registry)
+            ref = self.makeDatasetRef("metric", frozenset(("visit", "filter")), sc,
+                                      {"visit": 900, "filter": "U"})
+            datastore.put(metrics, ref)
+            self.assertEqual(datastore.get(ref), metrics)
+            self.assertEqual(datastore.get(ref), metrics)
+            self.assertEqual(datastore.cache.getStats(), {"hits": 1, "misses": 1, "evictions": 0})
+            self.assertEqual(len(os.listdir(os.path.join(tmpdir, "cache"))), 1)
+
     def testRemove(self):
         metrics = makeExampleMetrics()
         datastore = PosixDatastore(config=self.configFile, registry=self.registry)
@@ -188,6 +494,35 @@ class PosixDatastoreTestCase(lsst.utils.tests.TestCase, DatasetTestHelper):
         with self.assertRaises(FileNotFoundError):
             datastore.remove(ref)
 
+    def testRemoveMany(self):
+        metrics = makeExampleMetrics()
+        sc = self.storageClassFactory.getStorageClass("StructuredData")
+        dataUnits = frozenset(("visit", "filter"))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            config = DatastoreConfig(self.configFile)
+            config["datastore.root"] = tmpdir
+            datastore = PosixDatastore(config=config, registry=self.registry)
+            refs = [self.makeDatasetRef("metric", dataUnits, sc, {"visit": visit, "filter": "U"})
+                    for visit in range(4)]
+            datastore.putMany([(metrics, ref) for ref in refs])
+            os.remove(datastore.locationFactory.fromPath(datastore.getStoredFileInfo(refs[1]).path).path)
+            unknownRef = self.makeDatasetRef("metric", dataUnits, sc, {"visit": 9, "filter": "U"}, id=30000)
+
+            errors = datastore.removeMany([refs[0], refs[1], refs[2], unknownRef])
+            self.assertIsNone(errors[0])
+            self.assertIsInstance(errors[1], FileNotFoundError)
+            self.assertIsNone(errors[2])
+            self.assertIsInstance(errors[3], FileNotFoundError)
+            self.assertEqual([datastore.exists(ref) for ref in refs], [False, False, False, True])
+            self.assertEqual(len(datastore.records), 2)
+            with self.assertRaises(KeyError):
+                self.registry.getStorageInfo(refs[0], datastore.name)
+
+            # Records of missing files can be removed if configured
+            datastore.ignoreMissingOnRemove = True
+            self.assertEqual(datastore.removeMany([refs[1], refs[3]]), [None, None])
+            self.assertEqual(len(datastore.records), 0)
+
     def testTransfer(self):
         metrics = makeExampleMetrics()
 
@@ -211,6 +546,49 @@ class PosixDatastoreTestCase(lsst.utils.tests.TestCase, DatasetTestHelper):
         metricsOut = outputPosixDatastore.get(ref)
         self.assertEqual(metrics, metricsOut)
 
+    def testTransferMany(self):
+        metrics = makeExampleMetrics()
+        dataUnits = frozenset(("visit", "filter"))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            inputConfig = DatastoreConfig(self.configFile)
+            inputConfig["datastore.root"] = os.path.join(tmpdir, "input")
+            inputDatastore = PosixDatastore(config=inputConfig, registry=self.registry)
+            outputConfig = DatastoreConfig(self.configFile)
+            outputConfig["datastore.root"] = os.path.join(tmpdir, "output")
+            outputConfig["datastore.records.table"] = "OutputRecords"
+            outputConfig["datastore.formatters.StructuredDataJson"] = \
+                "lsst.daf.butler.formatters.pickleFormatter.PickleFormatter"
+            outputDatastore = PosixDatastore(config=outputConfig, registry=self.registry)
+
+            sameRef = self.makeDatasetRef("metric", dataUnits,
+                                          self.storageClassFactory.getStorageClass("StructuredData"),
+                                          {"visit": 1, "filter": "U"})
+            convertedRef = self.makeDatasetRef("metric", dataUnits,
+                                               self.storageClassFactory.getStorageClass("StructuredDataJson"),
+                                               {"visit": 2, "filter": "U"})
+            missingRef = self.makeDatasetRef("metric", dataUnits,
+                                             self.storageClassFactory.getStorageClass("StructuredData"),
+                                             {"visit": 3, "filter": "U"})
+            inputDatastore.putMany([(metrics, sameRef), (metrics, convertedRef)])
+
+            errors = outputDatastore.transferMany(inputDatastore, [sameRef, convertedRef, missingRef],
+                                                  transfer="hardlink")
+            self.assertEqual(errors[:2], [None, None])
+            self.assertIsInstance(errors[2], FileNotFoundError)
+            for ref in (sameRef, convertedRef):
+                self.assertEqual(outputDatastore.get(ref), metrics)
+
+            # The file in the same format is linked, with its checksum
+            inputInfo = inputDatastore.getStoredFileInfo(sameRef)
+            outputInfo = outputDatastore.getStoredFileInfo(sameRef)
+            self.assertTrue(os.path.samefile(inputDatastore.locationFactory.fromPath(inputInfo.path).path,
+                                             outputDatastore.locationFactory.fromPath(outputInfo.path).path))
+            self.assertEqual(outputInfo.checksum, inputInfo.checksum)
+            self.assertEqual(self.registry.getStorageInfo(sameRef, outputDatastore.name).size, inputInfo.size)
+
+            # The other is written again in the output format
+            self.assertTrue(outputDatastore.getUri(convertedRef).endswith(".pickle"))
+
 
 class MemoryTester(lsst.utils.tests.MemoryTestCase):
     pass
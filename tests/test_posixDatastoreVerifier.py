@@ -0,0 +1,144 @@
+# This file is part of daf_butler.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (http://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import json
+import os
+import tempfile
+import unittest
+
+import lsst.utils.tests
+
+from lsst.daf.butler import StorageClassFactory
+from lsst.daf.butler.datastores.posixDatastore import PosixDatastore, DatastoreConfig
+from lsst.daf.butler.datastores.posixDatastoreVerifier import verifyDatastore
+
+from datasetsHelper import DatasetTestHelper
+from examplePythonTypes import MetricsExample
+
+from dummyRegistry import DummyRegistry
+
+
+class PosixDatastoreVerifierTestCase(lsst.utils.tests.TestCase, DatasetTestHelper):
+    """Tests of the offline verification of a POSIX datastore."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.testDir = os.path.dirname(__file__)
+        cls.storageClassFactory = StorageClassFactory()
+        cls.configFile = os.path.join(cls.testDir, "config/basic/butler.yaml")
+        cls.storageClassFactory.addFromConfig(cls.configFile)
+
+    def setUp(self):
+        self.registry = DummyRegistry()
+        self.id = 1
+        self.tmpdir = tempfile.TemporaryDirectory()
+        config = DatastoreConfig(self.configFile)
+        config["datastore.root"] = os.path.join(self.tmpdir.name, "repo")
+        self.datastore = PosixDatastore(config=config, registry=self.registry)
+        sc = self.storageClassFactory.getStorageClass("StructuredData")
+        self.refs = []
+        for visit in range(6):
+            metrics = MetricsExample({"visit": visit}, {}, [visit])
+            ref = self.makeDatasetRef("metric", frozenset(("visit", "filter")), sc,
+                                      {"visit": visit, "filter": "U"})
+            self.datastore.put(metrics, ref)
+            self.refs.append(ref)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def getPath(self, ref):
+        return self.datastore.locationFactory.fromPath(self.datastore.getStoredFileInfo(ref).path).path
+
+    def testVerify(self):
+        self.assertEqual(verifyDatastore(self.datastore, processes=0), [])
+
+        os.remove(self.getPath(self.refs[1]))
+        with open(self.getPath(self.refs[3]), "a") as fd:
+            fd.write("\n")
+        with open(self.getPath(self.refs[4]), "r+") as fd:
+            content = fd.read()
+            fd.seek(0)
+            fd.write(content.replace("4", "5"))
+
+        checkpoint = os.path.join(self.tmpdir.name, "checkpoint.json")
+        report = os.path.join(self.tmpdir.name, "report.jsonl")
+        problems = verifyDatastore(self.datastore, checkpoint=checkpoint, report=report, batchSize=2,
+                                   processes=2, maxBytesPerSecond=10**9)
+        self.assertEqual([(p.datasetId, p.kind) for p in problems],
+                         [(self.refs[1].id, "missing"), (self.refs[3].id, "size"),
+                          (self.refs[4].id, "checksum")])
+        with open(report) as fd:
+            self.assertEqual([json.loads(line)["kind"] for line in fd], ["missing", "size", "checksum"])
+
+        # The checkpoint records that everything was checked
+        self.assertEqual(verifyDatastore(self.datastore, checkpoint=checkpoint, processes=0), [])
+
+    def testResume(self):
+        os.remove(self.getPath(self.refs[4]))
+        checkpoint = os.path.join(self.tmpdir.name, "checkpoint.json")
+        with open(checkpoint, "w") as fd:
+            json.dump({"lastDatasetId": self.refs[2].id}, fd)
+        os.remove(self.getPath(self.refs[0]))
+        problems = verifyDatastore(self.datastore, checkpoint=checkpoint, processes=0)
+        self.assertEqual([p.datasetId for p in problems], [self.refs[4].id])
+
+
+    def testLegacyRecords(self):
+        """Test that records without size and checksum are checked against
+        the registry.
+        """
+        ref = self.refs[2]
+        record = self.datastore.records[ref.id]
+        self.datastore.records[ref.id] = record._replace(checksum=None, size=None)
+        self.assertEqual(verifyDatastore(self.datastore, processes=0), [])
+        with open(self.getPath(ref), "r+") as fd:
+            content = fd.read()
+            fd.seek(0)
+            fd.write(content.replace("2", "3"))
+        problems = verifyDatastore(self.datastore, processes=0)
+        self.assertEqual([(p.datasetId, p.kind) for p in problems], [(ref.id, "checksum")])
+
+    def testAlgorithm(self):
+        """Test that checksums are only compared with the algorithm that
+        computed them.
+        """
+        algorithm = self.datastore.checksumAlgorithm
+        self.datastore.checksumAlgorithm = None
+        with self.assertRaises(ValueError):
+            verifyDatastore(self.datastore, processes=0)
+        self.assertEqual(verifyDatastore(self.datastore, processes=0, algorithm=algorithm), [])
+        with self.assertRaises(ValueError):
+            verifyDatastore(self.datastore, processes=0, algorithm="md5")
+
+
+class MemoryTester(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
@@ -76,6 +76,8 @@ class SchemaTestCase(lsst.utils.tests.TestCase):
             self.assertColumn(table, columnDescription['name'], columnDescription)
         if "foreignKeys" in tableDescription:
             self.assertForeignKeyConstraints(table, tableDescription["foreignKeys"])
+        if "indexes" in tableDescription:
+            self.assertIndexes(table, tableDescription["indexes"])
 
     def assertColumn(self, table, columnName, columnDescription):
         """Check that a generated column matches its `columnDescription`.
@@ -103,6 +105,13 @@ class SchemaTestCase(lsst.utils.tests.TestCase):
             self.assertIn(src, tableConstraints)
             self.assertEqual(tableConstraints[src], tgt)
 
+    def assertIndexes(self, table, indexesDescription):
+        """Check that indexes match the `indexesDescription`.
+        """
+        tableIndexes = {tuple(column.name for column in index.columns) for index in table.indexes}
+        for indexDescription in indexesDescription:
+            self.assertIn(tuple(iterable(indexDescription)), tableIndexes)
+
 
 class MemoryTester(lsst.utils.tests.MemoryTestCase):
     pass
@@ -129,6 +129,30 @@ class SqlDatabaseDictTestCase(lsst.utils.tests.TestCase):
         with self.assertRaises(TypeError):
             DatabaseDict.fromConfig(self.config, key=self.key, types=self.types, value=value)
 
+    def testGetManySetMany(self):
+        """Test bulk retrieval and assignment."""
+        value = namedtuple("TestValue", ["y", "z"])
+        d = DatabaseDict.fromConfig(self.config, key=self.key, types=self.types, value=value)
+        d[0] = value(y="zero", z=0.0)
+        d.setMany([(0, value(y="nil", z=0.5)), (1, value(y="one", z=0.1)), (2, value(y="two", z=0.2))])
+        self.assertEqual(len(d), 3)
+        self.assertEqual(d[0], value(y="nil", z=0.5))
+        self.assertEqual(d.getMany([1, 2, 3]), {1: value(y="one", z=0.1), 2: value(y="two", z=0.2)})
+        with self.assertRaises(TypeError):
+            d.setMany([(4, value(y=4, z="four"))])
+        d.delMany([0, 2, 5])
+        self.assertEqual(list(d.keys()), [1])
+
+    def testGetBatch(self):
+        """Test retrieval in key order, a batch at a time."""
+        value = namedtuple("TestValue", ["y", "z"])
+        d = DatabaseDict.fromConfig(self.config, key=self.key, types=self.types, value=value)
+        d.setMany([(key, value(y=str(key), z=float(key))) for key in (5, 3, 1, 4, 2)])
+        self.assertEqual(d.getBatch(limit=2), [(1, value(y="1", z=1.0)), (2, value(y="2", z=2.0))])
+        self.assertEqual([key for key, _ in d.getBatch(after=2, limit=2)], [3, 4])
+        self.assertEqual([key for key, _ in d.getBatch(after=4, limit=2)], [5])
+        self.assertEqual(d.getBatch(after=5), [])
+
     def testFromRegistry(self):
         """Test that we can obtain a DatabaseDict from a SqlRegistry."""
         testDir = os.path.dirname(__file__)
@@ -143,6 +167,21 @@ class SqlDatabaseDictTestCase(lsst.utils.tests.TestCase):
                                       value=value)
         self.checkDatabaseDict(d, data)
 
+    def testAddedFields(self):
+        """Test that fields added to the value are added to an existing
+        table."""
+        testDir = os.path.dirname(__file__)
+        registry = Registry.fromConfig(os.path.join(testDir, "config/basic/butler.yaml"))
+        oldValue = namedtuple("TestValue", ["y"])
+        d = registry.makeDatabaseDict(table="TestMigratedTable", key=self.key,
+                                      types={"x": int, "y": str}, value=oldValue)
+        d[0] = oldValue(y="zero")
+        value = namedtuple("TestValue", ["y", "z"])
+        d = registry.makeDatabaseDict(table="TestMigratedTable", key=self.key, types=self.types, value=value)
+        self.assertEqual(d[0], value(y="zero", z=None))
+        d[1] = value(y="one", z=0.1)
+        self.assertEqual(d[1], value(y="one", z=0.1))
+
 
 class MemoryTester(lsst.utils.tests.MemoryTestCase):
     pass
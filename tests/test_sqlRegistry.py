@@ -20,19 +20,27 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import os
+import tempfile
 import unittest
+import unittest.mock
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
+from sqlalchemy import text
+
 import lsst.utils.tests
 
 from lsst.daf.butler.core.storageInfo import StorageInfo
 from lsst.daf.butler.core.execution import Execution
 from lsst.daf.butler.core.quantum import Quantum
 from lsst.daf.butler.core.run import Run
-from lsst.daf.butler.core.datasets import DatasetType
+from lsst.daf.butler.core.datasets import DatasetType, DatasetRef
 from lsst.daf.butler.core.registry import Registry
 from lsst.daf.butler.registries.sqlRegistry import SqlRegistry
+from lsst.daf.butler.registries.snapshot import makeSnapshot, mergeSnapshot
 from lsst.daf.butler.core.storageClass import StorageClass
+from lsst.daf.butler.core.config import Config
 
 """Tests for SqlRegistry.
 """
@@ -198,6 +206,13 @@ class SqlRegistryTestCase(lsst.utils.tests.TestCase):
         outStorageInfo = registry.getStorageInfo(ref, datastoreName)
         self.assertNotEqual(outStorageInfo, storageInfo)
         self.assertEqual(outStorageInfo, updatedStorageInfo)
+        # Test bulk removal, which leaves other datastores alone
+        otherStorageInfo = StorageInfo("otherstore", checksum, size)
+        registry.addStorageInfo(ref, otherStorageInfo)
+        registry.removeStorageInfoMany(datastoreName, [ref])
+        with self.assertRaises(KeyError):
+            registry.getStorageInfo(ref, datastoreName)
+        self.assertEqual(registry.getStorageInfo(ref, "otherstore"), otherStorageInfo)
 
     def testAssembler(self):
         registry = Registry.fromConfig(self.configFile)
@@ -273,6 +288,418 @@ class SqlRegistryTestCase(lsst.utils.tests.TestCase):
         outputRef = registry.find(newCollection, datasetType, dataId2)
         self.assertEqual(outputRef, inputRef2)
 
+    def testValidityRange(self):
+        registry = Registry.fromConfig(self.configFile)
+        storageClass = StorageClass("testValidityRange")
+        datasetType = DatasetType(name="bias", dataUnits=("Camera", "ExposureRange"),
+                                  storageClass=storageClass)
+        registry.registerDatasetType(datasetType)
+        collection = "calib"
+        run = registry.makeRun(collection=collection)
+        t0 = datetime(2018, 1, 1)
+        day = timedelta(days=1)
+        ref1 = registry.addDataset(datasetType, dataId={"camera": "DummyCam", "valid_first": 0,
+                                                        "valid_last": 100}, run=run)
+        ref2 = registry.addDataset(datasetType, dataId={"camera": "DummyCam", "valid_first": 101,
+                                                        "valid_last": 200}, run=run)
+        ref3 = registry.addDataset(datasetType, dataId={"camera": "MyCam", "valid_first": 0,
+                                                        "valid_last": 200}, run=run)
+        registry.addValidityRange(ref1, "DummyCam", t0, t0 + 10*day)
+        registry.addValidityRange(ref2, "DummyCam", t0 + 10*day)
+        registry.addValidityRange(ref3, "MyCam", t0, t0 + 5*day)
+        self.assertEqual(registry.getValidityRange(ref1), ("DummyCam", t0, t0 + 10*day))
+        self.assertEqual(registry.getValidityRange(ref2), ("DummyCam", t0 + 10*day, None))
+        # Empty ranges are not allowed
+        with self.assertRaises(ValueError):
+            registry.addValidityRange(ref3, "MyCam", t0, t0)
+        # Single lookup
+        self.assertEqual(registry.findValid(collection, datasetType, "DummyCam", t0 + day), ref1)
+        self.assertEqual(registry.findValid(collection, datasetType, "MyCam", t0 + day), ref3)
+        self.assertIsNone(registry.findValid(collection, datasetType, "MyCam", t0 + 6*day))
+        self.assertIsNone(registry.findValid(collection, datasetType, "DummyCam", t0 - day))
+        self.assertIsNone(registry.findValid("other", datasetType, "DummyCam", t0 + day))
+        # Batch lookup, end of range is exclusive and open ranges extend forever
+        timestamps = [t0 + 100*day, t0 - day, t0, t0 + 10*day, t0 + 10*day - timedelta(seconds=1)]
+        self.assertEqual(registry.findValidMany(collection, datasetType, "DummyCam", timestamps),
+                         [ref2, None, ref1, ref2, ref1])
+        self.assertEqual(registry.findValidMany(collection, datasetType, "DummyCam", []), [])
+
+    def testBufferedWrites(self):
+        registry = Registry.fromConfig(self.configFile)
+        storageClass = StorageClass("testBufferedWrites")
+        parentDatasetType = DatasetType(name="parent", dataUnits=("Camera", "Visit"),
+                                        storageClass=storageClass)
+        childDatasetType = DatasetType(name="child", dataUnits=("Camera", "Visit"), storageClass=storageClass)
+        registry.registerDatasetType(parentDatasetType)
+        registry.registerDatasetType(childDatasetType)
+        run = registry.makeRun(collection="test")
+        existing = registry.addDataset(parentDatasetType, dataId={"camera": "DummyCam", "visit": 0}, run=run)
+        storageInfo = StorageInfo("dummystore", "d6fb1c0c8f338044b2faaf328f91f707", 512)
+        with registry.bufferedWrites(maxSize=1000):
+            refs = []
+            for visit in range(1, 11):
+                dataId = {"camera": "DummyCam", "visit": visit}
+                parent = registry.addDataset(parentDatasetType, dataId=dataId, run=run)
+                child = registry.addDataset(childDatasetType, dataId=dataId, run=run)
+                registry.attachComponent("child", parent, child)
+                registry.addStorageInfo(parent, storageInfo)
+                refs.append(parent)
+            # Provisional ids are unique and follow existing ones
+            ids = [ref.id for ref in refs]
+            self.assertEqual(len(set(ids)), len(ids))
+            self.assertGreater(min(ids), existing.id)
+            # Nothing has been written yet
+            rowsPerDataset = 2 if registry._schema.datasetLayout == "single" else 3
+            self.assertEqual(registry._insertBuffer.size, 10*(2*rowsPerDataset + 2))
+            # Duplicates are detected against both the buffer and the database
+            with self.assertRaises(ValueError):
+                registry.addDataset(parentDatasetType, dataId={"camera": "DummyCam", "visit": 1}, run=run)
+            with self.assertRaises(ValueError):
+                registry.addDataset(parentDatasetType, dataId={"camera": "DummyCam", "visit": 0}, run=run)
+            # Invalid dataIds are rejected before being queued
+            with self.assertRaises(ValueError):
+                registry.addDataset(parentDatasetType, dataId={"camera": "DummyCam"}, run=run)
+            if registry._schema.datasetLayout == "single":
+                with self.assertRaises(ValueError):
+                    registry.addDataset(parentDatasetType, run=run,
+                                        dataId={"camera": "DummyCam", "visit": 50, "nonsense": 1})
+            self.assertEqual(registry._insertBuffer.size, 10*(2*rowsPerDataset + 2))
+            # Reads see buffered writes
+            outRef = registry.find(run.collection, parentDatasetType, {"camera": "DummyCam", "visit": 1})
+            self.assertEqual(outRef, refs[0])
+            self.assertEqual(outRef.components, refs[0].components)
+            self.assertEqual(registry.getStorageInfo(refs[-1], "dummystore"), storageInfo)
+            self.assertEqual(registry._insertBuffer.size, 0)
+            # Size threshold triggers a flush
+            registry._insertBuffer.maxSize = 4
+            registry.addDataset(parentDatasetType, dataId={"camera": "DummyCam", "visit": 100}, run=run)
+            self.assertEqual(registry._insertBuffer.size, rowsPerDataset)
+            registry.addDataset(parentDatasetType, dataId={"camera": "DummyCam", "visit": 101}, run=run)
+            self.assertEqual(registry._insertBuffer.size, 0)
+            # Explicit flush
+            registry.addDataset(parentDatasetType, dataId={"camera": "DummyCam", "visit": 102}, run=run)
+            registry.flush()
+            self.assertEqual(registry._insertBuffer.size, 0)
+            last = registry.addDataset(parentDatasetType, dataId={"camera": "DummyCam", "visit": 103},
+                                       run=run)
+        # Leaving the context flushes and disables buffering
+        self.assertIsNone(registry._insertBuffer)
+        self.assertEqual(registry.getDataset(last.id), last)
+
+    def testExplain(self):
+        registry = Registry.fromConfig(self.configFile)
+        storageClass = StorageClass("testExplain")
+        datasetType = DatasetType(name="dummytype", dataUnits=("Camera", "Visit"), storageClass=storageClass)
+        registry.registerDatasetType(datasetType)
+        run = registry.makeRun(collection="test")
+        dataId = {"camera": "DummyCam", "visit": 0}
+        ref = registry.addDataset(datasetType, dataId=dataId, run=run)
+        # Statements issued by find can be recorded and explained
+        with registry.recordStatements() as statements:
+            self.assertEqual(registry.find(run.collection, datasetType, dataId), ref)
+        self.assertGreater(len(statements), 0)
+        for statement, parameters in statements:
+            self.assertGreater(len(registry.explain(statement, parameters)), 0)
+        # SQLAlchemy constructs are compiled with their parameters
+        plan = registry.explain(text("SELECT * FROM Dataset WHERE dataset_id = :id").bindparams(id=ref.id))
+        self.assertGreater(len(plan), 0)
+        # Slow-query log explains queries without disturbing the results
+        log = registry._log
+        registry._log = unittest.mock.Mock()
+        registry.slowQueryThreshold = 0.0
+        self.assertEqual(registry.find(run.collection, datasetType, dataId), ref)
+        registry.slowQueryThreshold = None
+        self.assertGreater(registry._log.warn.call_count, 0)
+        message = registry._log.warn.call_args[0][0]
+        self.assertTrue(message.startswith("Slow query"))
+        self.assertIn("plan: [", message)
+        registry._log = log
+        # Failed statements do not disturb the timing of later ones
+        with self.assertRaises(Exception):
+            list(registry.query("SELECT * FROM NoSuchTable"))
+        with registry._engine.connect() as connection:
+            self.assertEqual(connection.info.get("queryStartTime", []), [])
+
+    def testConcurrentAccess(self):
+        self.checkConcurrentAccess(Registry.fromConfig(self.configFile))
+
+    def testConcurrentAccessFile(self):
+        # Unlike an in-memory database, a file is accessed concurrently
+        with tempfile.TemporaryDirectory() as directory:
+            config = Config(self.configFile)
+            config["registry.db"] = "sqlite:///{}".format(os.path.join(directory, "registry.sqlite3"))
+            self.checkConcurrentAccess(Registry.fromConfig(config))
+
+    def checkConcurrentAccess(self, registry):
+        storageClass = StorageClass("testConcurrentAccess")
+        datasetType = DatasetType(name="dummytype", dataUnits=("Camera", "Visit"), storageClass=storageClass)
+        registry.registerDatasetType(datasetType)
+        run = registry.makeRun(collection="test")
+
+        def addAndFind(visit):
+            dataId = {"camera": "DummyCam", "visit": visit}
+            ref = registry.addDataset(datasetType, dataId=dataId, run=run)
+            self.assertEqual(registry.find(run.collection, datasetType, dataId), ref)
+            self.assertEqual(registry.getDatasetType(datasetType.name), datasetType)
+            return ref.id
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            ids = list(executor.map(addAndFind, range(300)))
+        self.assertEqual(len(set(ids)), len(ids))
+        # Concurrent attempts to add the same Dataset must let exactly one through
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            futures = [executor.submit(registry.addDataset, datasetType,
+                                       dataId={"camera": "DummyCam", "visit": 1000}, run=run)
+                       for _ in range(16)]
+            failures = [future.exception() for future in futures if future.exception() is not None]
+        self.assertEqual(len(failures), 15)
+        for failure in failures:
+            self.assertIsInstance(failure, ValueError)
+        # A partly consumed query does not block other threads
+        rows = registry.query("SELECT dataset_id FROM Dataset")
+        next(rows)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(registry.addDataset, datasetType,
+                                     dataId={"camera": "DummyCam", "visit": 1001}, run=run)
+            self.assertIsNotNone(future.result(timeout=60))
+        del rows
+
+    def testIterDatasets(self):
+        registry = Registry.fromConfig(self.configFile)
+        storageClass = StorageClass("testIterDatasets")
+        parentDatasetType = DatasetType(name="parent", dataUnits=("Camera", "Visit"),
+                                        storageClass=storageClass)
+        childDatasetType = DatasetType(name="child", dataUnits=("Camera", "Visit"), storageClass=storageClass)
+        registry.registerDatasetType(parentDatasetType)
+        registry.registerDatasetType(childDatasetType)
+        run = registry.makeRun(collection="test")
+        otherRun = registry.makeRun(collection="other")
+        refs = []
+        for visit in range(25):
+            dataId = {"camera": "DummyCam", "visit": visit}
+            parent = registry.addDataset(parentDatasetType, dataId=dataId, run=run)
+            child = registry.addDataset(childDatasetType, dataId=dataId, run=run)
+            registry.attachComponent("child", parent, child)
+            registry.addDataset(parentDatasetType, dataId=dataId, run=otherRun)
+            refs.append(parent)
+        # Pages are stitched together in dataset_id order, with components
+        with registry.recordStatements() as statements:
+            outRefs = list(registry.iterDatasets(run.collection, parentDatasetType, pageSize=7))
+        self.assertEqual(outRefs, refs)
+        for ref, outRef in zip(refs, outRefs):
+            self.assertEqual(outRef.components, ref.components)
+        # Number of queries depends on the number of pages, not of Datasets:
+        # per page, one for the ids and two rounds (parents and components)
+        # of Dataset, composition and (partitioned) link queries
+        self.assertLessEqual(len(statements), 7*4)
+        # Page size that divides the number of Datasets exactly
+        self.assertEqual(list(registry.iterDatasets(run.collection, "parent", pageSize=5)), refs)
+        # Additional constraint
+        self.assertEqual(list(registry.iterDatasets(run.collection, parentDatasetType, where="visit >= 20",
+                                                    pageSize=3)), refs[20:])
+        self.assertEqual(list(registry.iterDatasets("nonexistent", parentDatasetType)), [])
+
+    def testCollectionSummary(self):
+        registry = Registry.fromConfig(self.configFile)
+        storageClass = StorageClass("testCollectionSummary")
+        visitDatasetType = DatasetType(name="visitType", dataUnits=("Camera", "Visit"),
+                                       storageClass=storageClass)
+        cameraDatasetType = DatasetType(name="cameraType", dataUnits=("Camera",), storageClass=storageClass)
+        registry.registerDatasetType(visitDatasetType)
+        registry.registerDatasetType(cameraDatasetType)
+        run = registry.makeRun(collection="test")
+        refs = [registry.addDataset(visitDatasetType, dataId={"camera": "DummyCam", "visit": visit},
+                                    run=run)
+                for visit in range(10, 15)]
+        with registry.bufferedWrites():
+            refs.append(registry.addDataset(visitDatasetType, dataId={"camera": "MyCam", "visit": 3},
+                                            run=run))
+            registry.addDataset(cameraDatasetType, dataId={"camera": "MyCam"}, run=run)
+        summary = registry.getCollectionSummary(run.collection)
+        self.assertEqual(set(summary), {"visitType", "cameraType"})
+        self.assertEqual(summary["visitType"].count, 6)
+        self.assertEqual(summary["visitType"].ranges, {"camera": ("DummyCam", "MyCam"), "visit": (3, 14)})
+        self.assertEqual(summary["cameraType"].count, 1)
+        self.assertEqual(summary["cameraType"].ranges, {"camera": ("MyCam", "MyCam")})
+        # Associations and disassociations are tracked
+        registry.associate("tagged", refs[1:3])
+        registry.disassociate("tagged", [refs[1], refs[4]], remove=False)
+        summary = registry.getCollectionSummary("tagged")
+        self.assertEqual(set(summary), {"visitType"})
+        self.assertEqual(summary["visitType"].count, 1)
+        registry.disassociate("tagged", [refs[2]], remove=False)
+        self.assertEqual(registry.getCollectionSummary("tagged"), {})
+        # Existence pre-checks
+        self.assertTrue(registry.mayContain(run.collection, visitDatasetType))
+        self.assertTrue(registry.mayContain(run.collection, "visitType", {"camera": "DummyCam", "visit": 12}))
+        outOfRange = {"camera": "DummyCam", "visit": 20}
+        self.assertFalse(registry.mayContain(run.collection, "visitType", outOfRange))
+        self.assertFalse(registry.mayContain(run.collection, "visitType", {"camera": "ZCam", "visit": 12}))
+        self.assertFalse(registry.mayContain("tagged", visitDatasetType))
+        self.assertFalse(registry.mayContain("nonexistent", cameraDatasetType))
+        # Incremental summaries agree with ones computed from scratch
+        expected = {collection: registry.getCollectionSummary(collection)
+                    for collection in ("test", "tagged")}
+        registry.rebuildCollectionSummaries()
+        for collection, collectionSummary in expected.items():
+            self.assertEqual(registry.getCollectionSummary(collection), collectionSummary)
+
+    def testRemoveDatasets(self):
+        registry = Registry.fromConfig(self.configFile)
+        storageClass = StorageClass("testRemoveDatasets")
+        parentDatasetType = DatasetType(name="parent", dataUnits=("Camera", "Visit"),
+                                        storageClass=storageClass)
+        childDatasetType = DatasetType(name="child", dataUnits=("Camera", "Visit"), storageClass=storageClass)
+        registry.registerDatasetType(parentDatasetType)
+        registry.registerDatasetType(childDatasetType)
+        run = registry.makeRun(collection="test")
+        parents = []
+        children = []
+        for visit in range(10):
+            dataId = {"camera": "DummyCam", "visit": visit}
+            parent = registry.addDataset(parentDatasetType, dataId=dataId, run=run)
+            child = registry.addDataset(childDatasetType, dataId=dataId, run=run)
+            registry.attachComponent("child", parent, child)
+            registry.addStorageInfo(parent, StorageInfo("dummystore", "parent{}".format(visit), visit))
+            registry.addStorageInfo(child, StorageInfo("dummystore", "child{}".format(visit), visit))
+            registry.addValidityRange(parent, "DummyCam", datetime(2018, 1, 1 + visit))
+            parents.append(parent)
+            children.append(child)
+        registry.associate("tagged", parents[:5])
+        # Removing composites removes their components everywhere
+        removed = registry.removeDatasets(parents[:3])
+        self.assertEqual(set(removed), {"dummystore"})
+        self.assertEqual(set(removed["dummystore"]), {ref.id for ref in parents[:3] + children[:3]})
+        self.assertEqual(removed["dummystore"][children[1].id], StorageInfo("dummystore", "child1", 1))
+        for ref in parents[:3] + children[:3]:
+            self.assertIsNone(registry.getDataset(ref.id))
+            self.assertIsNone(registry.find(run.collection, ref.datasetType, ref.dataId))
+        self.assertEqual(registry.getDataset(parents[3].id), parents[3])
+        self.assertEqual(registry.getCollectionSummary("tagged")["parent"].count, 2)
+        self.assertEqual(registry.getCollectionSummary(run.collection)["child"].count, 7)
+        # Removal by query
+        removed = registry.removeDatasets("SELECT dataset_id FROM Dataset WHERE dataset_type_name = :name",
+                                          name="child")
+        self.assertEqual(set(removed["dummystore"]), {ref.id for ref in children[3:]})
+        self.assertNotIn("child", registry.getCollectionSummary(run.collection))
+        self.assertEqual(registry.getDataset(parents[3].id).components, {})
+        # Disassociation removes Datasets left without a Collection
+        removedRefs, removed = registry.disassociate(run.collection, parents[3:], remove=True)
+        self.assertEqual(removedRefs, parents[5:])
+        self.assertEqual(removed, {"dummystore": {ref.id: StorageInfo("dummystore", "parent{}".format(i), i)
+                                                  for i, ref in enumerate(parents) if i >= 5}})
+        self.assertIsNone(registry.getDataset(parents[5].id))
+        self.assertEqual(registry.getDataset(parents[4].id).id, parents[4].id)
+        self.assertEqual(registry.removeDatasets([]), {})
+        # Components still in another Collection are kept
+        dataId = {"camera": "DummyCam", "visit": 20}
+        parent = registry.addDataset(parentDatasetType, dataId=dataId, run=run)
+        child = registry.addDataset(childDatasetType, dataId=dataId, run=run)
+        registry.attachComponent("child", parent, child)
+        registry.associate("tagged", [child])
+        registry.disassociate(run.collection, [child], remove=False)
+        removedRefs, removed = registry.disassociate(run.collection, [parent], remove=True)
+        self.assertEqual(removedRefs, [parent])
+        self.assertEqual(removed, {})
+        self.assertIsNone(registry.getDataset(parent.id))
+        self.assertEqual(registry.getDataset(child.id).id, child.id)
+        self.assertEqual(registry.getCollectionSummary("tagged")["child"].count, 1)
+
+    def testExpand(self):
+        registry = Registry.fromConfig(self.configFile)
+        storageClass = StorageClass("testExpand")
+        registry.storageClasses.registerStorageClass(storageClass)
+        datasetType = DatasetType(name="calexp", dataUnits=("Camera", "Visit", "Sensor"),
+                                  storageClass=storageClass)
+        registry.registerDatasetType(datasetType)
+        registry.addDataUnitEntry("Camera", {"camera": "DummyCam"})
+        registry.addDataUnitEntry("PhysicalFilter", {"camera": "DummyCam", "physical_filter": "d-r",
+                                                     "abstract_filter": "r"})
+        registry.addDataUnitEntry("Visit", {"camera": "DummyCam", "visit": 1, "physical_filter": "d-r"})
+        registry.addDataUnitEntry("Sensor", {"camera": "DummyCam", "sensor": "S2"})
+        run = registry.makeRun(collection="test")
+        refs = [registry.addDataset(datasetType, {"camera": "DummyCam", "visit": visit, "sensor": "S2"}, run)
+                for visit in (1, 3)]
+        refs.append(refs[0])
+        # One join resolves all refs
+        with registry.recordStatements() as statements:
+            expanded = registry.expandMany(refs)
+        self.assertEqual(len([s for s, p in statements if s.lstrip().upper().startswith("SELECT")]), 1)
+        self.assertEqual([ref.id for ref in expanded], [ref.id for ref in refs])
+        self.assertIsNone(refs[0].dataUnitEntries)
+        self.assertEqual(expanded[0].dataId, {"camera": "DummyCam", "visit": 1, "sensor": "S2",
+                                              "physical_filter": "d-r", "abstract_filter": "r"})
+        self.assertEqual(expanded[0].dataUnitEntries["PhysicalFilter"]["abstract_filter"], "r")
+        self.assertEqual(set(expanded[0].dataUnitEntries), {"Camera", "PhysicalFilter", "Visit", "Sensor"})
+        self.assertEqual(expanded[2], expanded[0])
+        # Visit 3 has no entry, so only the Camera and Sensor are resolved
+        self.assertEqual(expanded[1].dataId, refs[1].dataId)
+        self.assertEqual(set(expanded[1].dataUnitEntries), {"Camera", "Sensor"})
+        # Results are memoized
+        with registry.recordStatements() as statements:
+            self.assertEqual(registry.expand(refs[1]), expanded[1])
+        self.assertEqual(statements, [])
+        # New entries invalidate the memo
+        registry.addDataUnitEntry("Visit", {"camera": "DummyCam", "visit": 3, "physical_filter": "d-r"})
+        self.assertEqual(registry.expand(refs[1]).dataId["abstract_filter"], "r")
+        with self.assertRaises(ValueError):
+            registry.expand(DatasetRef(datasetType, {"camera": "DummyCam", "visit": 1}))
+
+    def testSnapshot(self):
+        registry = Registry.fromConfig(self.configFile)
+        storageClass = StorageClass("testSnapshot")
+        registry.storageClasses.registerStorageClass(storageClass)
+        calexpType = DatasetType(name="calexp", dataUnits=("Camera", "Visit", "Sensor"),
+                                 storageClass=storageClass)
+        srcType = DatasetType(name="src", dataUnits=("Camera", "Visit", "Sensor"),
+                              storageClass=storageClass)
+        registry.registerDatasetType(calexpType)
+        registry.registerDatasetType(srcType)
+        registry.addDataUnitEntry("Camera", {"camera": "DummyCam"})
+        registry.addDataUnitEntry("PhysicalFilter", {"camera": "DummyCam", "physical_filter": "d-r"})
+        for visit in (1, 2):
+            registry.addDataUnitEntry("Visit", {"camera": "DummyCam", "visit": visit,
+                                                "physical_filter": "d-r"})
+        registry.addDataUnitEntry("Sensor", {"camera": "DummyCam", "sensor": "S2"})
+        run = registry.makeRun(collection="input")
+        inputs = [registry.addDataset(calexpType, {"camera": "DummyCam", "visit": visit, "sensor": "S2"}, run)
+                  for visit in (1, 2)]
+        registry.addStorageInfo(inputs[0], StorageInfo("dummy", checksum="d00d", size=5))
+        Record = namedtuple("Record", ["path"])
+        records = registry.makeDatabaseDict("TestRecords", types={"dataset_id": int, "path": str},
+                                            key="dataset_id", value=Record)
+        records[inputs[0].id] = Record(path="calexp_1.fits")
+        with tempfile.TemporaryDirectory() as directory:
+            snapshot = makeSnapshot(registry, os.path.join(directory, "job.sqlite3"), inputs[:1],
+                                    datasetTypes=[srcType], datastoreTables=["TestRecords"])
+            # The snapshot holds the inputs, and only those
+            self.assertEqual(snapshot.find("input", calexpType, inputs[0].dataId), inputs[0])
+            self.assertIsNone(snapshot.getDataset(inputs[1].id))
+            self.assertIsNone(snapshot.findDataUnitEntry("Visit", {"camera": "DummyCam", "visit": 2}))
+            self.assertEqual(snapshot.getStorageInfo(inputs[0], "dummy").size, 5)
+            self.assertEqual(snapshot.getDatasetType("src"), srcType)
+            self.assertEqual(snapshot.expand(inputs[0]).dataId["physical_filter"], "d-r")
+            snapshotRecords = snapshot.makeDatabaseDict("TestRecords",
+                                                        types={"dataset_id": int, "path": str},
+                                                        key="dataset_id", value=Record)
+            self.assertEqual(snapshotRecords[inputs[0].id], Record(path="calexp_1.fits"))
+            # A job writes outputs to the snapshot
+            jobRun = snapshot.makeRun(collection="job")
+            output = snapshot.addDataset(srcType, inputs[0].dataId, jobRun)
+            snapshot.addStorageInfo(output, StorageInfo("dummy", checksum="beef", size=7))
+            snapshotRecords[output.id] = Record(path="src_1.fits")
+            ids = mergeSnapshot(snapshot, registry, collection="merged", datastoreTables=["TestRecords"])
+        self.assertEqual(list(ids), [output.id])
+        merged = registry.find("job", srcType, inputs[0].dataId)
+        self.assertEqual(merged.id, ids[output.id])
+        self.assertEqual(registry.find("merged", srcType, inputs[0].dataId), merged)
+        self.assertEqual(registry.getRun(collection="job").collection, "job")
+        self.assertEqual(registry.getStorageInfo(merged, "dummy").checksum, "beef")
+        self.assertEqual(records[merged.id], Record(path="src_1.fits"))
+        self.assertEqual(records[inputs[0].id], Record(path="calexp_1.fits"))
+        self.assertEqual(registry.getCollectionSummary("job")["src"].count, 1)
+        self.assertEqual(registry.getCollectionSummary("input")["calexp"].count, 2)
+
     def testDatasetUnit(self):
         registry = Registry.fromConfig(self.configFile)
         dataUnitName = 'Camera'
@@ -300,6 +727,48 @@ class SqlRegistryTestCase(lsst.utils.tests.TestCase):
         self.assertEqual(registry.findDataUnitEntry(dataUnitName2, dataUnitValue2), dataUnitValue2)
 
 
+class PartitionedSqlRegistryTestCase(SqlRegistryTestCase):
+    """Test for SqlRegistry with the partitioned Dataset layout.
+    """
+
+    def setUp(self):
+        self.testDir = os.path.dirname(__file__)
+        self.configFile = Config(os.path.join(self.testDir, "config/basic/butler.yaml"))
+        self.configFile["registry.datasetLayout"] = "partitioned"
+
+    def testDatasetTables(self):
+        registry = Registry.fromConfig(self.configFile)
+        storageClass = StorageClass("testDatasetTables")
+        visitDatasetType = DatasetType(name="visitType", dataUnits=("Camera", "Visit"),
+                                       storageClass=storageClass)
+        otherVisitDatasetType = DatasetType(name="otherVisitType", dataUnits=("Visit", "Camera"),
+                                            storageClass=storageClass)
+        cameraDatasetType = DatasetType(name="cameraType", dataUnits=("Camera",), storageClass=storageClass)
+        for datasetType in (visitDatasetType, otherVisitDatasetType, cameraDatasetType):
+            registry.registerDatasetType(datasetType)
+        # The Dataset table no longer holds any link
+        datasetTable = registry._schema.metadata.tables["Dataset"]
+        self.assertNotIn("visit", datasetTable.columns)
+        self.assertNotIn("camera", datasetTable.columns)
+        # DatasetTypes with the same DataUnits share a narrow table
+        visitTable = registry._getDatasetTable(visitDatasetType)
+        self.assertIs(registry._getDatasetTable(otherVisitDatasetType), visitTable)
+        self.assertEqual(set(visitTable.columns.keys()),
+                         {"dataset_id", "dataset_type_name", "camera", "visit"})
+        self.assertEqual(set(registry._getDatasetTable(cameraDatasetType).columns.keys()),
+                         {"dataset_id", "dataset_type_name", "camera"})
+        # Datasets of different types with the same dataId do not collide
+        run = registry.makeRun(collection="test")
+        dataId = {"camera": "DummyCam", "visit": 0}
+        visitRef = registry.addDataset(visitDatasetType, dataId=dataId, run=run)
+        otherVisitRef = registry.addDataset(otherVisitDatasetType, dataId=dataId, run=run)
+        cameraRef = registry.addDataset(cameraDatasetType, dataId={"camera": "DummyCam"}, run=run)
+        self.assertEqual(registry.find(run.collection, visitDatasetType, dataId), visitRef)
+        self.assertEqual(registry.find(run.collection, otherVisitDatasetType, dataId), otherVisitRef)
+        self.assertEqual(registry.getDataset(cameraRef.id).dataId, {"camera": "DummyCam"})
+        self.assertEqual(registry.getDataset(visitRef.id), visitRef)
+
+
 class MemoryTester(lsst.utils.tests.MemoryTestCase):
     pass
 
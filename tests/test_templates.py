@@ -101,6 +101,30 @@ class TestFileTemplates(unittest.TestCase):
         with self.assertRaises(KeyError):
             self.assertTemplate(tmplstr, "", refWcs)
 
+    def testShard(self):
+        """Test hash-derived subdirectories."""
+        ref = self.makeDatasetRef("calexp")
+        path = FileTemplate("{datasetType}/{shard:2}/v{visit}").format(ref)
+        self.assertRegex(path, r"^calexp/[0-9a-f]{2}/[0-9a-f]{2}/v52$")
+
+        # The shard depends on the dataId only, not on its order
+        other = self.makeDatasetRef("src", {"filter": "U", "visit": 52})
+        self.assertEqual(FileTemplate("{shard:2}").format(other), path.split("/", 1)[1].rsplit("/", 1)[0])
+        nextVisit = self.makeDatasetRef("calexp", {"visit": 53, "filter": "U"})
+        tmpl = FileTemplate("{shard:4}")
+        self.assertNotEqual(tmpl.format(nextVisit), tmpl.format(ref))
+        self.assertRegex(FileTemplate("{shard}/v{visit}").format(ref), r"^[0-9a-f]{2}/v52$")
+        with self.assertRaises(ValueError):
+            FileTemplate("{shard:0}").format(ref)
+
+        # The id shard needs an id, unless optional
+        with self.assertRaises(KeyError):
+            FileTemplate("{idshard:1}/v{visit}").format(ref)
+        self.assertEqual(FileTemplate("{datasetType}/{idshard:1?}/v{visit}").format(ref), "calexp/v52")
+        ref = DatasetRef(ref.datasetType, ref.dataId, id=42)
+        self.assertRegex(FileTemplate("{datasetType}/{idshard:1?}/v{visit}").format(ref),
+                         r"^calexp/[0-9a-f]{2}/v52$")
+
 
 if __name__ == "__main__":
     unittest.main()